@@ -1,4 +1,17 @@
+import glob
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from array import array
 from copy import deepcopy
+from dataclasses import dataclass
+from functools import partial
+from itertools import permutations, product
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Union
 
 
 COMP_CODES = {
@@ -44,7 +57,7 @@ for i in range(16):
     SYMBOLS[f"R{i}"] = i
 
 
-def get_label_symbols(lines: list[str]) -> dict[str, int]:
+def get_label_symbols(lines: Iterable[str]) -> dict[str, int]:
     label_symbols = {}
 
     line_counter = 0
@@ -59,13 +72,20 @@ def get_label_symbols(lines: list[str]) -> dict[str, int]:
     return label_symbols
 
 
+def iter_clean_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Lazily removes comments and empty lines.
+    """
+    for line in lines:
+        if cleaned_line := line.split("//")[0].strip():
+            yield cleaned_line
+
+
 def clean_lines(lines: list[str]) -> list[str]:
     """
     Removes comments and empty lines.
     """
-    return [
-        cleaned_line.strip() for line in lines if (cleaned_line := line.split("//")[0])
-    ]
+    return list(iter_clean_lines(lines))
 
 
 def assemble_c_instruction(instruction: str) -> str:
@@ -102,11 +122,126 @@ def assemble_c_instruction(instruction: str) -> str:
     return f"111{a}{comp_code}{dest_code}{jmp_code}"
 
 
-def assemble(assembly_code: str) -> str:
-    binary_codes = []
-    lines = clean_lines(assembly_code.splitlines())
-    symbols = deepcopy(SYMBOLS) | get_label_symbols(lines)
+def build_c_instruction_table() -> dict[str, int]:
+    """
+    Encodes every legal C-instruction, including all orderings of the dest
+    registers and the M-variants of each comp.
+    """
+    dests = [""] + [
+        "".join(registers)
+        for n_registers in range(1, 4)
+        for registers in permutations("AMD", n_registers)
+    ]
+    comps = list(COMP_CODES) + [
+        comp.replace("A", "M") for comp in COMP_CODES if "A" in comp
+    ]
+    jmps = [""] + list(JMP_CODES)
+
+    table = {}
+    for dest, comp, jmp in product(dests, comps, jmps):
+        instruction = f"{dest}={comp}" if dest else comp
+        if jmp:
+            instruction = f"{instruction};{jmp}"
+        table[instruction] = int(assemble_c_instruction(instruction), 2)
+    return table
+
+
+C_INSTRUCTIONS = build_c_instruction_table()
+
 
+def encode_c_instruction(instruction: str) -> int:
+    try:
+        return C_INSTRUCTIONS[instruction]
+    except KeyError:
+        raise ValueError(f"{instruction} is not a valid C-instruction") from None
+
+
+# Adjacent C-instructions where the second undoes the first
+CANCELLING_PAIRS = {("M=M+1", "M=M-1"), ("M=M-1", "M=M+1")}
+# Adjacent C-instructions where the second has no effect
+REDUNDANT_PAIRS = {("M=D", "D=M"), ("D=M", "M=D")}
+
+
+def count_pinned_instructions(lines: Iterable[str]) -> int:
+    """
+    Counts the leading instructions the optimizer must leave in place because
+    a numeric address may jump into them. Any numeric or predefined A-value
+    that is jumped on, or copied out of A to reach a jump later through D or
+    RAM, is taken as a jump target. Values only used to address RAM, like
+    `@16384 M=-1`, are not. Addresses computed by arithmetic on other values
+    aren't followed.
+    """
+    targets = set()
+    value = None  # Numeric value A holds
+    n_instructions = 0
+    for line in lines:
+        if line.startswith("("):
+            # Code after a label can be reached with any value in A
+            if value is not None:
+                targets.add(value)
+            continue
+        n_instructions += 1
+        if line.startswith("@"):
+            symbol = line[1:]
+            value = int(symbol) if symbol.isdigit() else SYMBOLS.get(symbol)
+            continue
+        dest, _, comp = line.rpartition("=")
+        comp, _, jmp = comp.partition(";")
+        if value is not None and ("A" in comp or jmp):
+            targets.add(value)
+        if "A" in dest:
+            value = None
+    return max((target for target in targets if target < n_instructions), default=0)
+
+
+def optimize_lines(lines: Iterable[str], pinned: int = 0) -> Iterator[str]:
+    """
+    Peephole optimizer over cleaned lines. Within straight-line code it drops
+    A-instructions that reload the value A already holds, instruction pairs
+    that cancel out, instructions that copy a value back to where it came
+    from, as well as A-instructions immediately overwritten by another one.
+    Labels and jumps end straight-line code, so nothing is moved across
+    them; label addresses must be collected from the optimized lines.
+    Removing instructions moves code, so the first `pinned` instructions,
+    which numeric jumps may target (see count_pinned_instructions), are
+    passed through unchanged.
+    """
+    block: list[str] = []
+    a_instruction = None  # A-instruction whose value A currently holds
+    for line in lines:
+        if pinned:
+            yield line
+            if not line.startswith("("):
+                pinned -= 1
+        elif line.startswith("("):
+            yield from block
+            yield line
+            block, a_instruction = [], None
+        elif line.startswith("@"):
+            if line != a_instruction:
+                if block and block[-1].startswith("@"):
+                    block.pop()
+                block.append(line)
+                a_instruction = line
+        elif block and (block[-1], line) in CANCELLING_PAIRS:
+            block.pop()
+        elif block and (block[-1], line) in REDUNDANT_PAIRS:
+            continue
+        else:
+            block.append(line)
+            if "=" in line and "A" in line.split("=")[0]:
+                a_instruction = None
+            if ";" in line:
+                yield from block
+                block, a_instruction = [], None
+    yield from block
+
+
+def encode_lines(lines: Iterable[str], symbols: dict[str, int]) -> Iterator[int]:
+    """
+    Encodes cleaned lines to words. Variables are allocated in `symbols` as they
+    are first encountered, so it must already contain all label symbols.
+    """
     address_counter = 16
     for line in lines:
         if line.startswith("("):
@@ -123,21 +258,359 @@ def assemble(assembly_code: str) -> str:
                     symbols[value] = address_counter
                     address_counter += 1
                 value = symbols[value]
-            binary_value = format(value, "015b")
-            binary_code = f"0{binary_value}"
-            binary_codes.append(binary_code)
+            yield value
         else:
             # Line is a C-instruction
-            binary_codes.append(assemble_c_instruction(line))
+            yield encode_c_instruction(line)
+
+
+def assemble_words(assembly_code: str, optimize: bool = False) -> array:
+    """
+    Assembles to an array of 16-bit words, one per ROM address.
+    """
+    lines = clean_lines(assembly_code.splitlines())
+    if optimize:
+        lines = list(optimize_lines(lines, count_pinned_instructions(lines)))
+    symbols = deepcopy(SYMBOLS) | get_label_symbols(lines)
+    return array("H", encode_lines(lines, symbols))
+
 
-    binary_code = "\n".join(binary_codes) + "\n"
-    return binary_code
+def words_to_hack(words: array) -> str:
+    """
+    Formats words as the text .hack format, one 16-character binary string per line.
+    """
+    return "".join([f"{word:016b}\n" for word in words])
+
+
+def write_binary(words: array, path: Path) -> None:
+    """
+    Writes words as raw little-endian uint16 values.
+    """
+    if sys.byteorder == "big":
+        words = array("H", words)
+        words.byteswap()
+    path.write_bytes(words.tobytes())
+
+
+def read_binary(path: Path) -> array:
+    words = array("H", path.read_bytes())
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+def assemble(assembly_code: str, optimize: bool = False) -> str:
+    return words_to_hack(assemble_words(assembly_code, optimize))
+
+
+STREAM_CHUNK_SIZE = 4096
+
+
+def assemble_stream(
+    source: Union[Path, Iterable[str]],
+    output: IO,
+    binary: bool = False,
+    optimize: bool = False,
+) -> int:
+    """
+    Assembles without holding the program in memory. A path is read once per
+    pass; any other iterable of lines is spooled to a temporary file during
+    the label pass. Words are written to `output` in chunks, as text or, when
+    `binary` is set, as little-endian uint16 (`output` must then be opened in
+    binary mode). Returns the number of words written.
+    """
+    if optimize and not isinstance(source, Path):
+        # Optimizing takes an extra pass to find the pinned instructions, so
+        # the lines are spooled to a file that can be read once per pass
+        with tempfile.TemporaryDirectory() as folder_name:
+            spool_path = Path(folder_name).joinpath("source.asm")
+            with spool_path.open("w") as spool:
+                spool.writelines(line.rstrip("\n") + "\n" for line in source)
+            return assemble_stream(spool_path, output, binary, optimize)
+
+    if isinstance(source, Path):
+        clean = iter_clean_lines
+        if optimize:
+            with source.open() as file_:
+                pinned = count_pinned_instructions(iter_clean_lines(file_))
+            clean = partial(optimized_clean_lines, pinned=pinned)
+        with source.open() as file_:
+            symbols = deepcopy(SYMBOLS) | get_label_symbols(clean(file_))
+        with source.open() as file_:
+            return write_words(encode_lines(clean(file_), symbols), output, binary)
+
+    with tempfile.TemporaryFile("w+") as spool:
+        symbols = deepcopy(SYMBOLS) | get_label_symbols(
+            spool_lines(iter_clean_lines(source), spool)
+        )
+        spool.seek(0)
+        return write_words(
+            encode_lines((line.rstrip("\n") for line in spool), symbols),
+            output,
+            binary,
+        )
+
+
+def optimized_clean_lines(lines: Iterable[str], pinned: int = 0) -> Iterator[str]:
+    return optimize_lines(iter_clean_lines(lines), pinned)
+
+
+def spool_lines(lines: Iterable[str], spool: IO) -> Iterator[str]:
+    for line in lines:
+        spool.write(f"{line}\n")
+        yield line
+
+
+def write_words(words: Iterable[int], output: IO, binary: bool = False) -> int:
+    n_words = 0
+    chunk = array("H")
+    for word in words:
+        chunk.append(word)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            n_words += write_chunk(chunk, output, binary)
+            chunk = array("H")
+    return n_words + write_chunk(chunk, output, binary)
+
+
+def write_chunk(chunk: array, output: IO, binary: bool) -> int:
+    if binary:
+        if sys.byteorder == "big":
+            chunk.byteswap()
+        output.write(chunk.tobytes())
+    else:
+        output.write(words_to_hack(chunk))
+    return len(chunk)
+
+
+def assemble_file(
+    source: Path, binary: bool = False, optimize: bool = False, listing: bool = False
+) -> Path:
+    write_path = source.with_suffix(".bin" if binary else ".hack")
+    with write_path.open("wb" if binary else "w") as output:
+        assemble_stream(source, output, binary, optimize)
+    if listing:
+        write_listing(source, optimize)
+    return write_path
+
+
+class SourceLine(str):
+    """
+    A cleaned line that remembers its line number and the closest full-line
+    comment above it. The optimizer passes lines through unchanged, so this
+    survives optimization.
+    """
+
+    line_number: int
+    comment: str
+
+
+def iter_source_lines(lines: Iterable[str]) -> Iterator[SourceLine]:
+    comment = ""
+    for line_number, line in enumerate(lines, start=1):
+        code, _, line_comment = line.partition("//")
+        if code := code.strip():
+            source_line = SourceLine(code)
+            source_line.line_number = line_number
+            source_line.comment = comment
+            yield source_line
+        elif line_comment.strip():
+            comment = line_comment.strip()
+
+
+@dataclass
+class ListingEntry:
+    address: int
+    line_number: int
+    label: str
+    comment: str
+    instruction: str
+
+
+LISTING_HEADER = "address\tline\tlabel\tcomment\tinstruction"
+
+
+def iter_listing(lines: Iterable[SourceLine]) -> Iterator[ListingEntry]:
+    """
+    Maps each ROM address to its source line, the closest label above it and
+    the closest full-line comment above it (for translated VM code, the VM
+    command it came from).
+    """
+    address, label = 0, ""
+    for line in lines:
+        if line.startswith("("):
+            label = line[1:-1]
+            continue
+        yield ListingEntry(address, line.line_number, label, line.comment, line)
+        address += 1
+
+
+def write_listing(source: Path, optimize: bool = False) -> Path:
+    """
+    Writes a tab-separated listing next to the source. Listings are only
+    produced on request, so assembling without one costs nothing extra.
+    """
+    write_path = source.with_suffix(".lst")
+    pinned = 0
+    if optimize:
+        with source.open() as file_:
+            pinned = count_pinned_instructions(iter_clean_lines(file_))
+    with source.open() as file_, write_path.open("w") as output:
+        lines = iter_source_lines(file_)
+        if optimize:
+            lines = optimize_lines(lines, pinned)
+        output.write(f"{LISTING_HEADER}\n")
+        for entry in iter_listing(lines):
+            output.write(
+                f"{entry.address}\t{entry.line_number}\t{entry.label}\t"
+                f"{entry.comment}\t{entry.instruction}\n"
+            )
+    return write_path
+
+
+def read_listing(path: Path) -> list[ListingEntry]:
+    entries = []
+    with path.open() as file_:
+        next(file_)  # Header
+        for row in file_:
+            address, line_number, label, comment, instruction = row.rstrip(
+                "\n"
+            ).split("\t")
+            entries.append(
+                ListingEntry(
+                    int(address), int(line_number), label, comment, instruction
+                )
+            )
+    return entries
+
+
+CACHE_DIR = Path(".hack_cache")
+
+
+def cache_key(source: Path, optimize: bool = False) -> str:
+    """
+    Hashes the source together with this module, so editing the assembler
+    invalidates every cached output.
+    """
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(source.read_bytes())
+    if optimize:
+        digest.update(b"optimize")
+    return digest.hexdigest()
+
+
+def cached_output(
+    source: Path, cache_dir: Path, binary: bool = False, optimize: bool = False
+) -> Path:
+    return cache_dir.joinpath(cache_key(source, optimize)).with_suffix(
+        ".bin" if binary else ".hack"
+    )
+
+
+def assemble_to_cache(
+    source: Path,
+    cache_dir: Path,
+    binary: bool = False,
+    optimize: bool = False,
+    listing: bool = False,
+) -> Path:
+    write_path = assemble_file(source, binary, optimize, listing)
+    cache_file = cached_output(source, cache_dir, binary, optimize)
+    # Copy then rename so concurrent builds never see a partial cache entry
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    shutil.copyfile(write_path, tmp_file)
+    os.replace(tmp_file, cache_file)
+    return write_path
+
+
+def collect_sources(targets: Iterable[str]) -> list[Path]:
+    """
+    Expands directories (recursively) and glob patterns to .asm files.
+    """
+    sources = set()
+    for target in targets:
+        path = Path(target)
+        if path.is_dir():
+            sources.update(path.rglob("*.asm"))
+        else:
+            sources.update(
+                Path(match) for match in glob.glob(target, recursive=True)
+            )
+    return sorted(source for source in sources if source.suffix == ".asm")
+
+
+def assemble_batch(
+    sources: Iterable[Path],
+    cache_dir: Path = CACHE_DIR,
+    binary: bool = False,
+    optimize: bool = False,
+    max_workers: Optional[int] = None,
+    listing: bool = False,
+) -> tuple[list[Path], list[Path]]:
+    """
+    Assembles each source next to itself, reusing cached output for sources
+    that were assembled before and assembling the rest in a process pool.
+    With `listing`, a listing is written next to every source, including
+    cached ones. Returns the sources that were assembled and those served
+    from the cache.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    assembled, cached = [], []
+    for source in sources:
+        cache_file = cached_output(source, cache_dir, binary, optimize)
+        if cache_file.exists():
+            shutil.copyfile(cache_file, source.with_suffix(cache_file.suffix))
+            if listing:
+                write_listing(source, optimize)
+            cached.append(source)
+        else:
+            assembled.append(source)
+
+    if len(assembled) == 1:
+        assemble_to_cache(assembled[0], cache_dir, binary, optimize, listing)
+    elif assembled:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(
+                executor.map(
+                    assemble_to_cache,
+                    assembled,
+                    [cache_dir] * len(assembled),
+                    [binary] * len(assembled),
+                    [optimize] * len(assembled),
+                    [listing] * len(assembled),
+                )
+            )
+    return assembled, cached
 
 
 if __name__ == "__main__":
-    import sys
-    from pathlib import Path
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Assembles .asm files, folders of them or glob patterns."
+    )
+    parser.add_argument("targets", nargs="+")
+    parser.add_argument("--binary", action="store_true")
+    parser.add_argument("--optimize", action="store_true")
+    parser.add_argument("--listing", action="store_true")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    arguments = parser.parse_args()
 
-    target_file = Path(sys.argv[1])
-    write_path = target_file.parent.joinpath(f"{target_file.stem}.hack")
-    write_path.write_text(assemble(target_file.read_text()))
+    targets = arguments.targets
+    binary = arguments.binary
+    optimize = arguments.optimize
+    if len(targets) == 1 and Path(targets[0]).is_file():
+        assemble_file(
+            Path(targets[0]),
+            binary=binary,
+            optimize=optimize,
+            listing=arguments.listing,
+        )
+    else:
+        assembled, cached = assemble_batch(
+            collect_sources(targets),
+            cache_dir=arguments.cache_dir,
+            binary=binary,
+            optimize=optimize,
+            listing=arguments.listing,
+        )
+        print(f"Assembled {len(assembled)} file(s), {len(cached)} from cache")
@@ -0,0 +1,332 @@
+import io
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from assembler import (
+    assemble,
+    assemble_c_instruction,
+    assemble_stream,
+    clean_lines,
+    encode_c_instruction,
+)
+from emulator import Machine
+
+PONG = Path(__file__).parent.joinpath("pong", "Pong.asm")
+PONG_L = Path(__file__).parent.joinpath("pong", "PongL.asm")
+PONG_HACK = Path(__file__).parent.joinpath("test", "Pong.hack")
+BASELINE = Path(__file__).parent.joinpath("benchmark_baseline.json")
+SYNTHETIC_SIZES = (10_000, 100_000, 1_000_000)
+
+# Densities measured on Pong.asm: roughly one label every 32 lines, a quarter of
+# the lines are symbolic A-instructions and one in thirteen is a numeric one.
+LABEL_DENSITY = 0.03
+SYMBOL_DENSITY = 0.26
+CONSTANT_DENSITY = 0.08
+VARIABLE_SHARE = 0.2
+C_INSTRUCTION_POOL = (
+    "D=M",
+    "D=A",
+    "M=D",
+    "A=M",
+    "AM=M-1",
+    "M=M+1",
+    "M=M-1",
+    "D=D+A",
+    "D=D-M",
+    "D=M-D",
+    "M=D+M",
+    "M=-1",
+    "M=0",
+    "A=A-1",
+    "D;JEQ",
+    "D;JGT",
+    "D;JLT",
+    "0;JMP",
+)
+
+
+def generate_program(n_lines: int, seed: int = 0) -> str:
+    """
+    Generates a synthetic program with Pong-like label and variable density.
+    Only labels that fit in the 15-bit address space are referenced, so programs
+    larger than the ROM still assemble.
+    """
+    rng = random.Random(seed)
+    n_labels = max(1, int(n_lines * LABEL_DENSITY))
+    n_variables = min(16000, max(1, n_lines // 75))
+    n_addressable_labels = min(n_labels, int(32768 * LABEL_DENSITY))
+
+    lines = [f"// Synthetic program, {n_lines} lines"]
+    declared_labels = 0
+    for _ in range(n_lines):
+        roll = rng.random()
+        if roll < LABEL_DENSITY and declared_labels < n_labels:
+            lines.append(f"(LABEL{declared_labels})")
+            declared_labels += 1
+        elif roll < LABEL_DENSITY + SYMBOL_DENSITY:
+            if rng.random() < VARIABLE_SHARE:
+                lines.append(f"@var{rng.randrange(n_variables)}")
+            else:
+                lines.append(f"@LABEL{rng.randrange(n_addressable_labels)}")
+        elif roll < LABEL_DENSITY + SYMBOL_DENSITY + CONSTANT_DENSITY:
+            lines.append(f"@{rng.randrange(32768)}")
+        else:
+            lines.append(rng.choice(C_INSTRUCTION_POOL))
+    # Declare any labels the random walk did not reach
+    lines.extend(f"(LABEL{i})" for i in range(declared_labels, n_labels))
+    return "\n".join(lines) + "\n"
+
+
+def load_program(program: str) -> str:
+    if program.startswith("synthetic-"):
+        return generate_program(int(program.removeprefix("synthetic-")))
+    return {"Pong": PONG, "PongL": PONG_L}[program].read_text()
+
+
+def run_assembler(mode: str, assembly_code: str) -> str:
+    if mode == "assemble":
+        return assemble(assembly_code)
+    output = io.StringIO()
+    assemble_stream(io.StringIO(assembly_code), output)
+    return output.getvalue()
+
+
+def count_peak_blocks(mode: str, assembly_code: str) -> int:
+    """
+    Counts the most memory blocks held at once during a run, beyond those live
+    before it, so the count covers what the run allocates and not only what it
+    leaves behind. A thread samples the live block count every millisecond;
+    counting blocks walks the heap, which is too slow to do on every call.
+    """
+    blocks_before = sys.getallocatedblocks()
+    peak = blocks_before
+    done = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak
+        while not done.wait(0.001):
+            peak = max(peak, sys.getallocatedblocks())
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        output = run_assembler(mode, assembly_code)
+        peak = max(peak, sys.getallocatedblocks())
+        del output
+    finally:
+        done.set()
+        sampler.join()
+    return peak - blocks_before
+
+
+def run_case(program: str, mode: str, repeat: int = 5) -> dict[str, float]:
+    """
+    Runs a single case, timing the best of `repeat` runs so one slow run
+    doesn't read as a regression. Meant to run in a fresh process so peak RSS
+    belongs to this case alone.
+    """
+    assembly_code = load_program(program)
+    n_lines = assembly_code.count("\n")
+
+    elapsed = min(
+        timeit.repeat(
+            lambda: run_assembler(mode, assembly_code), number=1, repeat=repeat
+        )
+    )
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+
+    tracemalloc.start()
+    run_assembler(mode, assembly_code)
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "lines": n_lines,
+        "seconds": elapsed,
+        "lines_per_second": n_lines / elapsed,
+        "peak_rss_kb": peak_rss,
+        "peak_allocated_kb": peak_traced // 1024,
+        "peak_blocks": count_peak_blocks(mode, assembly_code),
+    }
+
+
+def run_suite(
+    sizes: tuple[int, ...] = SYNTHETIC_SIZES,
+    modes: tuple[str, ...] = ("assemble",),
+    repeat: int = 5,
+) -> dict[str, dict[str, float]]:
+    programs = [f"synthetic-{size}" for size in sizes] + ["Pong", "PongL"]
+    results = {}
+    for program in programs:
+        for mode in modes:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[f"{program}/{mode}"] = executor.submit(
+                    run_case, program, mode, repeat
+                ).result()
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float = 0.25,
+) -> list[str]:
+    """
+    Compares throughput, peak memory and peak block counts against a baseline,
+    allowing `tolerance` relative slack for machine noise.
+    """
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        expected = baseline[case]
+        if result["lines_per_second"] < expected["lines_per_second"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{case}: {result['lines_per_second']:.0f} lines/s, "
+                f"baseline {expected['lines_per_second']:.0f}"
+            )
+        for metric in ("peak_rss_kb", "peak_allocated_kb", "peak_blocks"):
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{case}: {metric} {result[metric]}, baseline {expected[metric]}"
+                )
+    return regressions
+
+
+def format_results(results: dict[str, dict[str, float]]) -> str:
+    rows = [
+        f"{'case':<28}{'lines':>10}{'lines/s':>12}{'peak RSS KB':>14}"
+        f"{'peak alloc KB':>15}{'blocks':>10}"
+    ]
+    for case, result in results.items():
+        rows.append(
+            f"{case:<28}{result['lines']:>10}{result['lines_per_second']:>12.0f}"
+            f"{result['peak_rss_kb']:>14}{result['peak_allocated_kb']:>15}"
+            f"{result['peak_blocks']:>10}"
+        )
+    return "\n".join(rows)
+
+
+def benchmark_c_instructions(repeat: int = 5) -> dict[str, float]:
+    """
+    Times encoding every C-instruction in Pong.asm with the string encoder and
+    the precomputed table. Returns the best time per pass in seconds.
+    """
+    instructions = [
+        line
+        for line in clean_lines(PONG.read_text().splitlines())
+        if not line.startswith(("@", "("))
+    ]
+
+    def encode_strings():
+        for instruction in instructions:
+            int(assemble_c_instruction(instruction), 2)
+
+    def encode_table():
+        for instruction in instructions:
+            encode_c_instruction(instruction)
+
+    return {
+        "instructions": len(instructions),
+        "assemble_c_instruction": min(
+            timeit.repeat(encode_strings, number=1, repeat=repeat)
+        ),
+        "encode_c_instruction": min(
+            timeit.repeat(encode_table, number=1, repeat=repeat)
+        ),
+    }
+
+
+def print_c_instruction_benchmark() -> None:
+    results = benchmark_c_instructions()
+    print(f"C-instructions in Pong.asm: {results['instructions']}")
+    for encoder in ("assemble_c_instruction", "encode_c_instruction"):
+        print(f"{encoder}: {results[encoder] * 1000:.2f} ms")
+    print(
+        "speedup: "
+        f"{results['assemble_c_instruction'] / results['encode_c_instruction']:.1f}x"
+    )
+
+
+def benchmark_emulator(max_cycles: int = 20_000_000) -> dict[str, float]:
+    """
+    Runs Pong.hack interpreted and with the JIT, including JIT compile time.
+    Returns instructions per second for each mode.
+    """
+    results = {}
+    for mode in ("interpreted", "jit"):
+        machine = Machine.from_file(PONG_HACK, jit=mode == "jit")
+        start = time.perf_counter()
+        executed = machine.run(max_cycles)
+        results[mode] = executed / (time.perf_counter() - start)
+    return results
+
+
+def print_emulator_benchmark() -> None:
+    results = benchmark_emulator()
+    for mode, instructions_per_second in results.items():
+        print(f"{mode}: {instructions_per_second / 1e6:.2f}M instructions/s")
+    print(f"speedup: {results['jit'] / results['interpreted']:.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the assembler and compares it with a baseline."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda sizes: tuple(int(size) for size in sizes.split(",")),
+        default=SYNTHETIC_SIZES,
+        help="comma-separated line counts of the synthetic programs",
+    )
+    parser.add_argument("--stream", action="store_true", help="also time streaming")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--c-instructions", action="store_true")
+    parser.add_argument("--emulator", action="store_true")
+    arguments = parser.parse_args()
+    if arguments.c_instructions:
+        print_c_instruction_benchmark()
+        sys.exit()
+    if arguments.emulator:
+        print_emulator_benchmark()
+        sys.exit()
+
+    sizes: tuple[int, ...] = arguments.sizes
+    modes = ("assemble", "stream") if arguments.stream else ("assemble",)
+    baseline_path = arguments.baseline
+
+    results = run_suite(sizes, modes, arguments.repeat)
+    print(format_results(results))
+
+    baseline: Optional[dict] = None
+    if arguments.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved baseline to {baseline_path}")
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,489 @@
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+from assembler import C_INSTRUCTIONS, COMP_CODES, JMP_CODES, read_binary
+
+RAM_SIZE = 32768
+ROM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+SCREEN_WIDTH = 512
+SCREEN_HEIGHT = 256
+ROW_BYTES = SCREEN_WIDTH // 8
+
+# Hack stores the leftmost pixel of each word in its least significant bit, while
+# packed image formats put it in the most significant bit of each byte.
+REVERSED_BITS = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+# PNG grayscale uses 0 for black, where Hack uses 1
+PNG_BITS = bytes(byte ^ 0xFF for byte in REVERSED_BITS)
+# Every packed byte of pixels as eight RGB pixels
+PPM_PIXELS = [
+    b"".join(
+        b"\x00\x00\x00" if byte & (1 << bit) else b"\xff\xff\xff"
+        for bit in range(8)
+    )
+    for byte in range(256)
+]
+
+# Python expressions for each ALU computation on the unsigned 16-bit registers
+COMP_EXPRESSIONS: dict[int, str] = {}
+for comp, code in COMP_CODES.items():
+    expression = comp.replace("D", "d").replace("A", "a").replace("!", "~")
+    COMP_EXPRESSIONS[int(f"0{code}", 2)] = expression
+    if "A" in comp:
+        COMP_EXPRESSIONS[int(f"1{code}", 2)] = expression.replace("a", "m")
+
+# Conditions on the signed interpretation of an unsigned 16-bit value
+JUMP_CONDITIONS = {
+    int(JMP_CODES["JGT"], 2): "0 < value < 32768",
+    int(JMP_CODES["JEQ"], 2): "value == 0",
+    int(JMP_CODES["JGE"], 2): "value < 32768",
+    int(JMP_CODES["JLT"], 2): "value >= 32768",
+    int(JMP_CODES["JNE"], 2): "value != 0",
+    int(JMP_CODES["JLE"], 2): "value == 0 or value >= 32768",
+    int(JMP_CODES["JMP"], 2): "True",
+}
+
+# Jumps that are always taken and leave every register untouched. Loading an
+# instruction's own address right before one is the Hack idiom for halting.
+HALTING_JUMPS = {C_INSTRUCTIONS[f"0;{jmp}"] for jmp in ("JEQ", "JGE", "JLE", "JMP")}
+
+
+class Halt:
+    def __repr__(self) -> str:
+        return "HALT"
+
+
+HALT = Halt()
+
+Instruction = Callable[[int, int, int, list[int]], tuple[int, int, int]]
+Block = Callable[[int, int, list[int], int], tuple[int, int, int, int]]
+
+# Most instructions compiled into a single block
+MAX_BLOCK_LENGTH = 128
+
+
+def decode_c_instruction(word: int) -> tuple[str, int, int]:
+    comp = COMP_EXPRESSIONS.get((word >> 6) & 0b1111111)
+    if comp is None:
+        raise ValueError(f"{word:016b} is not a valid C-instruction")
+    return comp, (word >> 3) & 0b111, word & 0b111
+
+
+def c_instruction_source(word: int, name: str = "execute") -> str:
+    """
+    Generates a function executing a C-instruction, taking and returning the
+    A and D registers and the program counter.
+    """
+    comp, dest, jump = decode_c_instruction(word)
+
+    lines = [f"def {name}(a, d, pc, ram):"]
+    if "m" in comp:
+        lines.append("    m = ram[a & 32767]")
+    if comp in ("0", "1", "d", "a", "m"):
+        lines.append(f"    value = {comp}")
+    else:
+        lines.append(f"    value = ({comp}) & 65535")
+    if dest & 0b001:
+        lines.append("    ram[a & 32767] = value")
+    if dest & 0b010:
+        lines.append("    d = value")
+    # The jump target is the value of A before this instruction updates it,
+    # cut to the 15 bits of the PC
+    target = "a"
+    if dest & 0b100:
+        if jump:
+            lines.append("    target = a")
+            target = "target"
+        lines.append("    a = value")
+    if jump:
+        lines.append(f"    if {JUMP_CONDITIONS[jump]}:")
+        lines.append(f"        return a, d, {target} & 32767")
+    lines.append("    return a, d, pc + 1")
+    return "\n".join(lines)
+
+
+def compile_c_instruction(word: int) -> Instruction:
+    namespace: dict = {}
+    exec(c_instruction_source(word), namespace)
+    return namespace["execute"]
+
+
+def block_source(
+    rom: array, code: list, entry: int, name: str = "block"
+) -> str:
+    """
+    Generates a function executing the code starting at `entry` as one block.
+    Unconditional jumps to addresses known at compile time are followed, and
+    conditional jumps become early returns, so a block is a trace through
+    several basic blocks. Jumps back to `entry` loop inside the function
+    until the cycle budget runs out. Blocks stop short of halting loops and
+    never compile an instruction twice. Wherever the value of A is known from
+    an A-instruction it is inlined, so those A-instructions cost nothing.
+
+    The function takes A, D, RAM and the cycle budget and returns A, D, the
+    address to continue at and the number of instructions it executed.
+    """
+    body: list[str] = []
+    loops = False
+    a_value: Optional[int] = None  # Value of A, if set by an A-instruction
+    address = entry
+    visited: set[int] = set()
+
+    def exit_to(target: str, indent: str = "") -> list[str]:
+        nonlocal loops
+        a_result = "a" if a_value is None else str(a_value)
+        if not target.isdigit():
+            # Jumps to the value of A go to the 15 bits the PC holds
+            target = f"{target} & 32767"
+        if target != str(entry):
+            return [f"{indent}return {a_result}, d, {target}, n + {len(visited)}"]
+        loops = True
+        return [
+            *([f"{indent}a = {a_value}"] if a_value is not None else []),
+            f"{indent}n += {len(visited)}",
+            f"{indent}if n >= budget:",
+            f"{indent}    return a, d, {entry}, n",
+            f"{indent}continue",
+        ]
+
+    while (
+        address < len(rom)
+        and (address == entry or code[address] is not HALT)
+        and address not in visited
+        and len(visited) < MAX_BLOCK_LENGTH
+    ):
+        visited.add(address)
+        word = rom[address]
+        address += 1
+        if word < 32768:
+            a_value = word
+            continue
+
+        comp, dest, jump = decode_c_instruction(word)
+        a = "a" if a_value is None else str(a_value)
+        m = "ram[a & 32767]" if a_value is None else f"ram[{a_value}]"
+        expression = comp.replace("a", a).replace("m", m)
+        if comp == "-1":
+            expression = "65535"
+        elif comp not in ("0", "1", "d", "a", "m") and not set("&|") & set(comp):
+            expression = f"({expression}) & 65535"
+        targets = []
+        if dest & 0b001:
+            targets.append(m)
+        if dest & 0b010:
+            targets.append("d")
+        if jump and a_value is None and dest & 0b100:
+            # The jump target is the value of A before it is overwritten
+            body.append("target = a")
+            a = "target"
+        if dest & 0b100:
+            targets.append("a")
+            a_value = None
+        # Test the jump condition on a register holding the value if possible
+        value = "value"
+        if "d" in targets or "a" in targets:
+            value = "d" if "d" in targets else "a"
+        elif not targets and comp in ("0", "1", "d", "a", "m"):
+            value = expression
+        elif jump and jump != 0b111:
+            targets.append("value")
+        if targets:
+            body.append(f"{' = '.join(targets)} = {expression}")
+
+        if jump != 0b111:
+            if jump:
+                condition = JUMP_CONDITIONS[jump].replace("value", value)
+                body.append(f"if {condition}:")
+                body.extend(exit_to(a, indent="    "))
+        elif a.isdigit():
+            address = int(a)
+        else:
+            body.extend(exit_to(a))
+            break
+    else:
+        body.extend(exit_to(str(address)))
+
+    if not loops:
+        lines = [f"def {name}(a, d, ram, budget):", "    n = 0"]
+        return "\n".join(lines + [f"    {line}" for line in body])
+    lines = [f"def {name}(a, d, ram, budget):", "    n = 0", "    while True:"]
+    return "\n".join(lines + [f"        {line}" for line in body])
+
+
+def compile_block(rom: array, code: list, entry: int) -> Block:
+    namespace: dict = {}
+    exec(block_source(rom, code, entry), namespace)
+    return namespace["block"]
+
+
+def predecode(rom: Iterable[int]) -> list[Union[int, Instruction, Halt]]:
+    """
+    Decodes every instruction once. A-instructions become their value,
+    C-instructions a function shared by every occurrence of the same word, and
+    the A-instruction of a halting loop becomes HALT. The result is padded
+    with HALT to the full ROM size, plus one past its end, so running off the
+    program halts.
+    """
+    words = list(rom)
+    if len(words) > ROM_SIZE:
+        raise ValueError(f"Program of {len(words)} words does not fit in ROM")
+
+    compiled: dict[int, Instruction] = {}
+    code: list[Union[int, Instruction, Halt]] = []
+    for address, word in enumerate(words):
+        if word < 32768:
+            is_halt = (
+                word == address
+                and address + 1 < len(words)
+                and words[address + 1] in HALTING_JUMPS
+            )
+            code.append(HALT if is_halt else word)
+        else:
+            if word not in compiled:
+                compiled[word] = compile_c_instruction(word)
+            code.append(compiled[word])
+    code.extend([HALT] * (ROM_SIZE + 1 - len(code)))
+    return code
+
+
+def screen_bytes(ram: list[int]) -> bytes:
+    """
+    The screen memory map as little-endian bytes, so the pixels of each byte
+    run left to right from its least significant bit.
+    """
+    words = array("H", ram[SCREEN:KBD])
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes()
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    chunk = chunk_type + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+
+
+def encode_png(screen: bytes) -> bytes:
+    """
+    Encodes the screen as a 1-bit grayscale PNG.
+    """
+    pixels = screen.translate(PNG_BITS)
+    # Each scanline starts with a filter type byte, 0 for no filtering
+    scanlines = b"".join(
+        b"\x00" + pixels[row : row + ROW_BYTES]
+        for row in range(0, len(pixels), ROW_BYTES)
+    )
+    header = struct.pack(">IIBBBBB", SCREEN_WIDTH, SCREEN_HEIGHT, 1, 0, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            png_chunk(b"IHDR", header),
+            png_chunk(b"IDAT", zlib.compress(scanlines, 1)),
+            png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+def encode_pbm(screen: bytes) -> bytes:
+    return f"P4\n{SCREEN_WIDTH} {SCREEN_HEIGHT}\n".encode() + screen.translate(
+        REVERSED_BITS
+    )
+
+
+def encode_ppm(screen: bytes) -> bytes:
+    return f"P6\n{SCREEN_WIDTH} {SCREEN_HEIGHT}\n255\n".encode() + b"".join(
+        [PPM_PIXELS[byte] for byte in screen]
+    )
+
+
+IMAGE_ENCODERS = {".png": encode_png, ".pbm": encode_pbm, ".ppm": encode_ppm}
+
+
+def load_hack(hack_code: str) -> array:
+    return array("H", [int(line, 2) for line in hack_code.split()])
+
+
+class Machine:
+    """
+    The Hack computer: ROM, A, D and PC registers, and 32K words of RAM with
+    the screen memory map at SCREEN and the keyboard register at KBD.
+
+    Setting `pc_counts` to a list of ROM_SIZE zeros makes `run` count how often
+    each ROM address executes, at the cost of the JIT and some speed.
+    """
+
+    def __init__(self, rom: Iterable[int], jit: bool = False) -> None:
+        self.rom = array("H", rom)
+        self.code = predecode(self.rom)
+        self.jit = jit
+        self.blocks: list[Optional[Block]] = [None] * (ROM_SIZE + 1)
+        self.ram = [0] * RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+        self.pc_counts: Optional[list[int]] = None
+
+    @classmethod
+    def from_file(cls, path: Path, jit: bool = False) -> "Machine":
+        """
+        Loads a .hack file, or a .bin file of little-endian words.
+        """
+        if path.suffix == ".bin":
+            return cls(read_binary(path), jit)
+        return cls(load_hack(path.read_text()), jit)
+
+    def reset(self) -> None:
+        self.a = self.d = self.pc = 0
+        self.halted = False
+
+    def press_key(self, key: int) -> None:
+        self.ram[KBD] = key
+
+    def run(self, max_cycles: int) -> int:
+        """
+        Executes up to `max_cycles` instructions, stopping early when the
+        program halts. Returns the number of instructions executed. With the
+        JIT enabled whole blocks are executed, so this may overshoot
+        `max_cycles` by up to one block.
+        """
+        if self.pc_counts is not None:
+            return self.interpret_counting(max_cycles)
+        if self.jit:
+            return self.run_blocks(max_cycles)
+        return self.interpret(max_cycles)
+
+    def interpret(self, max_cycles: int) -> int:
+        code, ram = self.code, self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = max_cycles
+        for cycle in range(max_cycles):
+            instruction = code[pc]
+            if instruction.__class__ is int:
+                a = instruction
+                pc += 1
+            elif instruction is HALT:
+                self.halted = True
+                executed = cycle
+                break
+            else:
+                a, d, pc = instruction(a, d, pc, ram)
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def interpret_counting(self, max_cycles: int) -> int:
+        code, ram, counts = self.code, self.ram, self.pc_counts
+        a, d, pc = self.a, self.d, self.pc
+        executed = max_cycles
+        for cycle in range(max_cycles):
+            instruction = code[pc]
+            if instruction is HALT:
+                self.halted = True
+                executed = cycle
+                break
+            counts[pc] += 1
+            if instruction.__class__ is int:
+                a = instruction
+                pc += 1
+            else:
+                a, d, pc = instruction(a, d, pc, ram)
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def run_blocks(self, max_cycles: int) -> int:
+        blocks, ram = self.blocks, self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        while executed < max_cycles:
+            block = blocks[pc]
+            if block is None:
+                if self.code[pc] is HALT:
+                    self.halted = True
+                    break
+                block = blocks[pc] = compile_block(self.rom, self.code, pc)
+            a, d, pc, n = block(a, d, ram, max_cycles - executed)
+            executed += n
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def step(self) -> int:
+        return self.interpret(1)
+
+    def screen_array(self):
+        """
+        The screen as a 256x512 NumPy array of uint8, 1 for black pixels.
+        Requires NumPy.
+        """
+        import numpy as np
+
+        screen = np.frombuffer(screen_bytes(self.ram), dtype=np.uint8)
+        return np.unpackbits(screen, bitorder="little").reshape(
+            SCREEN_HEIGHT, SCREEN_WIDTH
+        )
+
+    def write_screen(self, path: Path) -> Path:
+        """
+        Writes a snapshot of the screen as .png, .pbm or .ppm, by suffix.
+        """
+        if path.suffix not in IMAGE_ENCODERS:
+            raise ValueError(f"Image type {repr(path.suffix)} not supported")
+        path.write_bytes(IMAGE_ENCODERS[path.suffix](screen_bytes(self.ram)))
+        return path
+
+    def capture(
+        self, max_cycles: int, every: int, directory: Path, suffix: str = ".png"
+    ) -> list[Path]:
+        """
+        Runs for up to `max_cycles` instructions, writing a frame to
+        `directory` every `every` instructions and once more on halting.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        frames = []
+        executed = 0
+        while executed < max_cycles and not self.halted:
+            executed += self.run(min(every, max_cycles - executed))
+            frame = directory.joinpath(f"frame{len(frames):06d}{suffix}")
+            frames.append(self.write_screen(frame))
+        return frames
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Runs a Hack program.")
+    parser.add_argument("program", type=Path)
+    parser.add_argument("max_cycles", type=int, nargs="?", default=10_000_000)
+    parser.add_argument("--jit", action="store_true")
+    parser.add_argument("--frames", type=int, help="frames to capture as images")
+    parser.add_argument("--screenshot", type=Path)
+    arguments = parser.parse_args()
+
+    target_file = arguments.program
+    machine = Machine.from_file(target_file, jit=arguments.jit)
+    max_cycles = arguments.max_cycles
+    start = time.perf_counter()
+    if arguments.frames:
+        frames_dir = target_file.parent.joinpath(f"{target_file.stem}_frames")
+        executed = machine.cycles
+        frames = machine.capture(max_cycles, arguments.frames, frames_dir)
+        executed = machine.cycles - executed
+        print(f"Wrote {len(frames)} frames to {frames_dir}")
+    else:
+        executed = machine.run(max_cycles)
+    elapsed = time.perf_counter() - start
+    if arguments.screenshot:
+        machine.write_screen(arguments.screenshot)
+    print(
+        f"{executed} instructions in {elapsed:.2f} s "
+        f"({executed / elapsed / 1e6:.2f}M instructions/s)"
+        + (", halted" if machine.halted else "")
+    )
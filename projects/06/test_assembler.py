@@ -1,8 +1,27 @@
+import io
+
 import pytest
 from pathlib import Path
 import subprocess
+import sys
 
-from assembler import assemble
+from assembler import (
+    ListingEntry,
+    assemble,
+    assemble_batch,
+    assemble_stream,
+    assemble_c_instruction,
+    assemble_file,
+    assemble_words,
+    collect_sources,
+    count_pinned_instructions,
+    encode_c_instruction,
+    optimize_lines,
+    read_binary,
+    read_listing,
+    words_to_hack,
+    write_binary,
+)
 
 
 hack_files_dir = Path(__file__).parent.joinpath("test").glob("*.hack")
@@ -40,8 +59,200 @@ def test_assembler_outputs_code_to_file_in_current_dir(hack_file: Path, tmp_path
     tmp_script = tmp_path.joinpath(assembly_file.name)
     tmp_script.write_text(assembly_file.read_text())
     assembler_script = Path(__file__).parent.joinpath("assembler.py")
-    subprocess.run(["python3.10", str(assembler_script), str(tmp_script)])
+    subprocess.run([sys.executable, str(assembler_script), str(tmp_script)])
 
     expected_file_name = f"{program}.hack"
     assert [path.name for path in tmp_path.glob("*.hack")] == [expected_file_name]
     assert tmp_path.joinpath(expected_file_name).read_text() == hack_file.read_text()
+
+
+@pytest.mark.parametrize(
+    "hack_file",
+    hack_files,
+    ids=[file_.stem for file_ in hack_files],
+)
+def test_binary_output_round_trips(hack_file: Path, tmp_path):
+    program = hack_file.stem
+    assembly_file = (
+        Path(__file__)
+        .parent.joinpath(program.replace("L", "").lower())
+        .joinpath(f"{program}.asm")
+    )
+    words = assemble_words(assembly_file.read_text())
+    binary_file = tmp_path.joinpath(f"{program}.bin")
+    write_binary(words, binary_file)
+
+    assert binary_file.stat().st_size == 2 * len(hack_file.read_text().splitlines())
+    assert words_to_hack(read_binary(binary_file)) == hack_file.read_text()
+
+
+@pytest.mark.parametrize(
+    "hack_file",
+    hack_files,
+    ids=[file_.stem for file_ in hack_files],
+)
+@pytest.mark.parametrize("from_path", [True, False], ids=["path", "iterator"])
+def test_streaming_assembly_matches_assemble(hack_file: Path, from_path: bool):
+    program = hack_file.stem
+    assembly_file = (
+        Path(__file__)
+        .parent.joinpath(program.replace("L", "").lower())
+        .joinpath(f"{program}.asm")
+    )
+    output = io.StringIO()
+    if from_path:
+        n_words = assemble_stream(assembly_file, output)
+    else:
+        with assembly_file.open() as file_:
+            n_words = assemble_stream(iter(file_), output)
+
+    assert output.getvalue() == hack_file.read_text()
+    assert n_words == len(hack_file.read_text().splitlines())
+
+
+@pytest.mark.parametrize(
+    "instruction", ["MD=M+1", "DM=M+1", "AMD=D|M;JNE", "0;JMP", "D=!A"]
+)
+def test_encodes_c_instruction_from_table(instruction: str):
+    expected_code = int(assemble_c_instruction(instruction), 2)
+    assert encode_c_instruction(instruction) == expected_code
+
+
+def test_rejects_invalid_c_instruction():
+    with pytest.raises(ValueError):
+        encode_c_instruction("D=M*2")
+
+
+def test_batch_assembly_reuses_cache(tmp_path):
+    programs = tmp_path.joinpath("programs")
+    cache_dir = tmp_path.joinpath("cache")
+    for hack_file in hack_files:
+        program = hack_file.stem
+        assembly_file = (
+            Path(__file__)
+            .parent.joinpath(program.replace("L", "").lower())
+            .joinpath(f"{program}.asm")
+        )
+        programs.joinpath(program.lower()).mkdir(parents=True)
+        programs.joinpath(program.lower(), assembly_file.name).write_text(
+            assembly_file.read_text()
+        )
+    sources = collect_sources([str(programs)])
+
+    assembled, cached = assemble_batch(sources, cache_dir=cache_dir, max_workers=2)
+    assert (len(assembled), len(cached)) == (len(hack_files), 0)
+
+    for hack_file in programs.rglob("*.hack"):
+        hack_file.unlink()
+    assembled, cached = assemble_batch(sources, cache_dir=cache_dir, listing=True)
+    assert (len(assembled), len(cached)) == (0, len(hack_files))
+    for hack_file in hack_files:
+        [output] = programs.rglob(hack_file.name)
+        assert output.read_text() == hack_file.read_text()
+        listing = read_listing(output.with_suffix(".lst"))
+        assert len(listing) == len(hack_file.read_text().splitlines())
+
+
+def test_batch_assembly_writes_listings(tmp_path):
+    sources = []
+    for program in ("Max", "Rect"):
+        source = tmp_path.joinpath(f"{program}.asm")
+        source.write_text(
+            Path(__file__).parent.joinpath(program.lower(), source.name).read_text()
+        )
+        sources.append(source)
+    assemble_batch(sources, cache_dir=tmp_path.joinpath("cache"), listing=True)
+    for source in sources:
+        assert read_listing(source.with_suffix(".lst"))
+
+
+def test_optimizer_removes_redundant_instructions():
+    lines = ["@SP", "M=M+1", "@SP", "M=M-1", "A=M", "M=D", "D=M", "@R13", "@R14"]
+    assert list(optimize_lines(lines)) == ["@SP", "A=M", "M=D", "@R14"]
+
+
+def test_optimizer_does_not_cross_labels_or_jumps():
+    lines = ["@LOOP", "M=M+1", "(LOOP)", "@LOOP", "M=M-1", "D;JGT", "@LOOP", "M=D"]
+    assert list(optimize_lines(lines)) == lines
+
+
+INCREMENT_AND_DECREMENT = ["@SP", "M=M+1", "@SP", "M=M-1"]
+
+
+@pytest.mark.parametrize(
+    "jump, pinned",
+    [
+        (["@4", "0;JMP"], 4),
+        # The address reaches the jump through D and R15
+        (["@4", "D=A", "@R15", "M=D", "A=M", "0;JMP"], 4),
+        # 5 is only used to address RAM
+        (["@5", "M=-1"], 0),
+    ],
+    ids=["direct", "through-ram", "ram-address"],
+)
+def test_optimizer_keeps_numeric_jump_targets_in_place(jump: list[str], pinned: int):
+    lines = INCREMENT_AND_DECREMENT + jump
+    assert count_pinned_instructions(lines) == pinned
+    optimized = list(optimize_lines(lines, pinned))
+    assert optimized == (lines if pinned else jump)
+
+
+@pytest.mark.parametrize(
+    "hack_file",
+    hack_files,
+    ids=[file_.stem for file_ in hack_files],
+)
+def test_optimized_assembly_is_never_larger(hack_file: Path):
+    program = hack_file.stem
+    assembly_file = (
+        Path(__file__)
+        .parent.joinpath(program.replace("L", "").lower())
+        .joinpath(f"{program}.asm")
+    )
+    optimized = assemble(assembly_file.read_text(), optimize=True)
+    assert len(optimized.splitlines()) <= len(hack_file.read_text().splitlines())
+    for source in (assembly_file, assembly_file.read_text().splitlines()):
+        output = io.StringIO()
+        assemble_stream(source, output, optimize=True)
+        assert output.getvalue() == optimized
+
+
+def test_optimizer_shrinks_pong():
+    assembly_code = Path(__file__).parent.joinpath("pong", "Pong.asm").read_text()
+    assert len(assemble_words(assembly_code, optimize=True)) < len(
+        assemble_words(assembly_code)
+    )
+
+
+@pytest.mark.parametrize("optimize", [False, True], ids=["plain", "optimized"])
+def test_listing_maps_rom_addresses_to_source(optimize: bool, tmp_path):
+    assembly_file = tmp_path.joinpath("Prog.asm")
+    assembly_file.write_text(
+        "\n".join(
+            [
+                "// push constant 7",
+                "@7",
+                "D=A",
+                "@SP",
+                "A=M",
+                "M=D",
+                "@SP",
+                "M=M+1",
+                "(LOOP)",
+                "// pop temp 0",
+                "@SP",
+                "M=M-1 // inline comments are not VM commands",
+                "A=M",
+                "D=M",
+                "@5",
+                "M=D",
+            ]
+        )
+    )
+    assemble_file(assembly_file, optimize=optimize, listing=True)
+
+    listing = read_listing(assembly_file.with_suffix(".lst"))
+    hack_code = assembly_file.with_suffix(".hack").read_text().splitlines()
+    assert [entry.address for entry in listing] == list(range(len(hack_code)))
+    assert listing[0] == ListingEntry(0, 2, "", "push constant 7", "@7")
+    assert listing[8] == ListingEntry(8, 12, "LOOP", "pop temp 0", "M=M-1")
@@ -0,0 +1,205 @@
+import zlib
+from pathlib import Path
+
+import pytest
+
+from assembler import assemble_words
+from emulator import (
+    KBD,
+    ROM_SIZE,
+    SCREEN,
+    Machine,
+    c_instruction_source,
+    encode_pbm,
+    screen_bytes,
+)
+
+test_dir = Path(__file__).parent.joinpath("test")
+
+
+def load_program(program: str, optimize: bool = False, jit: bool = False) -> Machine:
+    assembly_file = (
+        Path(__file__)
+        .parent.joinpath(program.replace("L", "").lower())
+        .joinpath(f"{program}.asm")
+    )
+    return Machine(assemble_words(assembly_file.read_text(), optimize=optimize), jit)
+
+
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_runs_add(jit: bool):
+    machine = Machine.from_file(test_dir.joinpath("Add.hack"), jit)
+    machine.run(100)
+    assert machine.halted
+    assert machine.ram[0] == 5
+
+
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_counts_executed_addresses(jit: bool):
+    machine = load_program("Max", jit=jit)
+    machine.pc_counts = [0] * ROM_SIZE
+    machine.ram[0], machine.ram[1] = 3, 5
+    executed = machine.run(100)
+    assert machine.halted
+    assert sum(machine.pc_counts) == executed
+    assert machine.pc_counts[0] == 1
+
+
+# Jumps to 32774, which the 15-bit PC turns into address 6
+WRAPPING_JUMP = """
+@32767
+D=A
+@7
+A=D+A
+0;JMP
+D=0
+@0
+M=D
+@8
+0;JMP
+"""
+
+
+@pytest.mark.parametrize("counting", [False, True], ids=["plain", "counting"])
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_masks_jump_targets_to_15_bits(jit: bool, counting: bool):
+    machine = Machine(assemble_words(WRAPPING_JUMP), jit)
+    if counting:
+        machine.pc_counts = [0] * ROM_SIZE
+    machine.run(100)
+    assert machine.halted
+    assert machine.ram[0] == 32767
+
+
+@pytest.mark.parametrize("counting", [False, True], ids=["plain", "counting"])
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_halts_after_jumping_past_the_program(jit: bool, counting: bool):
+    machine = Machine(assemble_words("A=-1\n0;JMP"), jit)
+    if counting:
+        machine.pc_counts = [0] * ROM_SIZE
+    machine.run(100)
+    assert machine.halted
+    assert machine.pc == 32767
+
+
+@pytest.mark.parametrize(
+    "program, optimize", [("Max", False), ("Max", True), ("MaxL", False)]
+)
+@pytest.mark.parametrize("x, y", [(3, 5), (5, 3), (-4, 2), (-4, -9)])
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_runs_max(program: str, optimize: bool, x: int, y: int, jit: bool):
+    machine = load_program(program, optimize, jit)
+    machine.ram[0], machine.ram[1] = x & 0xFFFF, y & 0xFFFF
+    machine.run(100)
+    assert machine.halted
+    assert machine.ram[2] == max(x, y) & 0xFFFF
+
+
+@pytest.mark.parametrize(
+    "program, optimize", [("Rect", False), ("Rect", True), ("RectL", False)]
+)
+@pytest.mark.parametrize("jit", [False, True], ids=["interpreted", "jit"])
+def test_runs_rect(program: str, optimize: bool, jit: bool):
+    machine = load_program(program, optimize, jit)
+    machine.ram[0] = 10
+    machine.run(10_000)
+    assert machine.halted
+    rows = [
+        machine.ram[SCREEN + row * 32 : SCREEN + row * 32 + 2] for row in range(12)
+    ]
+    assert rows == [[0xFFFF, 0]] * 10 + [[0, 0]] * 2
+
+
+@pytest.mark.parametrize("optimize", [False, True], ids=["plain", "optimized"])
+def test_runs_pong_without_halting(optimize: bool):
+    machine = load_program("Pong", optimize)
+    machine.press_key(0)
+    # The OS takes about four million instructions to initialise
+    assert machine.run(5_000_000) == 5_000_000
+    assert not machine.halted
+    assert any(machine.ram[SCREEN:KBD])
+
+
+def test_jit_matches_interpreter_on_pong():
+    jit_machine = Machine.from_file(test_dir.joinpath("Pong.hack"), jit=True)
+    executed = jit_machine.run(5_000_000)
+    machine = Machine.from_file(test_dir.joinpath("Pong.hack"))
+    assert machine.run(executed) == executed
+    assert (machine.a, machine.d, machine.pc) == (
+        jit_machine.a,
+        jit_machine.d,
+        jit_machine.pc,
+    )
+    assert machine.ram == jit_machine.ram
+
+
+def test_c_instruction_jumps_to_a_before_it_is_overwritten():
+    # AM=M-1;JMP must jump to the old value of A and write M at the old address
+    namespace: dict = {}
+    exec(c_instruction_source(int("1111110010101111", 2)), namespace)
+    ram = [0] * 8
+    ram[3] = 6
+    assert namespace["execute"](3, 0, 0, ram) == (5, 0, 3)
+    assert ram[3] == 5
+
+
+def run_rect() -> Machine:
+    machine = load_program("Rect")
+    machine.ram[0] = 3
+    machine.run(10_000)
+    return machine
+
+
+def test_writes_pbm_snapshot(tmp_path):
+    snapshot = run_rect().write_screen(tmp_path.joinpath("rect.pbm"))
+    header = snapshot.read_bytes().split(b"\n", maxsplit=2)[:2]
+    assert header == [b"P4", b"512 256"]
+    raster = snapshot.read_bytes()[len(b"P4\n512 256\n") :]
+    assert len(raster) == 256 * 64
+    assert raster[:64] == b"\xff\xff" + bytes(62)
+    assert raster[3 * 64 :] == bytes(253 * 64)
+
+
+def test_writes_png_snapshot(tmp_path):
+    png = run_rect().write_screen(tmp_path.joinpath("rect.png")).read_bytes()
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    idat_length = int.from_bytes(png[33:37], "big")
+    assert png[37:41] == b"IDAT"
+    scanlines = zlib.decompress(png[41 : 41 + idat_length])
+    assert len(scanlines) == 256 * 65
+    # Filter byte, 16 black pixels, then white
+    assert scanlines[:65] == b"\x00\x00\x00" + b"\xff" * 62
+
+
+def test_screen_array():
+    np = pytest.importorskip("numpy")
+    pixels = run_rect().screen_array()
+    assert pixels.shape == (256, 512)
+    assert pixels[:3, :16].all()
+    assert pixels.sum() == 3 * 16
+    assert np.array_equal(pixels[3:], np.zeros((253, 512), dtype=np.uint8))
+
+
+
+def test_screen_array_matches_pbm_encoder():
+    np = pytest.importorskip("numpy")
+    machine = Machine([])
+    # A pattern that is different in every word and bit position
+    machine.ram[SCREEN:KBD] = [
+        (address * 40503) & 0xFFFF for address in range(KBD - SCREEN)
+    ]
+    raster = encode_pbm(screen_bytes(machine.ram))[len(b"P4\n512 256\n") :]
+    assert np.packbits(machine.screen_array(), axis=1).tobytes() == raster
+
+
+def test_captures_frames(tmp_path):
+    machine = load_program("Rect")
+    machine.ram[0] = 3
+    frames = machine.capture(10_000, 20, tmp_path, suffix=".pbm")
+    assert machine.halted
+    assert [frame.name for frame in frames] == [
+        f"frame{i:06d}.pbm" for i in range(len(frames))
+    ]
+    assert frames[-1].read_bytes() == run_rect().write_screen(
+        tmp_path.joinpath("last.pbm")
+    ).read_bytes()
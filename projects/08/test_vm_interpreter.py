@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from vm_interpreter import VirtualMachine
+from vm_ir import parse
+
+# The Jack compiler lives with project 11
+sys.path.insert(0, str(Path(__file__).parents[1].joinpath("11")))
+from compiler import compile_  # noqa: E402
+
+function_calls_dir = Path(__file__).parent.joinpath("FunctionCalls")
+program_flow_dir = Path(__file__).parent.joinpath("ProgramFlow")
+
+# Expected RAM contents from the course's .cmp files
+EXPECTED_RAM = {
+    "FibonacciElement": {0: 262, 261: 3},
+    "NestedCall": {0: 261, 1: 261, 2: 256, 3: 4000, 4: 5000, 5: 135, 6: 246},
+    "StaticsTest": {0: 263, 261: -2 & 0xFFFF, 262: 8},
+}
+
+
+@pytest.mark.parametrize("program", EXPECTED_RAM)
+def test_runs_function_calls(program: str):
+    vm = VirtualMachine.from_path(function_calls_dir.joinpath(program))
+    vm.run(10_000)
+    assert vm.halted
+    for address, value in EXPECTED_RAM[program].items():
+        assert vm.ram[address] == value
+
+
+def test_runs_simple_function():
+    vm = VirtualMachine.from_path(
+        function_calls_dir.joinpath("SimpleFunction", "SimpleFunction.vm")
+    )
+    vm.ram[0:5] = [317, 317, 310, 3000, 4000]
+    vm.ram[310:317] = [1234, 37, 1000, 305, 300, 3010, 4010]
+    vm.run(10)
+    assert vm.ram[0:5] == [311, 305, 300, 3010, 4010]
+    assert vm.ram[310] == 1196
+
+
+def test_runs_basic_loop():
+    vm = VirtualMachine.from_path(program_flow_dir.joinpath("BasicLoop"))
+    vm.ram[0:3] = [256, 300, 400]
+    vm.ram[400] = 3
+    vm.run(10_000)
+    assert vm.halted
+    assert vm.ram[0] == 257
+    assert vm.ram[256] == 6
+
+
+def test_runs_fibonacci_series():
+    vm = VirtualMachine.from_path(program_flow_dir.joinpath("FibonacciSeries"))
+    vm.ram[0:3] = [256, 300, 400]
+    vm.ram[400:402] = [6, 3000]
+    vm.run(10_000)
+    assert vm.halted
+    assert vm.ram[3000:3006] == [0, 1, 1, 2, 3, 5]
+
+
+@pytest.mark.parametrize(
+    "comp, x, y, expected",
+    [
+        ("gt", 5, 3, True),
+        ("gt", -4, 2, False),
+        ("lt", -4, 2, True),
+        ("lt", 2, -4, False),
+        ("eq", -4, -4, True),
+    ],
+)
+def test_signed_comparisons(comp: str, x: int, y: int, expected: bool):
+    vm = VirtualMachine(
+        {"Sys": parse(f"push constant {x}\npush constant {y}\n{comp}\npop temp 0")}
+    )
+    vm.ram[0] = 256
+    vm.run(4)
+    assert vm.ram[5] == (0xFFFF if expected else 0)
+
+
+def test_runs_compiled_jack_with_builtins():
+    printed = []
+
+    def print_int(vm: VirtualMachine, args: list[int]) -> int:
+        printed.append(args[0])
+        return 0
+
+    jack_code = Path(__file__).parents[1].joinpath("11", "Seven", "Main.jack")
+    vm = VirtualMachine(
+        {"Main": parse(compile_(jack_code.read_text()))},
+        builtins={"Output.printInt": print_int},
+    )
+    vm.run(1000)
+    assert vm.halted
+    assert printed == [7]
+
+
+def test_rejects_undefined_functions():
+    with pytest.raises(ValueError, match="Output.printInt"):
+        VirtualMachine({"Main": parse("function Main.main 0\ncall Output.printInt 1")})
+
+
+@pytest.mark.parametrize(
+    "call, message",
+    [
+        ("push constant 7\npush constant 0\ncall Math.divide 2", "Division by zero"),
+        (
+            "push constant 0\npush constant 4\nsub\ncall Math.sqrt 1",
+            "Square root of negative number -4",
+        ),
+    ],
+)
+def test_builtins_report_errors_with_context(call: str, message: str):
+    vm = VirtualMachine({"Main": parse(f"function Main.main 0\n{call}\nreturn")})
+    expected = f"Math.\\w+ called from Main.main at pc \\d+: {message}"
+    with pytest.raises(ValueError, match=expected):
+        vm.run(100)
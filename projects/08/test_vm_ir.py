@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from vm_ir import Command, Opcode, PassManager, Segment, parse
+
+vm_files = sorted(Path(__file__).parent.rglob("*.vm"))
+
+
+def test_parses_commands():
+    assert parse("push local 2 // comment\n\nadd\ncall Math.multiply 2\n") == [
+        Command(Opcode.PUSH, Segment.LOCAL, 2),
+        Command(Opcode.ADD),
+        Command(Opcode.CALL, index=2, symbol="Math.multiply"),
+    ]
+
+
+@pytest.mark.parametrize("vm_file", vm_files, ids=[file_.stem for file_ in vm_files])
+def test_formats_back_to_vm_code(vm_file: Path):
+    commands = parse(vm_file.read_text())
+    assert parse("\n".join(str(command) for command in commands)) == commands
+
+
+def test_interns_symbols():
+    first, second = parse("label LOOP\ngoto LOOP")
+    assert first.symbol is second.symbol
+
+
+@pytest.mark.parametrize(
+    "line", ["push", "push nowhere 1", "pop local x", "add 1", "goto", "jump END"]
+)
+def test_rejects_invalid_commands(line: str):
+    with pytest.raises(ValueError, match=line):
+        parse(line)
+
+
+def test_pass_manager_runs_passes_in_order():
+    seen = []
+
+    def count(commands: list[Command]) -> list[Command]:
+        seen.append(len(commands))
+        return commands
+
+    def drop_first(commands: list[Command]) -> list[Command]:
+        return commands[1:]
+
+    manager = PassManager([count, drop_first]).add(count)
+    assert manager.run(parse("push constant 1\npush constant 2\nadd")) == parse(
+        "push constant 2\nadd"
+    )
+    assert seen == [3, 2]
@@ -0,0 +1,59 @@
+import pytest
+
+from vm_ir import parse
+from vm_passes import fold_constants, wrap
+
+
+@pytest.mark.parametrize(
+    "vm_code, expected",
+    [
+        ("push constant 2\npush constant 3\nadd", "push constant 5"),
+        ("push constant 2\npush constant 3\nsub", "push constant -1"),
+        ("push constant 1\nneg", "push constant -1"),
+        ("push constant 0\nnot", "push constant -1"),
+        ("push constant 12\npush constant 10\nand", "push constant 8"),
+        ("push constant 12\npush constant 3\nor", "push constant 15"),
+        ("push constant 3\npush constant 3\neq", "push constant -1"),
+        ("push constant 1\nneg\npush constant 2\ngt", "push constant 0"),
+        ("push constant 1\nneg\npush constant 2\nlt", "push constant -1"),
+        ("push constant 32767\npush constant 1\nadd", "push constant -32768"),
+        (
+            "push constant 0\npush constant 32767\nsub\npush constant 2\nsub",
+            "push constant 32767",
+        ),
+        (
+            "push constant 1\npush constant 2\nadd\npush constant 3\nadd",
+            "push constant 6",
+        ),
+        ("push local 0\npush constant 0\nadd", "push local 0"),
+        ("push local 0\npush constant 0\nsub", "push local 0"),
+        ("push local 0\npush constant 0\nor", "push local 0"),
+        ("push local 0\npush constant 0\nnot\nand", "push local 0"),
+        ("push constant 0\npush local 0\nadd", "push local 0"),
+        ("push local 0\nnot\nnot", "push local 0"),
+        ("push local 0\nneg\nneg", "push local 0"),
+    ],
+)
+def test_folds_constants(vm_code: str, expected: str):
+    assert fold_constants(parse(vm_code)) == parse(expected)
+
+
+@pytest.mark.parametrize(
+    "vm_code",
+    [
+        "push constant 0\npush local 0\nsub",
+        "push local 0\npush constant 1\nadd",
+        "push constant 1\nlabel L\npush constant 2\nadd",
+        "push constant 0\ncall Math.abs 0\nadd",
+        "push local 0\nnot\nneg",
+    ],
+)
+def test_leaves_other_code_alone(vm_code: str):
+    assert fold_constants(parse(vm_code)) == parse(vm_code)
+
+
+@pytest.mark.parametrize(
+    "value, expected", [(32768, -32768), (-32769, 32767), (65535, -1), (-1, -1)]
+)
+def test_wrap(value: int, expected: int):
+    assert wrap(value) == expected
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+from vm_interpreter import VirtualMachine
+from vm_profiler import Profiler, hack_cycles_by_function, routine_name
+from vm_translator import translate_folder
+
+# The assembler and emulator live with project 06
+sys.path.insert(0, str(Path(__file__).parents[1].joinpath("06")))
+from assembler import assemble_words, iter_listing, iter_source_lines  # noqa: E402
+from emulator import ROM_SIZE, Machine  # noqa: E402
+
+fibonacci_dir = Path(__file__).parent.joinpath("FunctionCalls", "FibonacciElement")
+
+
+def profile_fibonacci() -> tuple[Profiler, VirtualMachine]:
+    profiler = Profiler()
+    vm = VirtualMachine.from_path(fibonacci_dir, profiler=profiler)
+    vm.run(10_000)
+    return profiler, vm
+
+
+def test_counts_calls_and_commands():
+    profiler, vm = profile_fibonacci()
+    assert profiler.calls == {"Sys.init": 1, "Main.fibonacci": 9}
+    exclusive, inclusive = profiler.exclusive(), profiler.inclusive()
+    assert sum(exclusive.values()) == vm.steps
+    assert inclusive["Sys.init"] == vm.steps
+    assert inclusive["Main.fibonacci"] == vm.steps - exclusive["Sys.init"]
+
+
+def test_writes_collapsed_stacks():
+    profiler, vm = profile_fibonacci()
+    lines = profiler.collapsed().splitlines()
+    assert "Sys.init;Main.fibonacci;Main.fibonacci 32" in lines
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == vm.steps
+
+
+def test_report_lists_functions_by_exclusive_count():
+    profiler, _ = profile_fibonacci()
+    rows = profiler.report().splitlines()
+    assert rows[1].startswith("Main.fibonacci")
+    assert rows[2].startswith("Sys.init")
+
+
+def test_counts_hack_cycles_by_function():
+    asm = translate_folder(fibonacci_dir, cache_dir=None, trampolines=True)
+    machine = Machine(assemble_words(asm))
+    machine.pc_counts = [0] * ROM_SIZE
+    executed = machine.run(100_000)
+    assert machine.halted
+    listing = iter_listing(iter_source_lines(asm.splitlines()))
+    cycles = hack_cycles_by_function(machine.pc_counts, listing)
+    assert sum(cycles.values()) == executed
+    assert set(cycles) == {
+        "BOOTSTRAP",
+        "Sys.init",
+        "Main.fibonacci",
+        "$CALL",
+        "$RETURN",
+    }
+
+
+def test_routine_names():
+    assert routine_name("Main.main$LOOP") == "Main.main"
+    assert routine_name("Main.main$RETURN$3") == "Main.main"
+    assert routine_name("$EQ_TRUE") == "$EQ"
+    assert routine_name("BOOTSTRAP$RETURN$0") == "BOOTSTRAP"
+    assert routine_name("") == "BOOTSTRAP"
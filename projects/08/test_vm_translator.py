@@ -0,0 +1,391 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import vm_translator
+from vm_passes import fold_constants
+
+# The assembler and emulator live with project 06
+sys.path.insert(0, str(Path(__file__).parents[1].joinpath("06")))
+from assembler import assemble_words  # noqa: E402
+from emulator import Machine  # noqa: E402
+
+function_calls_dir = Path(__file__).parent.joinpath("FunctionCalls")
+
+# Expected RAM contents from the course's .cmp files
+EXPECTED_RAM = {
+    "FibonacciElement": {0: 262, 261: 3},
+    "NestedCall": {0: 261, 1: 261, 2: 256, 3: 4000, 4: 5000, 5: 135, 6: 246},
+    "StaticsTest": {0: 263, 261: -2 & 0xFFFF, 262: 8},
+}
+
+PROGRAM_WITH_DEAD_CODE = """
+function Sys.init 0
+call Main.main 0
+label LOOP
+goto LOOP
+function Main.unused 0
+call Main.helper 0
+return
+function Main.main 0
+call Main.helper 0
+call Math.multiply 2
+return
+function Main.helper 0
+push constant 0
+return
+function Main.recursive 0
+call Main.recursive 0
+return
+"""
+
+
+MODES = {
+    "inlined": {},
+    "trampolines": {"trampolines": True},
+    "shared-comparisons": {"shared_comparisons": True},
+    "cache-tos": {"cache_tos": True},
+    "folded": {"passes": [fold_constants]},
+    "all": {
+        "trampolines": True,
+        "shared_comparisons": True,
+        "cache_tos": True,
+        "eliminate_dead_functions": True,
+        "passes": [fold_constants],
+    },
+}
+
+# Exercises every stack command, a large segment offset and a call. Leaves 106
+# in temp 7.
+ARITHMETIC_PROGRAM = """
+function Sys.init 0
+call Main.run 0
+pop temp 7
+label LOOP
+goto LOOP
+function Main.run 9
+push constant 7
+pop local 8
+push constant 12
+push local 8
+sub
+push constant 3
+and
+push constant 6
+or
+neg
+not
+pop local 0
+push local 0
+push local 8
+push constant 2
+add
+eq
+if-goto SKIP
+push constant 100
+pop static 0
+label SKIP
+push static 0
+push local 0
+add
+return
+"""
+
+
+def translate_folder(folder: Path, **options) -> str:
+    return vm_translator.translate_folder(folder, cache_dir=None, **options)
+
+
+def run_asm(asm: str, max_cycles: int = 100_000) -> Machine:
+    machine = Machine(assemble_words(asm))
+    machine.run(max_cycles)
+    return machine
+
+
+def push_constant(value: int) -> str:
+    return f"push constant {abs(value)}" + ("\nneg" if value < 0 else "")
+
+
+@pytest.mark.parametrize("program", EXPECTED_RAM)
+@pytest.mark.parametrize("mode", MODES)
+def test_runs_function_calls(program: str, mode: str):
+    machine = run_asm(
+        translate_folder(function_calls_dir.joinpath(program), **MODES[mode])
+    )
+    assert machine.halted
+    for address, value in EXPECTED_RAM[program].items():
+        assert machine.ram[address] == value
+
+
+@pytest.mark.parametrize("comp", ["eq", "gt", "lt"])
+@pytest.mark.parametrize("x, y", [(3, 5), (5, 3), (4, 4), (-4, 2), (2, -4)])
+@pytest.mark.parametrize("mode", MODES)
+def test_comparisons(comp: str, x: int, y: int, mode: str):
+    vm_code = "\n".join(
+        [
+            "function Sys.init 0",
+            push_constant(x),
+            push_constant(y),
+            comp,
+            "pop temp 0",
+            push_constant(y),
+            push_constant(x),
+            comp,
+            "pop temp 1",
+            "label LOOP",
+            "goto LOOP",
+        ]
+    )
+    machine = run_asm(vm_translator.translate(vm_code, "Sys", **MODES[mode]))
+    compare = {"eq": int.__eq__, "gt": int.__gt__, "lt": int.__lt__}[comp]
+    assert machine.ram[5] == (0xFFFF if compare(x, y) else 0)
+    assert machine.ram[6] == (0xFFFF if compare(y, x) else 0)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_runs_arithmetic(mode: str):
+    machine = run_asm(
+        vm_translator.translate(ARITHMETIC_PROGRAM, "Main", **MODES[mode])
+    )
+    assert machine.halted
+    assert machine.ram[12] == 106
+
+
+@pytest.mark.parametrize("cache_tos", [False, True], ids=["memory", "cache-tos"])
+@pytest.mark.parametrize("value", [-1, -2, -32767, -32768, 0, 1, 32767])
+def test_pushes_folded_constants(value: int, cache_tos: bool):
+    vm_code = "\n".join(
+        [
+            "function Sys.init 0",
+            f"push constant {value}",
+            "pop temp 0",
+            "label LOOP",
+            "goto LOOP",
+        ]
+    )
+    machine = run_asm(vm_translator.translate(vm_code, "Sys", cache_tos=cache_tos))
+    assert machine.ram[5] == value & 0xFFFF
+
+
+def test_cache_tos_halves_straight_line_code():
+    vm_code = "push local 0\npush local 1\nadd\npop local 2"
+    inlined = vm_translator.count_instructions(vm_translator.translate(vm_code, "Main"))
+    cached = vm_translator.count_instructions(
+        vm_translator.translate(vm_code, "Main", cache_tos=True)
+    )
+    bootstrap = vm_translator.count_instructions(vm_translator.translate("", "Main"))
+    assert cached - bootstrap < (inlined - bootstrap) / 2
+
+
+def test_shared_comparisons_save_rom():
+    vm_code = "\n".join(
+        ["function Sys.init 0"]
+        + [
+            f"push local 0\npush constant {i}\n{comp}"
+            for i in range(3)
+            for comp in ("eq", "lt")
+        ]
+    )
+    inlined = vm_translator.count_instructions(vm_translator.translate(vm_code, "Sys"))
+    shared = vm_translator.count_instructions(
+        vm_translator.translate(vm_code, "Sys", shared_comparisons=True)
+    )
+    assert shared < inlined
+
+
+@pytest.mark.parametrize("program", EXPECTED_RAM)
+def test_trampolines_save_rom(program: str):
+    folder = function_calls_dir.joinpath(program)
+    inlined = vm_translator.count_instructions(translate_folder(folder))
+    shared = vm_translator.count_instructions(
+        translate_folder(folder, trampolines=True)
+    )
+    assert shared < inlined
+
+
+@pytest.mark.parametrize("n_args, words", [(0, 10), (1, 10), (2, 12)])
+def test_call_site_is_small(n_args: int, words: int):
+    asm = vm_translator.generate_call_site("Math.multiply", n_args, 0)
+    assert vm_translator.count_instructions(asm) == words
+
+
+def test_scopes_labels_to_functions():
+    vm_code = """
+    function Sys.init 0
+    call Main.count 0
+    pop temp 0
+    label LOOP
+    goto LOOP
+    function Main.count 0
+    push constant 3
+    pop temp 1
+    label LOOP
+    push temp 1
+    push constant 1
+    sub
+    pop temp 1
+    push temp 1
+    if-goto LOOP
+    push constant 7
+    return
+    """
+    machine = run_asm(vm_translator.translate(vm_code, "Main"))
+    assert machine.halted
+    assert machine.ram[5] == 7
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_labels_do_not_collide_with_generated_ones(mode: str):
+    vm_code = """
+    function Sys.init 0
+    push constant 1
+    push constant 1
+    eq
+    pop temp 0
+    call Sys.f 0
+    pop temp 1
+    label LOOP
+    goto LOOP
+    label COMP.0
+    label CONT.0
+    label RETURN.0
+    push constant 5
+    pop temp 0
+    goto LOOP
+    function Sys.f 0
+    push constant 9
+    return
+    """
+    machine = run_asm(vm_translator.translate(vm_code, "Sys", **MODES[mode]))
+    assert machine.halted
+    assert (machine.ram[5], machine.ram[6]) == (0xFFFF, 9)
+
+
+def test_rejects_dollar_signs_in_labels():
+    with pytest.raises(ValueError):
+        vm_translator.parse("label Main$COMP$0")
+
+
+def test_reuses_cached_fragments(tmp_path: Path):
+    folder = tmp_path.joinpath("StaticsTest")
+    folder.mkdir()
+    for source in function_calls_dir.joinpath("StaticsTest").glob("*.vm"):
+        folder.joinpath(source.name).write_text(source.read_text())
+    cache_dir = tmp_path.joinpath("cache")
+    sources = list(folder.glob("*.vm"))
+
+    first, translated = vm_translator.translate_files(sources, cache_dir)
+    assert len(translated) == 3
+    second, translated = vm_translator.translate_files(sources, cache_dir)
+    assert translated == [] and second == first
+
+    class1 = folder.joinpath("Class1.vm")
+    class1.write_text(class1.read_text() + "\n// edited\n")
+    _, translated = vm_translator.translate_files(sources, cache_dir)
+    assert translated == [class1]
+    _, translated = vm_translator.translate_files(sources, cache_dir, cache_tos=True)
+    assert len(translated) == 3
+
+
+def test_link_drops_dead_functions():
+    fragments = vm_translator.generate_fragments(
+        vm_translator.parse(
+            "function Sys.init 0\ncall Main.main 0\nfunction Main.main 0\nreturn\n"
+            "function Main.unused 0\nreturn"
+        ),
+        "Main",
+    )
+    kept, removed = vm_translator.split_dead_fragments(fragments)
+    assert [fragment.name for fragment in kept] == ["Sys.init", "Main.main"]
+    assert [fragment.name for fragment in removed] == ["Main.unused"]
+    linked = vm_translator.link(fragments, eliminate_dead_functions=True)
+    assert "(Main.unused)" not in linked
+
+
+def test_split_dead_fragments_follows_calls():
+    fragments = vm_translator.generate_fragments(
+        vm_translator.parse(PROGRAM_WITH_DEAD_CODE), "Main"
+    )
+    kept, removed = vm_translator.split_dead_fragments(fragments)
+    assert [fragment.name for fragment in kept] == [
+        "Sys.init",
+        "Main.main",
+        "Main.helper",
+    ]
+    assert [fragment.name for fragment in removed] == ["Main.unused", "Main.recursive"]
+
+
+def test_split_dead_fragments_follows_calls_from_every_file():
+    fragments = [
+        *vm_translator.generate_fragments(
+            vm_translator.parse("call Main.helper 0\nfunction Sys.init 0"), "Sys"
+        ),
+        *vm_translator.generate_fragments(
+            vm_translator.parse("push constant 0\nfunction Main.helper 0\nreturn"),
+            "Main",
+        ),
+    ]
+    kept, removed = vm_translator.split_dead_fragments(fragments)
+    assert "Main.helper" in [fragment.name for fragment in kept]
+    assert removed == []
+
+
+def test_split_dead_fragments_keeps_programs_without_roots():
+    fragments = vm_translator.generate_fragments(
+        vm_translator.parse("function Main.f 0\npush constant 0\nreturn"), "Main"
+    )
+    assert vm_translator.split_dead_fragments(fragments) == (fragments, [])
+
+
+def test_output_does_not_depend_on_file_order():
+    sources = list(function_calls_dir.joinpath("StaticsTest").glob("*.vm"))
+    in_order, _ = vm_translator.translate_files(sources, cache_dir=None)
+    reversed_order, _ = vm_translator.translate_files(sources[::-1], cache_dir=None)
+    serial = [
+        fragment
+        for source in sorted(sources)
+        for fragment in vm_translator.translate_file(source)
+    ]
+    assert in_order == reversed_order == serial
+
+
+def test_labels_only_depend_on_their_function():
+    function = "function Main.f 0\npush constant 1\npush constant 2\nlt\ncall Main.g 0"
+    [alone] = vm_translator.generate_fragments(vm_translator.parse(function), "Main")
+    _, after_other = vm_translator.generate_fragments(
+        vm_translator.parse("function Main.e 0\neq\ncall Main.g 0\n" + function),
+        "Main",
+    )
+    assert alone == after_other
+
+
+def test_cli_keeps_option_values(tmp_path: Path):
+    folder = tmp_path.joinpath("FibonacciElement")
+    shutil.copytree(function_calls_dir.joinpath("FibonacciElement"), folder)
+    cache_dir = tmp_path.joinpath("my-cache")
+    subprocess.run(
+        [
+            sys.executable,
+            vm_translator.__file__,
+            str(folder),
+            "--fold-constants",
+            f"--cache-dir={cache_dir}",
+        ],
+        check=True,
+    )
+    assert folder.joinpath("FibonacciElement.asm").exists()
+    assert any(cache_dir.iterdir())
+
+
+def test_cli_rejects_unknown_flags(tmp_path: Path):
+    result = subprocess.run(
+        [sys.executable, vm_translator.__file__, str(tmp_path), "--typo"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert "usage:" in result.stderr
+    assert "--typo" in result.stderr
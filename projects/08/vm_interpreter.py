@@ -0,0 +1,389 @@
+import math
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+from vm_ir import Command, Opcode, Segment, parse
+
+if TYPE_CHECKING:
+    from vm_profiler import Profiler
+
+RAM_SIZE = 32768
+SP, LCL, ARG, THIS, THAT = range(5)
+STATIC_BASE = 16
+
+# Predecoded opcodes. Labels are resolved away, so they have none.
+(
+    PUSH_CONSTANT,
+    PUSH_SEGMENT,
+    PUSH_ADDRESS,
+    POP_SEGMENT,
+    POP_ADDRESS,
+    ADD,
+    SUB,
+    NEG,
+    EQ,
+    GT,
+    LT,
+    AND,
+    OR,
+    NOT,
+    GOTO,
+    IF_GOTO,
+    FUNCTION,
+    CALL,
+    CALL_BUILTIN,
+    RETURN,
+) = range(20)
+
+SEGMENT_POINTERS = {
+    Segment.LOCAL: LCL,
+    Segment.ARGUMENT: ARG,
+    Segment.THIS: THIS,
+    Segment.THAT: THAT,
+}
+FIXED_BASES = {Segment.POINTER: 3, Segment.TEMP: 5}
+SIMPLE_OPCODES = {
+    Opcode.ADD: ADD,
+    Opcode.SUB: SUB,
+    Opcode.NEG: NEG,
+    Opcode.EQ: EQ,
+    Opcode.GT: GT,
+    Opcode.LT: LT,
+    Opcode.AND: AND,
+    Opcode.OR: OR,
+    Opcode.NOT: NOT,
+    Opcode.RETURN: RETURN,
+}
+
+Builtin = Callable[["VirtualMachine", list[int]], int]
+
+
+def signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def builtin_divide(vm: "VirtualMachine", args: list[int]) -> int:
+    x, y = signed(args[0]), signed(args[1])
+    if y == 0:
+        raise ValueError("Division by zero")
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+def builtin_sqrt(vm: "VirtualMachine", args: list[int]) -> int:
+    x = signed(args[0])
+    if x < 0:
+        raise ValueError(f"Square root of negative number {x}")
+    return math.isqrt(x)
+
+
+# Stand-ins for OS functions the loaded code doesn't define
+BUILTINS: dict[str, Builtin] = {
+    "Math.multiply": lambda vm, args: signed(args[0]) * signed(args[1]),
+    "Math.divide": builtin_divide,
+    "Math.abs": lambda vm, args: abs(signed(args[0])),
+    "Math.min": lambda vm, args: min(signed(args[0]), signed(args[1])),
+    "Math.max": lambda vm, args: max(signed(args[0]), signed(args[1])),
+    "Math.sqrt": builtin_sqrt,
+}
+
+
+class VirtualMachine:
+    """
+    Runs VM code directly. Commands are predecoded into parallel lists of
+    integer opcodes and arguments, with labels, call targets and static
+    variables resolved up front, and run against a flat RAM laid out like the
+    Hack platform's.
+
+    Programs that define Sys.init start there, those that only define
+    Main.main (Jack programs without the OS) start at Main.main, and anything
+    else starts at its first command with the RAM set up by the caller.
+    Returning from the entry function or jumping to the same command halts.
+    Calls to functions the code doesn't define go to `builtins`.
+
+    A `profiler` is told about every call and return. Without one, the only
+    cost is a check on calls and returns.
+    """
+
+    def __init__(
+        self,
+        files: dict[str, list[Command]],
+        builtins: Optional[dict[str, Builtin]] = None,
+        profiler: Optional["Profiler"] = None,
+    ) -> None:
+        self.builtins = {**BUILTINS, **(builtins or {})}
+        self.profiler = profiler
+        self.ram = [0] * RAM_SIZE
+        self.predecode(files)
+        self.steps = 0
+        self.reset()
+
+    @classmethod
+    def from_path(
+        cls,
+        path: Path,
+        builtins: Optional[dict[str, Builtin]] = None,
+        profiler: Optional["Profiler"] = None,
+    ) -> "VirtualMachine":
+        """
+        Loads a .vm file or every .vm file in a folder.
+        """
+        sources = sorted(path.glob("*.vm")) if path.is_dir() else [path]
+        files = {source.stem: parse(source.read_text()) for source in sources}
+        return cls(files, builtins, profiler)
+
+    def predecode(self, files: dict[str, list[Command]]) -> None:
+        # First pass: positions of functions and function-scoped labels
+        self.functions: dict[str, int] = {}
+        labels: dict[str, int] = {}
+        position = 0
+        for commands in files.values():
+            function = ""
+            for command in commands:
+                if command.opcode is Opcode.FUNCTION:
+                    function = command.symbol
+                    self.functions[function] = position
+                if command.opcode is Opcode.LABEL:
+                    labels[f"{function}${command.symbol}"] = position
+                else:
+                    position += 1
+
+        self.ops: list[int] = []
+        self.arg1: list[int] = []
+        self.arg2: list[int] = []
+        self.builtin_list: list[Builtin] = []
+        self.builtin_names: list[str] = []
+        builtin_indices: dict[str, int] = {}
+        statics: dict[tuple[str, int], int] = {}
+        for file_stem, commands in files.items():
+            function = ""
+            for command in commands:
+                opcode = command.opcode
+                arg1 = arg2 = 0
+                if opcode is Opcode.LABEL:
+                    continue
+                if opcode in SIMPLE_OPCODES:
+                    op = SIMPLE_OPCODES[opcode]
+                elif opcode in (Opcode.PUSH, Opcode.POP):
+                    push = opcode is Opcode.PUSH
+                    segment = command.segment
+                    if segment is Segment.CONSTANT:
+                        op, arg1 = PUSH_CONSTANT, command.index & 0xFFFF
+                    elif segment in SEGMENT_POINTERS:
+                        op = PUSH_SEGMENT if push else POP_SEGMENT
+                        arg1, arg2 = SEGMENT_POINTERS[segment], command.index
+                    else:
+                        op = PUSH_ADDRESS if push else POP_ADDRESS
+                        if segment is Segment.STATIC:
+                            key = (file_stem, command.index)
+                            arg1 = statics.setdefault(key, STATIC_BASE + len(statics))
+                        else:
+                            arg1 = FIXED_BASES[segment] + command.index
+                elif opcode in (Opcode.GOTO, Opcode.IF_GOTO):
+                    op = GOTO if opcode is Opcode.GOTO else IF_GOTO
+                    label = f"{function}${command.symbol}"
+                    if label not in labels:
+                        raise ValueError(f"Label {command.symbol} is not defined")
+                    arg1 = labels[label]
+                elif opcode is Opcode.FUNCTION:
+                    function = command.symbol
+                    op, arg1 = FUNCTION, command.index
+                else:
+                    arg2 = command.index
+                    if command.symbol in self.functions:
+                        op, arg1 = CALL, self.functions[command.symbol]
+                    elif command.symbol in self.builtins:
+                        op = CALL_BUILTIN
+                        if command.symbol not in builtin_indices:
+                            builtin_indices[command.symbol] = len(self.builtin_list)
+                            self.builtin_list.append(self.builtins[command.symbol])
+                            self.builtin_names.append(command.symbol)
+                        arg1 = builtin_indices[command.symbol]
+                    else:
+                        raise ValueError(f"Function {command.symbol} is not defined")
+                self.ops.append(op)
+                self.arg1.append(arg1)
+                self.arg2.append(arg2)
+        self.function_names = {
+            position: name for name, position in self.functions.items()
+        }
+
+    def reset(self) -> None:
+        self.halted = False
+        self.pc = 0
+        entry = next(
+            (name for name in ("Sys.init", "Main.main") if name in self.functions),
+            None,
+        )
+        if entry is None:
+            return
+        # Bootstrap: SP = 256, then call the entry function with a return
+        # address past the end of the program
+        ram = self.ram
+        ram[SP] = 256 + 5
+        ram[256] = len(self.ops)
+        ram[257 : 256 + 5] = ram[LCL : THAT + 1]
+        ram[ARG] = 256
+        ram[LCL] = 261
+        self.pc = self.functions[entry]
+        if self.profiler is not None:
+            self.profiler.enter(entry, self.steps)
+
+    def function_at(self, pc: int) -> str:
+        """
+        Names the function whose code contains `pc`.
+        """
+        starts = [position for position in self.function_names if position <= pc]
+        return self.function_names[max(starts)] if starts else "top level"
+
+    def run(self, max_steps: int) -> int:
+        """
+        Executes up to `max_steps` commands and returns how many ran.
+        """
+        ops, arg1s, arg2s, builtins = self.ops, self.arg1, self.arg2, self.builtin_list
+        ram = self.ram
+        profiler = self.profiler
+        end = len(ops)
+        pc = self.pc
+        sp = ram[SP]
+        executed = 0
+        while executed < max_steps:
+            if pc >= end:
+                self.halted = True
+                break
+            op = ops[pc]
+            executed += 1
+            if op == PUSH_CONSTANT:
+                ram[sp] = arg1s[pc]
+                sp += 1
+                pc += 1
+            elif op == PUSH_SEGMENT:
+                ram[sp] = ram[ram[arg1s[pc]] + arg2s[pc]]
+                sp += 1
+                pc += 1
+            elif op == POP_SEGMENT:
+                sp -= 1
+                ram[ram[arg1s[pc]] + arg2s[pc]] = ram[sp]
+                pc += 1
+            elif op == PUSH_ADDRESS:
+                ram[sp] = ram[arg1s[pc]]
+                sp += 1
+                pc += 1
+            elif op == POP_ADDRESS:
+                sp -= 1
+                ram[arg1s[pc]] = ram[sp]
+                pc += 1
+            elif op == ADD:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] + ram[sp]) & 0xFFFF
+                pc += 1
+            elif op == SUB:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] - ram[sp]) & 0xFFFF
+                pc += 1
+            elif op == IF_GOTO:
+                sp -= 1
+                pc = arg1s[pc] if ram[sp] else pc + 1
+            elif op == GOTO:
+                if arg1s[pc] == pc:
+                    self.halted = True
+                    break
+                pc = arg1s[pc]
+            elif op == EQ:
+                sp -= 1
+                ram[sp - 1] = 0xFFFF if ram[sp - 1] == ram[sp] else 0
+                pc += 1
+            elif op == GT:
+                sp -= 1
+                # Flipping the sign bit orders unsigned values as signed ones
+                ram[sp - 1] = (
+                    0xFFFF if ram[sp - 1] ^ 0x8000 > ram[sp] ^ 0x8000 else 0
+                )
+                pc += 1
+            elif op == LT:
+                sp -= 1
+                ram[sp - 1] = (
+                    0xFFFF if ram[sp - 1] ^ 0x8000 < ram[sp] ^ 0x8000 else 0
+                )
+                pc += 1
+            elif op == AND:
+                sp -= 1
+                ram[sp - 1] &= ram[sp]
+                pc += 1
+            elif op == OR:
+                sp -= 1
+                ram[sp - 1] |= ram[sp]
+                pc += 1
+            elif op == NEG:
+                ram[sp - 1] = -ram[sp - 1] & 0xFFFF
+                pc += 1
+            elif op == NOT:
+                ram[sp - 1] ^= 0xFFFF
+                pc += 1
+            elif op == CALL:
+                ram[sp] = pc + 1
+                ram[sp + 1 : sp + 5] = ram[LCL : THAT + 1]
+                ram[ARG] = sp - arg2s[pc]
+                sp += 5
+                ram[LCL] = sp
+                pc = arg1s[pc]
+                if profiler is not None:
+                    profiler.enter(self.function_names[pc], self.steps + executed)
+            elif op == FUNCTION:
+                n_locals = arg1s[pc]
+                ram[sp : sp + n_locals] = [0] * n_locals
+                sp += n_locals
+                pc += 1
+            elif op == RETURN:
+                frame = ram[LCL]
+                arg = ram[ARG]
+                # Read the return address first, it sits at ARG when nArgs is 0
+                pc = ram[frame - 5]
+                ram[arg] = ram[sp - 1]
+                sp = arg + 1
+                ram[LCL : THAT + 1] = ram[frame - 4 : frame]
+                if profiler is not None:
+                    profiler.leave(self.steps + executed)
+            elif op == CALL_BUILTIN:
+                n_args = arg2s[pc]
+                ram[SP] = sp
+                try:
+                    result = builtins[arg1s[pc]](self, ram[sp - n_args : sp])
+                except ValueError as error:
+                    name = self.builtin_names[arg1s[pc]]
+                    raise ValueError(
+                        f"{name} called from {self.function_at(pc)} at pc {pc}: "
+                        f"{error}"
+                    ) from error
+                if profiler is not None:
+                    steps = self.steps + executed
+                    profiler.enter(self.builtin_names[arg1s[pc]], steps)
+                    profiler.leave(steps)
+                sp -= n_args
+                ram[sp] = result & 0xFFFF
+                sp += 1
+                pc += 1
+        ram[SP] = sp
+        self.pc = pc
+        self.steps += executed
+        if profiler is not None:
+            profiler.account(self.steps)
+        return executed
+
+
+if __name__ == "__main__":
+    import time
+
+    # Usage: python vm_interpreter.py PATH [max steps]
+    target_path = Path(sys.argv[1])
+    vm = VirtualMachine.from_path(target_path)
+    max_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000_000
+    start = time.perf_counter()
+    executed = vm.run(max_steps)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{executed} commands in {elapsed:.3f} s "
+        f"({executed / elapsed / 1e6:.2f}M commands/s)"
+        + (", halted" if vm.halted else "")
+    )
@@ -0,0 +1,148 @@
+import sys
+from enum import Enum
+from typing import Callable, Iterable, Optional
+
+
+class Opcode(Enum):
+    PUSH = "push"
+    POP = "pop"
+    ADD = "add"
+    SUB = "sub"
+    NEG = "neg"
+    EQ = "eq"
+    GT = "gt"
+    LT = "lt"
+    AND = "and"
+    OR = "or"
+    NOT = "not"
+    LABEL = "label"
+    GOTO = "goto"
+    IF_GOTO = "if-goto"
+    FUNCTION = "function"
+    CALL = "call"
+    RETURN = "return"
+
+
+class Segment(Enum):
+    CONSTANT = "constant"
+    LOCAL = "local"
+    ARGUMENT = "argument"
+    THIS = "this"
+    THAT = "that"
+    POINTER = "pointer"
+    TEMP = "temp"
+    STATIC = "static"
+
+
+BINARY_OPERATORS = frozenset(
+    {Opcode.ADD, Opcode.SUB, Opcode.AND, Opcode.OR, Opcode.EQ, Opcode.GT, Opcode.LT}
+)
+UNARY_OPERATORS = frozenset({Opcode.NEG, Opcode.NOT})
+COMPARISONS = frozenset({Opcode.EQ, Opcode.GT, Opcode.LT})
+SYMBOL_OPCODES = frozenset(
+    {Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO, Opcode.FUNCTION, Opcode.CALL}
+)
+
+
+class Command:
+    """
+    A single VM command. `index` holds the segment index for push and pop and
+    the local or argument count for function and call. Function and label
+    names are interned so passes can compare them by identity.
+    """
+
+    __slots__ = ("opcode", "segment", "index", "symbol")
+
+    def __init__(
+        self,
+        opcode: Opcode,
+        segment: Optional[Segment] = None,
+        index: int = 0,
+        symbol: Optional[str] = None,
+    ):
+        self.opcode = opcode
+        self.segment = segment
+        self.index = index
+        self.symbol = sys.intern(symbol) if symbol is not None else None
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Command):
+            return NotImplemented
+        return (
+            self.opcode is other.opcode
+            and self.segment is other.segment
+            and self.index == other.index
+            and self.symbol == other.symbol
+        )
+
+    def __repr__(self) -> str:
+        return f"Command({str(self)!r})"
+
+    def __str__(self) -> str:
+        """
+        Formats the command back into VM code.
+        """
+        if self.segment is not None:
+            return f"{self.opcode.value} {self.segment.value} {self.index}"
+        if self.opcode in (Opcode.FUNCTION, Opcode.CALL):
+            return f"{self.opcode.value} {self.symbol} {self.index}"
+        if self.symbol is not None:
+            return f"{self.opcode.value} {self.symbol}"
+        return self.opcode.value
+
+
+def parse_line(line: str) -> Command:
+    opcode_text, *args = line.split()
+    try:
+        opcode = Opcode(opcode_text)
+        if opcode in (Opcode.PUSH, Opcode.POP):
+            segment_text, index = args
+            return Command(opcode, Segment(segment_text), int(index))
+        if opcode in (Opcode.FUNCTION, Opcode.CALL):
+            symbol, count = args
+            return Command(opcode, index=int(count), symbol=symbol)
+        if opcode in SYMBOL_OPCODES:
+            [symbol] = args
+            # Reserved for the labels the translator generates
+            if "$" in symbol:
+                raise ValueError
+            return Command(opcode, symbol=symbol)
+        if args:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"{line} is not a valid VM command") from None
+    return Command(opcode)
+
+
+def parse(vm_code: str) -> list[Command]:
+    """
+    Parses VM code into commands, skipping comments and empty lines.
+    """
+    return [
+        parse_line(cleaned_line)
+        for line in vm_code.splitlines()
+        if (cleaned_line := line.split("//")[0].strip())
+    ]
+
+
+Pass = Callable[[list[Command]], list[Command]]
+
+
+class PassManager:
+    """
+    Runs a sequence of passes over a command list. A pass takes the commands
+    and returns the commands to hand to the next pass; analyses return their
+    input unchanged and keep their results on themselves.
+    """
+
+    def __init__(self, passes: Iterable[Pass] = ()):
+        self.passes = list(passes)
+
+    def add(self, pass_: Pass) -> "PassManager":
+        self.passes.append(pass_)
+        return self
+
+    def run(self, commands: list[Command]) -> list[Command]:
+        for pass_ in self.passes:
+            commands = pass_(commands)
+        return commands
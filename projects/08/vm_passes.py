@@ -0,0 +1,99 @@
+import operator
+from typing import Callable, Iterable, Optional
+
+from vm_ir import Command, Opcode, Pass, Segment
+
+BINARY_FOLDS = {
+    Opcode.ADD: operator.add,
+    Opcode.SUB: operator.sub,
+    Opcode.AND: operator.and_,
+    Opcode.OR: operator.or_,
+    Opcode.EQ: lambda x, y: -(x == y),
+    Opcode.GT: lambda x, y: -(x > y),
+    Opcode.LT: lambda x, y: -(x < y),
+}
+UNARY_FOLDS = {Opcode.NEG: operator.neg, Opcode.NOT: operator.invert}
+# Operator and constant pairs where `x op constant` is x
+RIGHT_IDENTITIES = {
+    (Opcode.ADD, 0),
+    (Opcode.SUB, 0),
+    (Opcode.OR, 0),
+    (Opcode.AND, -1),
+}
+# Operator and constant pairs where `constant op x` is x
+LEFT_IDENTITIES = {(Opcode.ADD, 0), (Opcode.OR, 0), (Opcode.AND, -1)}
+
+
+def wrap(value: int) -> int:
+    """
+    Wraps an integer to the signed 16-bit range.
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def push_constant(value: int) -> Command:
+    return Command(Opcode.PUSH, Segment.CONSTANT, value)
+
+
+def constant_value(command: Command) -> Optional[int]:
+    if command.opcode is Opcode.PUSH and command.segment is Segment.CONSTANT:
+        return wrap(command.index)
+    return None
+
+
+def fold_constants(commands: list[Command]) -> list[Command]:
+    """
+    Evaluates arithmetic, logic and comparisons on constants with 16-bit
+    two's complement semantics and drops operations that leave their operand
+    unchanged (x + 0, x - 0, x | 0, x & -1, not not, neg neg). Works on the
+    commands already emitted, so a label between two commands stops any
+    rewrite across it.
+    """
+    folded: list[Command] = []
+    for command in commands:
+        opcode = command.opcode
+        top = constant_value(folded[-1]) if folded else None
+        if opcode in BINARY_FOLDS and len(folded) >= 2:
+            below = constant_value(folded[-2])
+            if top is not None and below is not None:
+                del folded[-2:]
+                folded.append(push_constant(wrap(BINARY_FOLDS[opcode](below, top))))
+                continue
+            if (opcode, top) in RIGHT_IDENTITIES:
+                folded.pop()
+                continue
+            if folded[-1].opcode is Opcode.PUSH and (opcode, below) in LEFT_IDENTITIES:
+                del folded[-2]
+                continue
+        elif opcode in UNARY_FOLDS and folded:
+            if top is not None:
+                folded[-1] = push_constant(wrap(UNARY_FOLDS[opcode](top)))
+                continue
+            if folded[-1].opcode is opcode:
+                folded.pop()
+                continue
+        folded.append(command)
+    return folded
+
+
+def reachable_functions(
+    graph: dict[str, set[str]], roots: Iterable[str]
+) -> set[str]:
+    """
+    Walks a call graph from `roots`. Calls to functions missing from the graph
+    are left for the assembler to report, as they would be without this walk.
+    """
+    pending = [root for root in roots if root in graph]
+    reachable = set(pending)
+    while pending:
+        for callee in graph[pending.pop()]:
+            if callee in graph and callee not in reachable:
+                reachable.add(callee)
+                pending.append(callee)
+    return reachable
+
+
+# Passes selectable from the translator's command line, as factories so each
+# run gets fresh pass state. Dead functions are eliminated by the linker there,
+# since the files are translated one at a time.
+PASSES: dict[str, Callable[[], Pass]] = {"fold_constants": lambda: fold_constants}
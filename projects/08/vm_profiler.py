@@ -0,0 +1,157 @@
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from assembler import ListingEntry
+
+
+class Profiler:
+    """
+    Collects a function-level profile from the VM interpreter's calls and
+    returns. Each run of commands is charged to the call stack it ran under,
+    from which call counts, exclusive and inclusive command counts and
+    collapsed stacks for flamegraph tools are derived.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.stack: tuple[str, ...] = ()
+        self.last_steps = 0
+
+    def account(self, steps: int) -> None:
+        """
+        Charges the commands run since the last event to the current stack.
+        """
+        if self.stack and steps > self.last_steps:
+            self.stacks[self.stack] += steps - self.last_steps
+        self.last_steps = steps
+
+    def enter(self, function: str, steps: int) -> None:
+        self.account(steps)
+        self.calls[function] += 1
+        self.stack += (function,)
+
+    def leave(self, steps: int) -> None:
+        self.account(steps)
+        self.stack = self.stack[:-1]
+
+    def exclusive(self) -> Counter[str]:
+        counts: Counter[str] = Counter()
+        for stack, steps in self.stacks.items():
+            counts[stack[-1]] += steps
+        return counts
+
+    def inclusive(self) -> Counter[str]:
+        # Recursive functions appear several times in a stack but only count
+        # once, so their inclusive count never exceeds the total
+        counts: Counter[str] = Counter()
+        for stack, steps in self.stacks.items():
+            for function in set(stack):
+                counts[function] += steps
+        return counts
+
+    def collapsed(self) -> str:
+        """
+        The profile in the collapsed stack format read by flamegraph.pl and
+        speedscope: one `caller;callee count` line per stack.
+        """
+        return "".join(
+            f"{';'.join(stack)} {steps}\n"
+            for stack, steps in sorted(self.stacks.items())
+        )
+
+    def report(self, hack_cycles: Optional[Counter[str]] = None) -> str:
+        """
+        A text table sorted by exclusive command count, with Hack cycles per
+        function when given.
+        """
+        exclusive, inclusive = self.exclusive(), self.inclusive()
+        total = sum(exclusive.values()) or 1
+        hack_cycles = hack_cycles or Counter()
+        functions = sorted(
+            self.calls.keys() | exclusive.keys() | hack_cycles.keys(),
+            key=lambda function: (-exclusive[function], function),
+        )
+        rows = [
+            f"{'function':<32}{'calls':>10}{'exclusive':>12}{'%':>7}"
+            f"{'inclusive':>12}" + (f"{'hack cycles':>14}" if hack_cycles else "")
+        ]
+        for function in functions:
+            rows.append(
+                f"{function:<32}{self.calls[function]:>10}"
+                f"{exclusive[function]:>12}{exclusive[function] / total:>7.1%}"
+                f"{inclusive[function]:>12}"
+                + (f"{hack_cycles[function]:>14}" if hack_cycles else "")
+            )
+        return "\n".join(rows)
+
+
+def routine_name(label: str) -> str:
+    """
+    Names the code a translated label belongs to: the function for labels
+    inside one (Main.main$LOOP), the shared routine for $CALL, $EQ and
+    friends, or the label itself for bootstrap and END code.
+    """
+    if label.startswith("$"):
+        return label.split("_")[0]
+    return label.split("$")[0] or "BOOTSTRAP"
+
+
+def hack_cycles_by_function(
+    pc_counts: list[int], listing: Iterable["ListingEntry"]
+) -> Counter[str]:
+    """
+    Sums an emulator's per-address execution counts by the function each
+    address was translated from, using an assembler listing.
+    """
+    cycles: Counter[str] = Counter()
+    for entry in listing:
+        if pc_counts[entry.address]:
+            cycles[routine_name(entry.label)] += pc_counts[entry.address]
+    return cycles
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # The assembler and emulator live with project 06
+    sys.path.insert(0, str(Path(__file__).parents[1].joinpath("06")))
+    from assembler import assemble_words, iter_listing, iter_source_lines
+    from emulator import ROM_SIZE, Machine
+    from vm_interpreter import VirtualMachine
+    from vm_translator import translate_folder
+
+    parser = argparse.ArgumentParser(
+        description="Profiles a VM program by function in the VM interpreter."
+    )
+    parser.add_argument("path", type=Path, help="a .vm file or a folder of them")
+    parser.add_argument("max_steps", type=int, nargs="?", default=10_000_000)
+    parser.add_argument("--collapsed", type=Path, help="write collapsed stacks here")
+    parser.add_argument(
+        "--hack", action="store_true", help="add Hack cycles from the emulator"
+    )
+    arguments = parser.parse_args()
+    target_path = arguments.path
+    max_steps = arguments.max_steps
+
+    profiler = Profiler()
+    vm = VirtualMachine.from_path(target_path, profiler=profiler)
+    vm.run(max_steps)
+
+    hack_cycles: Counter[str] = Counter()
+    if arguments.hack:
+        folder = target_path if target_path.is_dir() else target_path.parent
+        asm = translate_folder(folder, cache_dir=None)
+        machine = Machine(assemble_words(asm))
+        machine.pc_counts = [0] * ROM_SIZE
+        # A VM command takes a dozen or so Hack instructions
+        machine.run(max_steps * 20)
+        listing = iter_listing(iter_source_lines(asm.splitlines()))
+        hack_cycles = hack_cycles_by_function(machine.pc_counts, listing)
+
+    print(profiler.report(hack_cycles))
+    if arguments.collapsed:
+        arguments.collapsed.write_text(profiler.collapsed())
@@ -1,4 +1,14 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from functools import partial
+from pathlib import Path
+from typing import Iterable, Optional
+
+from vm_ir import COMPARISONS, Command, Opcode, Pass, PassManager, parse
+from vm_passes import reachable_functions
 
 INSTRUCTIONS = {"SP++": "@SP\nM=M+1", "SP--": "@SP\nM=M-1", "SP=D": "@SP\nA=M\nM=D"}
 MEM_MAP = {
@@ -34,7 +44,7 @@ def generate_operator(operator: str) -> str:
         [
             f"// {operator}",
             pop_to_d(),
-            f"M=M{OPERATORS[operator]}D",
+            "M=M-D" if operator == "sub" else f"M=D{OPERATORS[operator]}M",
             INSTRUCTIONS["SP++"],
         ]
     )
@@ -63,29 +73,93 @@ def generate_end() -> str:
     )
 
 
-def generate_comp(comp: str, comp_count: int) -> str:
+def local_label(kind: str, count: int, namespace: str = "") -> str:
+    """
+    Names a generated label. The namespace keeps labels from code translated
+    separately apart. VM labels can't contain `$`, so the one before the
+    count keeps generated labels apart from the function's own labels, which
+    are scoped as `function$label`.
+    """
+    return f"{namespace}${kind}${count}"
+
+
+def generate_comp(comp: str, comp_count: int, namespace: str = "") -> str:
+    comp_label = local_label("COMP", comp_count, namespace)
+    cont_label = local_label("CONT", comp_count, namespace)
     return "\n".join(
         [
             f"// {comp}",
             pop_to_d(),
             "D=D-M",
-            f"@COMP{comp_count}",
+            f"@{comp_label}",
             "D;JEQ" if comp == "eq" else "D;JGT" if comp == "lt" else "D;JLT",
             "@SP",
             "A=M",
             "M=0",
-            f"@CONT{comp_count}",
+            f"@{cont_label}",
             "0;JEQ",
-            f"(COMP{comp_count})",
+            f"({comp_label})",
             "@SP",
             "A=M",
             "M=-1",
-            f"(CONT{comp_count})",
+            f"({cont_label})",
             INSTRUCTIONS["SP++"],
         ]
     )
 
 
+COMP_JUMPS = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+
+
+def generate_comp_site(comp: str, comp_count: int, namespace: str = "") -> str:
+    """
+    Stores the return address in R15 and jumps into the shared routine for
+    `comp`.
+    """
+    return_label = local_label("COMP", comp_count, namespace)
+    return "\n".join(
+        [
+            f"// {comp}",
+            f"@{return_label}",
+            "D=A",
+            "@R15",
+            "M=D",
+            f"@${comp.upper()}",
+            "0;JMP",
+            f"({return_label})",
+        ]
+    )
+
+
+def generate_comp_routine(comp: str) -> str:
+    """
+    Replaces the top two stack values x, y with the result of `x comp y` and
+    jumps back to the address in R15.
+    """
+    routine = f"${comp.upper()}"
+    return "\n".join(
+        [
+            f"// {comp} routine",
+            f"({routine})",
+            "@SP",
+            "AM=M-1",
+            "D=M",
+            "A=A-1",
+            "D=M-D",
+            "M=-1",
+            f"@{routine}_TRUE",
+            f"D;{COMP_JUMPS[comp]}",
+            "@SP",
+            "A=M-1",
+            "M=0",
+            f"({routine}_TRUE)",
+            "@R15",
+            "A=M",
+            "0;JMP",
+        ]
+    )
+
+
 def generate_single_value_operator(operator: str) -> str:
     return "\n".join(
         [
@@ -109,6 +183,16 @@ generators = {
 
 
 def push_constant_to_d(value: int) -> str:
+    """
+    Loads a signed 16-bit constant into D. Negative values only appear after
+    constant folding.
+    """
+    if value in (-1, 0, 1):
+        return f"D={value}"
+    if value == -32768:
+        return "@32767\nD=!A"
+    if value < 0:
+        return f"@{-value}\nD=-A"
     return f"@{value}\nD=A"
 
 
@@ -144,8 +228,7 @@ def generate_push(mem_seg, address, dest):
     return instruction
 
 
-def translate_push(line: str, file_stem: str) -> str:
-    _, mem_seg, dest = line.split(" ")
+def translate_push(mem_seg: str, dest: int, file_stem: str) -> str:
     address = str(
         MEM_MAP[mem_seg] + int(dest)
         if mem_seg not in ("static", "constant")
@@ -154,8 +237,7 @@ def translate_push(line: str, file_stem: str) -> str:
     return generate_push(mem_seg, address, dest)
 
 
-def generate_pop(line: str, file_stem: str) -> str:
-    _, mem_seg, dest = line.split(" ")
+def generate_pop(mem_seg: str, dest: int, file_stem: str) -> str:
     if mem_seg in ("temp", "pointer", "static"):
         address = (
             MEM_MAP[mem_seg] + int(dest)
@@ -248,6 +330,10 @@ def generate_return():
             "@R13 // old ARG",
             "A=M",
             "M=D",
+            "@R13 // reposition SP after the return value",
+            "D=M",
+            "@SP",
+            "M=D+1",
             "@R14 // jump to return address",
             "A=M",
             "0;JMP",
@@ -265,7 +351,10 @@ def generate_goto(symbol: str) -> str:
     )
 
 
-def generate_call(symbol: str, n_args: int, call_count: int) -> str:
+def generate_call(
+    symbol: str, n_args: int, call_count: int, namespace: str = ""
+) -> str:
+    return_label = local_label("RETURN", call_count, namespace)
     return "\n".join(
         [
             f"// call {symbol} {n_args}",
@@ -275,7 +364,7 @@ def generate_call(symbol: str, n_args: int, call_count: int) -> str:
             "D=D-A",
             "@R13",
             "M=D",
-            f"@RETURN{call_count} // push return address",
+            f"@{return_label} // push return address",
             "D=A",
             "@SP",
             "A=M",
@@ -314,91 +403,629 @@ def generate_call(symbol: str, n_args: int, call_count: int) -> str:
             "@LCL",
             "M=D",
             generate_goto(symbol),
-            f"(RETURN{call_count})",
+            f"({return_label})",
         ],
     )
 
 
-def translate(vm_code: str, file_stem: str) -> str:
-    # Seems to be a problem with gt. See first gt call in StackTest.vm
-    lines = clean_lines(vm_code.splitlines())
+def generate_call_site(
+    symbol: str, n_args: int, call_count: int, namespace: str = ""
+) -> str:
+    """
+    Loads the target into R13, nArgs into R14 and the return address into D,
+    then jumps into the shared call routine.
+    """
+    return_label = local_label("RETURN", call_count, namespace)
+    return "\n".join(
+        [
+            f"// call {symbol} {n_args}",
+            f"@{symbol}",
+            "D=A",
+            "@R13",
+            "M=D",
+            f"@R14\nM={n_args}" if n_args in (0, 1) else f"@{n_args}\nD=A\n@R14\nM=D",
+            f"@{return_label}",
+            "D=A",
+            "@$CALL",
+            "0;JMP",
+            f"({return_label})",
+        ]
+    )
 
-    comp_count = 0
-    call_count = 0
-    output: list[str] = []
-    # Generate bootstrap code
-    output.append(
-        "\n".join(
-            [
-                "// bootstrap",
-                "@256",
-                "D=A",
+
+def push_d() -> str:
+    return "\n".join(["@SP", "AM=M+1", "A=A-1", "M=D"])
+
+
+def generate_call_routine() -> str:
+    """
+    Shared body of every call: saves the caller's frame, repositions ARG and
+    LCL and jumps to the address in R13.
+    """
+    return "\n".join(
+        [
+            "// call routine",
+            "($CALL)",
+            push_d(),  # return address
+            *(
+                f"@{register} // push {register}\nD=M\n{push_d()}"
+                for register in ("LCL", "ARG", "THIS", "THAT")
+            ),
+            "@SP // ARG = SP - nArgs - 5",
+            "D=M",
+            "@R14",
+            "D=D-M",
+            "@5",
+            "D=D-A",
+            "@ARG",
+            "M=D",
+            "@SP // LCL = SP",
+            "D=M",
+            "@LCL",
+            "M=D",
+            "@R13",
+            "A=M",
+            "0;JMP",
+        ]
+    )
+
+
+def generate_return_routine() -> str:
+    return "\n".join(["// return routine", "($RETURN)", generate_return()])
+
+
+def count_instructions(asm: str) -> int:
+    """
+    Counts the ROM words a piece of assembly occupies.
+    """
+    return sum(1 for line in clean_lines(asm.splitlines()) if not line.startswith("("))
+
+
+FIXED_SEGMENTS = ("temp", "pointer", "static")
+# Offsets up to this are reached with an A=A+1 chain that leaves D untouched
+SMALL_OFFSET = 6
+LABEL_OPCODES = frozenset({Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO})
+SPILLING_OPCODES = frozenset(
+    {Opcode.LABEL, Opcode.GOTO, Opcode.FUNCTION, Opcode.CALL, Opcode.RETURN}
+)
+
+
+def fixed_address(mem_seg: str, index: int, file_stem: str) -> str:
+    if mem_seg == "static":
+        return f"{file_stem}.{index}"
+    return str(MEM_MAP[mem_seg] + index)
+
+
+def point_at(mem_seg: str, index: int) -> list[str]:
+    """
+    Sets A to the address of a small offset into a pointer segment without
+    touching D.
+    """
+    if index == 0:
+        return [f"@{SYMBOLS[mem_seg]}", "A=M"]
+    return [f"@{SYMBOLS[mem_seg]}", "A=M+1"] + ["A=A+1"] * (index - 1)
+
+
+class TosCache:
+    """
+    Generates stack code that keeps the top of the stack in D across
+    straight-line commands. While `tos_in_d` is set, SP points just past the
+    value held in D; `spill` writes it back before control flow.
+    """
+
+    def __init__(self, file_stem: str):
+        self.file_stem = file_stem
+        self.tos_in_d = False
+
+    def spill(self) -> str:
+        self.tos_in_d = False
+        return "\n".join(["// spill", push_d()])
+
+    def pop_to_d(self) -> list[str]:
+        if self.tos_in_d:
+            return []
+        return ["@SP", "AM=M-1", "D=M"]
+
+    def load(self, mem_seg: str, index: int) -> list[str]:
+        if mem_seg == "constant":
+            return push_constant_to_d(index).split("\n")
+        if mem_seg in FIXED_SEGMENTS:
+            return [f"@{fixed_address(mem_seg, index, self.file_stem)}", "D=M"]
+        if index <= SMALL_OFFSET:
+            return point_at(mem_seg, index) + ["D=M"]
+        return [f"@{SYMBOLS[mem_seg]}", "D=M", f"@{index}", "A=D+A", "D=M"]
+
+    def push(self, mem_seg: str, index: int) -> str:
+        instructions = [f"// push {mem_seg} {index}"]
+        if self.tos_in_d:
+            instructions.append(push_d())
+        instructions += self.load(mem_seg, index)
+        self.tos_in_d = True
+        return "\n".join(instructions)
+
+    def pop(self, mem_seg: str, index: int) -> str:
+        if mem_seg not in FIXED_SEGMENTS and index > SMALL_OFFSET:
+            # The address has to be computed in D, so fall back to memory
+            spill = [push_d()] if self.tos_in_d else []
+            self.tos_in_d = False
+            return "\n".join(
+                spill + [generate_pop(mem_seg, index, self.file_stem)]
+            )
+        instructions = [f"// pop {mem_seg} {index}"] + self.pop_to_d()
+        if mem_seg in FIXED_SEGMENTS:
+            address = fixed_address(mem_seg, index, self.file_stem)
+            instructions += [f"@{address}", "M=D"]
+        else:
+            instructions += point_at(mem_seg, index) + ["M=D"]
+        self.tos_in_d = False
+        return "\n".join(instructions)
+
+    def operator(self, operator: str) -> str:
+        if not self.tos_in_d:
+            return "\n".join(
+                [f"// {operator}", "@SP", "AM=M-1", "D=M", "A=A-1"]
+                + ["M=M-D" if operator == "sub" else f"M=D{OPERATORS[operator]}M"]
+            )
+        return "\n".join(
+            [f"// {operator}", "@SP", "AM=M-1"]
+            + ["D=M-D" if operator == "sub" else f"D=D{OPERATORS[operator]}M"]
+        )
+
+    def single_value_operator(self, operator: str) -> str:
+        if self.tos_in_d:
+            return f"// {operator}\nD={OPERATORS[operator]}D"
+        return f"// {operator}\n@SP\nA=M-1\nM={OPERATORS[operator]}M"
+
+    def comp(self, comp: str, comp_count: int, namespace: str = "") -> str:
+        comp_label = local_label("COMP", comp_count, namespace)
+        cont_label = local_label("CONT", comp_count, namespace)
+        instructions = [f"// {comp}"] + self.pop_to_d()
+        self.tos_in_d = True
+        return "\n".join(
+            instructions
+            + [
                 "@SP",
-                "M=D",
-                "// call Sys.init 0",  # Implement call to Sys.init
-                generate_call("Sys.init", 0, call_count),
+                "AM=M-1",
+                "D=M-D",
+                f"@{comp_label}",
+                f"D;{COMP_JUMPS[comp]}",
+                "D=0",
+                f"@{cont_label}",
+                "0;JMP",
+                f"({comp_label})",
+                "D=-1",
+                f"({cont_label})",
             ]
         )
-    )
-    for line in lines:
-        command = line.split(" ")[0]
-        if command == "push":
-            output.append(translate_push(line, file_stem))
-        elif command == "pop":
-            output.append(generate_pop(line, file_stem))
-        elif command in ("gt", "lt", "eq"):
-            output.append(generate_comp(command, comp_count))
+
+    def if_goto(self, symbol: str) -> str:
+        instructions = [f"// if-goto {symbol}"] + self.pop_to_d()
+        self.tos_in_d = False
+        return "\n".join(instructions + [f"@{symbol}", "D;JNE"])
+
+
+def translate_cached(
+    cache: TosCache,
+    command: Command,
+    comp_count: int,
+    comparisons: bool = True,
+    namespace: str = "",
+) -> str:
+    """
+    Translates the stack commands TosCache handles, returning an empty string
+    for everything else. Comparisons are left alone unless `comparisons` is set.
+    """
+    opcode = command.opcode
+    if opcode is Opcode.PUSH:
+        return cache.push(command.segment.value, command.index)
+    if opcode is Opcode.POP:
+        return cache.pop(command.segment.value, command.index)
+    if opcode in (Opcode.ADD, Opcode.SUB, Opcode.AND, Opcode.OR):
+        return cache.operator(opcode.value)
+    if opcode in (Opcode.NEG, Opcode.NOT):
+        return cache.single_value_operator(opcode.value)
+    if opcode in COMPARISONS and comparisons:
+        return cache.comp(opcode.value, comp_count, namespace)
+    if opcode is Opcode.IF_GOTO:
+        return cache.if_goto(command.symbol)
+    return ""
+
+
+def scope_labels(commands: list[Command]) -> list[Command]:
+    """
+    Prefixes label, goto and if-goto targets with the enclosing function's
+    name, since VM labels are local to their function.
+    """
+    scoped = []
+    function = ""
+    for command in commands:
+        if command.opcode is Opcode.FUNCTION:
+            function = command.symbol
+        elif command.opcode in LABEL_OPCODES and function:
+            command = Command(command.opcode, symbol=f"{function}${command.symbol}")
+        scoped.append(command)
+    return scoped
+
+
+@dataclass
+class Fragment:
+    """
+    The assembly for one function, along with the functions it calls so the
+    link step can drop unreachable ones. Code before the first function has
+    an empty name.
+    """
+
+    name: str
+    calls: list[str]
+    asm: str
+
+
+def generate_fragments(
+    commands: list[Command],
+    file_stem: str,
+    *,
+    trampolines: bool = False,
+    shared_comparisons: bool = False,
+    cache_tos: bool = False,
+) -> list[Fragment]:
+    """
+    Generates Hack assembly for the VM commands of one file, split by function.
+    Statics are named after `file_stem` and generated labels after the
+    enclosing function with a counter local to it, so a fragment's code only
+    depends on the function itself and fragments of different files can be
+    linked in any combination.
+
+    With `trampolines`, every call and return jumps into one shared routine
+    instead of inlining the frame handling, trading a few cycles per call for
+    a much smaller ROM. `shared_comparisons` does the same for eq, gt and lt.
+    `cache_tos` keeps the top of the stack in D between commands.
+    """
+    call = generate_call_site if trampolines else generate_call
+    comp = generate_comp_site if shared_comparisons else generate_comp
+    cache = TosCache(file_stem) if cache_tos else None
+    spilling_opcodes = SPILLING_OPCODES | (COMPARISONS if shared_comparisons else set())
+    comp_count = 0
+    call_count = 0
+    namespace = file_stem
+    fragments: list[Fragment] = []
+    function = ""
+    calls: list[str] = []
+    output: list[str] = []
+    for command in scope_labels(commands):
+        opcode = command.opcode
+        if cache is not None and cache.tos_in_d and opcode in spilling_opcodes:
+            output.append(cache.spill())
+        if opcode is Opcode.FUNCTION:
+            if function or output:
+                fragments.append(Fragment(function, calls, "\n".join(output)))
+            calls, output = [], []
+            namespace = command.symbol
+            comp_count = call_count = 0
+        if cache is not None and (
+            output_code := translate_cached(
+                cache, command, comp_count, not shared_comparisons, namespace
+            )
+        ):
+            output.append(output_code)
+            comp_count += opcode in COMPARISONS
+        elif opcode is Opcode.PUSH:
+            output.append(
+                translate_push(command.segment.value, command.index, file_stem)
+            )
+        elif opcode is Opcode.POP:
+            output.append(
+                generate_pop(command.segment.value, command.index, file_stem)
+            )
+        elif opcode in COMPARISONS:
+            output.append(comp(opcode.value, comp_count, namespace))
             comp_count += 1
-        elif command in generators:
-            output.append(generators[command]())
-        elif command == "label":
-            symbol = line.split(" ")[1]
-            output.append(f"({symbol})")
-        elif command == "if-goto":
-            symbol = line.split(" ")[1]
+        elif opcode.value in generators:
+            output.append(generators[opcode.value]())
+        elif opcode is Opcode.LABEL:
+            output.append(f"({command.symbol})")
+        elif opcode is Opcode.IF_GOTO:
             output.append(
                 "\n".join(
                     [
-                        f"// if-goto {symbol}",
+                        f"// if-goto {command.symbol}",
                         INSTRUCTIONS["SP--"],
                         "A=M",
                         "D=M",
-                        f"@{symbol}",
+                        f"@{command.symbol}",
                         "D;JNE",
                     ]
                 )
             )
-        elif command == "goto":
-            symbol = line.split(" ")[1]
-            output.append(generate_goto(symbol))
-        elif command == "function":
-            _, symbol, n_vars = line.split(" ")
+        elif opcode is Opcode.GOTO:
+            output.append(generate_goto(command.symbol))
+        elif opcode is Opcode.FUNCTION:
+            function = command.symbol
+            push_zero = (
+                "@SP\nAM=M+1\nA=A-1\nM=0"
+                if cache is not None
+                else generate_push("constant", None, 0)
+            )
             output.append(
                 "\n".join(
-                    [f"// function {symbol} {n_vars}"]
-                    + [f"({symbol})"]
-                    + [generate_push("constant", None, 0) for _ in range(int(n_vars))]
+                    [f"// function {command.symbol} {command.index}"]
+                    + [f"({command.symbol})"]
+                    + [push_zero for _ in range(command.index)]
                 )
             )
-        elif command == "return":
-            output.append(generate_return())
-        elif command == "call":
-            _, symbol, n_args = line.split(" ")
-            output.append(generate_call(symbol, int(n_args), call_count))
+        elif opcode is Opcode.RETURN:
+            output.append(
+                "// return\n@$RETURN\n0;JMP" if trampolines else generate_return()
+            )
+        elif opcode is Opcode.CALL:
+            output.append(call(command.symbol, command.index, call_count, namespace))
+            calls.append(command.symbol)
             call_count += 1
 
+    if cache is not None and cache.tos_in_d:
+        output.append(cache.spill())
+    if function or output:
+        fragments.append(Fragment(function, calls, "\n".join(output)))
+    return fragments
+
+
+def split_dead_fragments(
+    fragments: list[Fragment], roots: Iterable[str] = ("Sys.init",)
+) -> tuple[list[Fragment], list[Fragment]]:
+    """
+    Splits fragments into those reachable from `roots` over the call graph
+    and those that aren't. Nothing is dropped when none of the roots exist.
+    """
+    # Every file's code before its first function is a fragment named "". It
+    # is always kept, along with what it calls.
+    graph: dict[str, set[str]] = {}
+    for fragment in fragments:
+        graph.setdefault(fragment.name, set()).update(fragment.calls)
+    if not any(root in graph for root in roots):
+        return fragments, []
+    reachable = reachable_functions(graph, [*roots, ""])
+    return (
+        [fragment for fragment in fragments if fragment.name in reachable],
+        [fragment for fragment in fragments if fragment.name not in reachable],
+    )
+
+
+def link(
+    fragments: Iterable[Fragment],
+    *,
+    trampolines: bool = False,
+    shared_comparisons: bool = False,
+    eliminate_dead_functions: bool = False,
+) -> str:
+    """
+    Concatenates fragments behind the bootstrap and appends the shared
+    routines they use. The options must match those the fragments were
+    generated with.
+    """
+    fragments = list(fragments)
+    if eliminate_dead_functions:
+        fragments, _ = split_dead_fragments(fragments)
+    call = generate_call_site if trampolines else generate_call
+    output = [
+        "\n".join(
+            [
+                "// bootstrap",
+                "@256",
+                "D=A",
+                "@SP",
+                "M=D",
+                call("Sys.init", 0, 0, "BOOTSTRAP"),
+            ]
+        )
+    ]
+    output.extend(fragment.asm for fragment in fragments)
     output.append(generate_end())
+    if trampolines:
+        output.extend([generate_call_routine(), generate_return_routine()])
+    if shared_comparisons:
+        output.extend(
+            generate_comp_routine(comp)
+            for comp in COMP_JUMPS
+            if any(f"@${comp.upper()}\n" in fragment.asm for fragment in fragments)
+        )
     return "\n".join(output) + "\n"
 
 
+def translate(
+    vm_code: str,
+    file_stem: str,
+    *,
+    passes: Iterable[Pass] = (),
+    trampolines: bool = False,
+    shared_comparisons: bool = False,
+    cache_tos: bool = False,
+    eliminate_dead_functions: bool = False,
+) -> str:
+    """
+    Translates VM code from a single file into a complete Hack program: parses
+    it, runs `passes` over it, generates the fragments and links them.
+    """
+    commands = PassManager(passes).run(parse(vm_code))
+    fragments = generate_fragments(
+        commands,
+        file_stem,
+        trampolines=trampolines,
+        shared_comparisons=shared_comparisons,
+        cache_tos=cache_tos,
+    )
+    return link(
+        fragments,
+        trampolines=trampolines,
+        shared_comparisons=shared_comparisons,
+        eliminate_dead_functions=eliminate_dead_functions,
+    )
+
+
+CACHE_DIR = Path(".vm_cache")
+TRANSLATOR_SOURCES = ("vm_translator.py", "vm_ir.py", "vm_passes.py")
+
+
+def pass_name(pass_: Pass) -> str:
+    return getattr(pass_, "__name__", type(pass_).__name__)
+
+
+def cache_key(source: Path, passes: Iterable[Pass] = (), **options: bool) -> str:
+    """
+    Hashes the source and its stem together with the translator's modules,
+    the passes and the code generation options, so changing any of them
+    retranslates the file.
+    """
+    digest = hashlib.sha256()
+    for module in TRANSLATOR_SOURCES:
+        digest.update(Path(__file__).with_name(module).read_bytes())
+    settings = (source.stem, [pass_name(pass_) for pass_ in passes], sorted(options))
+    digest.update(repr(settings).encode())
+    digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def translate_file(
+    source: Path, passes: Iterable[Pass] = (), **options: bool
+) -> list[Fragment]:
+    commands = PassManager(passes).run(parse(source.read_text()))
+    return generate_fragments(commands, source.stem, **options)
+
+
+def translate_files(
+    sources: Iterable[Path],
+    cache_dir: Optional[Path] = CACHE_DIR,
+    passes: Iterable[Pass] = (),
+    max_workers: Optional[int] = None,
+    **options: bool,
+) -> tuple[list[Fragment], list[Path]]:
+    """
+    Translates each source into fragments, reusing cached fragments for
+    sources that were translated before with the same passes and options and
+    translating the rest in a process pool. Pass `cache_dir=None` to skip the
+    cache. Fragments come back in sorted source order, so the linked output
+    doesn't depend on the order of `sources` or on worker scheduling. Returns
+    the fragments and the sources that had to be translated.
+    """
+    passes = list(passes)
+    options = {option: value for option, value in options.items() if value}
+    sources = sorted(sources)
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_files = {
+        source: cache_dir.joinpath(cache_key(source, passes, **options)).with_suffix(
+            ".json"
+        )
+        for source in sources
+        if cache_dir is not None
+    }
+    by_source: dict[Path, list[Fragment]] = {}
+    for source, cache_file in cache_files.items():
+        if cache_file.exists():
+            by_source[source] = [
+                Fragment(**fragment) for fragment in json.loads(cache_file.read_text())
+            ]
+
+    translated = [source for source in sources if source not in by_source]
+    translate_source = partial(translate_file, passes=passes, **options)
+    if len(translated) == 1:
+        by_source[translated[0]] = translate_source(translated[0])
+    elif translated:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            by_source.update(
+                zip(translated, executor.map(translate_source, translated))
+            )
+
+    for source in translated:
+        if source in cache_files:
+            # Write then rename so concurrent builds never see a partial entry
+            cache_file = cache_files[source]
+            tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps([asdict(f) for f in by_source[source]]))
+            os.replace(tmp_file, cache_file)
+    fragments = [fragment for source in sources for fragment in by_source[source]]
+    return fragments, translated
+
+
+def translate_folder(
+    folder: Path,
+    cache_dir: Optional[Path] = CACHE_DIR,
+    passes: Iterable[Pass] = (),
+    *,
+    trampolines: bool = False,
+    shared_comparisons: bool = False,
+    cache_tos: bool = False,
+    eliminate_dead_functions: bool = False,
+    max_workers: Optional[int] = None,
+) -> str:
+    """
+    Translates and links every .vm file in a folder.
+    """
+    fragments, _ = translate_files(
+        folder.glob("*.vm"),
+        cache_dir,
+        passes,
+        max_workers,
+        trampolines=trampolines,
+        shared_comparisons=shared_comparisons,
+        cache_tos=cache_tos,
+    )
+    return link(
+        fragments,
+        trampolines=trampolines,
+        shared_comparisons=shared_comparisons,
+        eliminate_dead_functions=eliminate_dead_functions,
+    )
+
+
 if __name__ == "__main__":
-    import sys
-    from pathlib import Path
+    import argparse
+
+    from vm_passes import PASSES
+
+    parser = argparse.ArgumentParser(
+        description="Translates and links every .vm file in a folder."
+    )
+    parser.add_argument("folder", type=Path)
+    parser.add_argument("--trampolines", action="store_true")
+    parser.add_argument("--shared-comparisons", action="store_true")
+    parser.add_argument("--cache-tos", action="store_true")
+    parser.add_argument("--eliminate-dead-functions", action="store_true")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    for name in PASSES:
+        parser.add_argument(f"--{name.replace('_', '-')}", action="store_true")
+    arguments = parser.parse_args()
 
-    target_folder = Path(sys.argv[1])
-    vm_files = target_folder.glob("*.vm")
-    vm_code = "\n".join([file_.read_text() for file_ in vm_files])
+    target_folder = arguments.folder
+    cache_dir = arguments.cache_dir
+    passes = [PASSES[name]() for name in PASSES if getattr(arguments, name)]
+    eliminate_dead_functions = arguments.eliminate_dead_functions
+    options = {
+        option: True
+        for option in ("trampolines", "shared_comparisons", "cache_tos")
+        if getattr(arguments, option)
+    }
     print(target_folder)
-    target_folder.joinpath(target_folder.stem).with_suffix(".asm").write_text(
-        translate(vm_code, target_folder.stem)
+
+    sources = sorted(target_folder.glob("*.vm"))
+    fragments, translated = translate_files(sources, cache_dir, passes, **options)
+    print(
+        f"Translated {len(translated)} file(s), "
+        f"{len(sources) - len(translated)} from cache"
     )
+    if eliminate_dead_functions:
+        fragments, removed = split_dead_fragments(fragments)
+        words = sum(count_instructions(fragment.asm) for fragment in removed)
+        print(
+            f"Removed {len(removed)} unreachable functions ({words} words)"
+            + "".join(f"\n  {fragment.name}" for fragment in removed)
+        )
+    link_options = {
+        option: value
+        for option, value in options.items()
+        if option in ("trampolines", "shared_comparisons")
+    }
+    asm = link(fragments, **link_options)
+    target_folder.joinpath(target_folder.stem).with_suffix(".asm").write_text(asm)
+    if passes or options or eliminate_dead_functions:
+        inlined = count_instructions(link(translate_files(sources, cache_dir)[0]))
+        words = count_instructions(asm)
+        print(f"ROM: {words} words, {inlined} unoptimized, saved {inlined - words}")
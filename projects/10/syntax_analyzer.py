@@ -1,421 +1,232 @@
-import re
-from dataclasses import dataclass
-from enum import Enum, auto
-from typing import Optional
-
-from lexical_elements import keywords, symbols
-
-STRING_SPACE = "?x?"
-
-
-class TokenType(Enum):
-    keyword = auto()
-    symbol = auto()
-    identifier = auto()
-    stringConstant = auto()
-    integerConstant = auto()
-
-
-@dataclass
-class Token:
-    text: str
-    type_: TokenType
-
-
-def strip_comments(program: str) -> str:
-    program = re.sub(
-        pattern=r"/\*\*.*?\*/", string=program, repl="", flags=re.MULTILINE | re.DOTALL
-    )
-    return "\n".join(
-        [
-            line.split("//")[0].strip()
-            for line in program.splitlines()
-            if line.strip() and not line.strip().startswith("//")
-        ]
-    ).strip()
-
-
-def tokenize(program: str) -> list[Token]:
-    program = strip_comments(program)
-    fixed_strings = re.sub(
-        pattern=r"(?<=\").+(?=\")",
-        string=program,
-        repl=lambda match: match.group().replace(" ", STRING_SPACE),
-    )
-    left_spaced_program = re.sub(
-        pattern=rf"(?<! )[{''.join([re.escape(symbol) for symbol in symbols])}]",
-        string=fixed_strings,
-        repl=lambda match: " " + match.group(),
-    )
-    spaced_program = re.sub(
-        pattern=rf"[{''.join([re.escape(symbol) for symbol in symbols])}](?! )",
-        string=left_spaced_program,
-        repl=lambda match: match.group() + " ",
-    )
-    tokenized = [
-        token.replace(STRING_SPACE, " ").strip() for token in spaced_program.split()
-    ]
-    tokens = []
-    for token in tokenized:
-        if token in keywords:
-            type_ = TokenType.keyword
-        elif token in symbols:
-            type_ = TokenType.symbol
-        elif token.startswith('"'):
-            type_ = TokenType.stringConstant
-        elif token.isnumeric():
-            type_ = TokenType.integerConstant
-        else:
-            type_ = TokenType.identifier
-        text = (
-            token.replace('"', "")
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-        )
-        tokens.append(Token(text=text, type_=type_))
-    return tokens
-
-
-def handle_class_token(
-    tokens: list[Token], xml: Optional[list[str]] = None
-) -> list[str]:
-    if xml is None:
-        xml = []
-    xml.append("<class>")
-    class_keyword, name_identifier, opening_bracket, *tokens = tokens
-    for token in (class_keyword, name_identifier, opening_bracket):
-        xml.append(format_token(token))
-    token = tokens[0]
-    while token.text != "}":
-        if token.text in ("static", "field"):
-            # Class var declaration
-            tokens, xml = handle_class_var_dec(tokens, xml)
-            token = tokens[0]
-        elif token.text in ("constructor", "function", "method"):
-            # Subroutine (method) declaration
-            tokens, xml = handle_subroutine_dec(tokens, xml)
-            token = tokens[0]
-
-    closing_bracket_token, *tokens = tokens
-    xml.append(format_token(closing_bracket_token))
-    xml.append("</class>")
-    return xml
-
-
-def handle_class_var_dec(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    xml.append("<classVarDec>")
-    var_keyword, type_keyword, name_identifier, *tokens = tokens
-    for token in (var_keyword, type_keyword, name_identifier):
-        xml.append(format_token(token))
-    token = tokens[0]
-    while token.text != ";":
-        comma_symbol, name_identifier, *tokens = tokens
-        for token in (comma_symbol, name_identifier):
-            xml.append(format_token(token))
-        token = tokens[0]
-    semi_colon_token, *tokens = tokens
-    xml.append(format_token(semi_colon_token))
-    xml.append("</classVarDec>")
-    return tokens, xml
-
-
-def handle_subroutine_dec(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    xml.append("<subroutineDec>")
-    method_keyword, type_keyword, name_identifier, opening_bracket, *tokens = tokens
-    for token in (method_keyword, type_keyword, name_identifier, opening_bracket):
-        xml.append(format_token(token))
-
-    # Handle parameter list
-    xml.append("<parameterList>")
-    token = tokens[0]
-    while token.text != ")":
-        if token.text == ",":
-            comma_token, *tokens = tokens
-            xml.append(format_token(comma_token))
-        else:
-            type_keyword, name_identifier, *tokens = tokens
-            for token in (type_keyword, name_identifier):
-                xml.append(format_token(token))
-        token = tokens[0]
-    # Closing bracket
-    xml.append("</parameterList>")
-    closing_bracket_token, *tokens = tokens
-    xml.append(format_token(closing_bracket_token))
-    # Handle subroutine body
-    tokens, xml = handle_subroutine_body(tokens, xml)
-    xml.append("</subroutineDec>")
-    return tokens, xml
-
-
-def handle_subroutine_body(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    xml.append("<subroutineBody>")
-    opening_bracket, *tokens = tokens
-    xml.append(format_token(opening_bracket))
-    token = tokens[0]
-    if not token.text == "}":
-        while token.text == "var":
-            # Variable declaration
-            tokens, xml = handle_var_dec(tokens, xml)
-            token = tokens[0]
-    # The rest are statements
-    xml.append("<statements>")
-    while token.text != "}":
-        tokens, xml = handle_statement(tokens, xml)
-        token = tokens[0]
-    closing_bracket_symbol, *tokens = tokens
-    xml.append("</statements>")
-    xml.append(format_token(closing_bracket_symbol))
-    xml.append("</subroutineBody>")
-    return tokens, xml
-
-
-def handle_statement(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    statement_token, *tokens = tokens
-    if statement_token.text == "let":
-        xml.append("<letStatement>")
-        name_identifier, *tokens = tokens
-        for token in (statement_token, name_identifier):
-            xml.append(format_token(token))
-        if tokens[0].text == "[":
-            opening_bracket, *tokens = tokens
-            xml.append(format_token(opening_bracket))
-            tokens, xml = handle_expression(tokens, xml)
-            closing_bracket, *tokens = tokens
-            xml.append(format_token(closing_bracket))
-        eq_symbol, *tokens = tokens
-        xml.append(
-            f"<{eq_symbol.type_.name}> {eq_symbol.text} </{eq_symbol.type_.name}>"
-        )
-        # Handle expression
-        tokens, xml = handle_expression(tokens, xml)
-        semicolon_token, *tokens = tokens
-        xml.append(format_token(semicolon_token))
-        xml.append("</letStatement>")
-    elif statement_token.text == "if":
-        xml.append("<ifStatement>")
-        opening_bracket_symbol, *tokens = tokens
-        for token in (statement_token, opening_bracket_symbol):
-            xml.append(format_token(token))
-        # Handle expression
-        tokens, xml = handle_expression(tokens, xml)
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(format_token(closing_bracket_symbol))
-        opening_bracket_symbol, *tokens = tokens
-        xml.append(format_token(opening_bracket_symbol))
-        # Handle statements
-        token = tokens[0]
-        xml.append("<statements>")
-        while token.text != "}":
-            tokens, xml = handle_statement(tokens, xml)
-            token = tokens[0]
-        xml.append("</statements>")
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(format_token(closing_bracket_symbol))
-        if tokens[0].text == "else":
-            # Else statement
-            else_keyword, opening_bracket, *tokens = tokens
-            for token in (else_keyword, opening_bracket):
-                xml.append(format_token(token))
-            # Handle statements
-            token = tokens[0]
-            xml.append("<statements>")
-            while token.text != "}":
-                tokens, xml = handle_statement(tokens, xml)
-                token = tokens[0]
-            xml.append("</statements>")
-            closing_bracket_symbol, *tokens = tokens
-            xml.append(format_token(closing_bracket_symbol))
-        xml.append("</ifStatement>")
-    elif statement_token.text == "while":
-        xml.append("<whileStatement>")
-        opening_bracket_symbol, *tokens = tokens
-        for token in (statement_token, opening_bracket_symbol):
-            xml.append(format_token(token))
-        # Handle expression
-        tokens, xml = handle_expression(tokens, xml)
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(format_token(closing_bracket_symbol))
-        opening_bracket_symbol, *tokens = tokens
-        xml.append(format_token(opening_bracket_symbol))
-        # Handle statements
-        token = tokens[0]
-        xml.append("<statements>")
-        while token.text != "}":
-            tokens, xml = handle_statement(tokens, xml)
-            token = tokens[0]
-        xml.append("</statements>")
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(format_token(closing_bracket_symbol))
-        xml.append("</whileStatement>")
-    elif statement_token.text == "do":
-        xml.append("<doStatement>")
-        xml.append(format_token(statement_token))
-        # Handle subroutine call
-        identifier_token, *tokens = tokens
-        if tokens[0].text == ".":
-            dot_symbol, method_identifier, *tokens = tokens
-            for token in (identifier_token, dot_symbol, method_identifier):
-                xml.append(format_token(token))
-        else:
-            xml.append(format_token(identifier_token))
-        # Handle expression list
-        opening_bracket_symbol, *tokens = tokens
-        xml.append(format_token(opening_bracket_symbol))
-        xml.append("<expressionList>")
-        token = tokens[0]
-        while token.text != ")":
-            if token.text == ",":
-                comma_symbol, *tokens = tokens
-                xml.append(format_token(comma_symbol))
-            tokens, xml = handle_expression(tokens, xml)
-            token = tokens[0]
-        xml.append("</expressionList>")
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(format_token(closing_bracket_symbol))
-        semicolon_token, *tokens = tokens
-        xml.append(format_token(semicolon_token))
-        xml.append("</doStatement>")
-    elif statement_token.text == "return":
-        xml.append("<returnStatement>")
-        xml.append(format_token(statement_token))
-        if not tokens[0].text == ";":
-            tokens, xml = handle_expression(tokens, xml)
-        semicolon_token, *tokens = tokens
-        xml.append(format_token(semicolon_token))
-        xml.append("</returnStatement>")
-    else:
-        raise ValueError(f"{statement_token.text} is not a valid statement token")
-
-    return tokens, xml
-
-
-def handle_subroutine_call(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    identifier_token, *tokens = tokens
-    if tokens[0].text == ".":
-        dot_symbol, method_identifier, *tokens = tokens
-        for token in (identifier_token, dot_symbol, method_identifier):
-            xml.append(format_token(token))
-    else:
-        xml.append(format_token(identifier_token))
-    # Handle expression list
-    opening_bracket_symbol, *tokens = tokens
-    xml.append(format_token(opening_bracket_symbol))
-    xml.append("<expressionList>")
-    token = tokens[0]
-    while token.text != ")":
-        if token.text == ",":
-            comma_symbol, *tokens = tokens
-            xml.append(format_token(comma_symbol))
-        tokens, xml = handle_expression(tokens, xml)
-        token = tokens[0]
-    xml.append("</expressionList>")
-    closing_bracket_symbol, *tokens = tokens
-    xml.append(format_token(closing_bracket_symbol))
-    return tokens, xml
-
-
-def handle_term(tokens: list[Token], xml: list[str]) -> tuple[list[Token], list[str]]:
-    xml.append("<term>")
-    token, *tokens = tokens
-    if token.type_ == TokenType.integerConstant:
-        # Integer constant
-        xml.append(f"<integerConstant> {token.text} </integerConstant>")
-    elif token.type_ == TokenType.stringConstant:
-        # String constant
-        xml.append(f"<stringConstant> {token.text} </stringConstant>")
-    elif token.type_ == TokenType.keyword:
-        # Keyword constant
-        xml.append(f"<keyword> {token.text} </keyword>")
-    elif token.type_ == TokenType.identifier:
-        # Must be a var, array element, or subroutine call
-        next_token = tokens[0]
-        if next_token.text in (".", "("):
-            tokens, xml = handle_subroutine_call([token] + tokens, xml)
-        elif next_token.text == "[":
-            # Array
-            # let a[1] = a[2];
-            opening_bracket, *tokens = tokens
-            for token_ in (token, opening_bracket):
-                xml.append(format_token(token_))
-            tokens, xml = handle_expression(tokens, xml)
-            closing_bracket, *tokens = tokens
-            xml.append(format_token(closing_bracket))
-        else:
-            # Just a var
-            xml.append(format_token(token))
-    elif token.text == "(":
-        xml.append(format_token(token))
-        tokens, xml = handle_expression(tokens, xml)
-        closing_bracket, *tokens = tokens
-        xml.append(format_token(closing_bracket))
-    elif token.text in ("-", "~"):  # Unary ops
-        xml.append(format_token(token))
-        tokens, xml = handle_term(tokens, xml)
-    else:
-        xml.append(format_token(token))
-    token = tokens[0]
-    ops = ["+", "-", "*", "/", "&", "|", "<", ">", "=", "&amp;", "&gt;", "&lt;"]
-    xml.append("</term>")
-    if token.text in ops:
-        op_token, *tokens = tokens
-        xml.append(format_token(op_token))
-        tokens, xml = handle_term(tokens, xml)
-    return tokens, xml
-
-
-def handle_expression(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    xml.append("<expression>")
-    # Handle term
-    tokens, xml = handle_term(tokens, xml)
-    xml.append("</expression>")
-    return tokens, xml
-
-
-def handle_var_dec(
-    tokens: list[Token], xml: list[str]
-) -> tuple[list[Token], list[str]]:
-    xml.append("<varDec>")
-    var_keyword, type_keyword, name_identifier, *tokens = tokens
-    for token in (var_keyword, type_keyword, name_identifier):
-        xml.append(format_token(token))
-    token = tokens[0]
-    while token.text != ";":
-        comma_symbol, name_identifier, *tokens = tokens
-        for token in (comma_symbol, name_identifier):
-            xml.append(format_token(token))
-        token = tokens[0]
-    semi_colon_token, *tokens = tokens
-    xml.append(format_token(semi_colon_token))
-    xml.append("</varDec>")
-    return tokens, xml
+import sys
+from html import escape
+from pathlib import Path
+
+# The tokenizer and parser are shared with the compiler in project 11
+sys.path.insert(0, str(Path(__file__).parents[1].joinpath("11")))
+from jack_ast import (  # noqa: E402
+    ArrayAccess,
+    Class,
+    ClassVarDec,
+    DoStatement,
+    Expression,
+    IfStatement,
+    IntegerConstant,
+    KeywordConstant,
+    LetStatement,
+    ParenthesizedExpression,
+    ReturnStatement,
+    Statement,
+    StringConstant,
+    SubroutineCall,
+    SubroutineDec,
+    Term,
+    UnaryOperation,
+    VarName,
+    Visitor,
+    WhileStatement,
+)
+from jack_parser import parse  # noqa: E402
+from tokenizer import KEYWORDS, tokenize  # noqa: E402
+
+
+def element(tag: str, text: str) -> str:
+    return f"<{tag}> {escape(text, quote=False)} </{tag}>"
+
+
+def type_element(type_: str) -> str:
+    # Built-in types are keywords, class types identifiers
+    return element("keyword" if type_ in KEYWORDS else "identifier", type_)
+
+
+class XmlGenerator(Visitor):
+    """
+    Writes the syntax tree of a class back out as the XML parse tree of the
+    project 10 test files, one element per line.
+    """
+
+    def __init__(self) -> None:
+        self.xml: list[str] = []
+
+    def symbol(self, text: str) -> None:
+        self.xml.append(element("symbol", text))
+
+    def names(self, names: list[str]) -> None:
+        # name (, name)* ;
+        for i, name in enumerate(names):
+            if i:
+                self.symbol(",")
+            self.xml.append(element("identifier", name))
+        self.symbol(";")
+
+    def visit_Class(self, node: Class) -> list[str]:
+        self.xml.append("<class>")
+        self.xml.append(element("keyword", "class"))
+        self.xml.append(element("identifier", node.name))
+        self.symbol("{")
+        for class_var_dec in node.class_var_decs:
+            self.visit(class_var_dec)
+        for subroutine_dec in node.subroutine_decs:
+            self.visit(subroutine_dec)
+        self.symbol("}")
+        self.xml.append("</class>")
+        return self.xml
+
+    def visit_ClassVarDec(self, node: ClassVarDec) -> None:
+        self.xml.append("<classVarDec>")
+        self.xml.append(element("keyword", node.kind))
+        self.xml.append(type_element(node.type_))
+        self.names(node.names)
+        self.xml.append("</classVarDec>")
+
+    def visit_SubroutineDec(self, node: SubroutineDec) -> None:
+        self.xml.append("<subroutineDec>")
+        self.xml.append(element("keyword", node.kind))
+        self.xml.append(type_element(node.return_type))
+        self.xml.append(element("identifier", node.name))
+        self.symbol("(")
+        self.xml.append("<parameterList>")
+        for i, parameter in enumerate(node.parameters):
+            if i:
+                self.symbol(",")
+            self.xml.append(type_element(parameter.type_))
+            self.xml.append(element("identifier", parameter.name))
+        self.xml.append("</parameterList>")
+        self.symbol(")")
+
+        self.xml.append("<subroutineBody>")
+        self.symbol("{")
+        for var_dec in node.var_decs:
+            self.xml.append("<varDec>")
+            self.xml.append(element("keyword", "var"))
+            self.xml.append(type_element(var_dec.type_))
+            self.names(var_dec.names)
+            self.xml.append("</varDec>")
+        self.visit_statements(node.statements)
+        self.symbol("}")
+        self.xml.append("</subroutineBody>")
+        self.xml.append("</subroutineDec>")
+
+    def visit_statements(self, statements: list[Statement]) -> None:
+        self.xml.append("<statements>")
+        for statement in statements:
+            self.visit(statement)
+        self.xml.append("</statements>")
+
+    def visit_block(self, statements: list[Statement]) -> None:
+        self.symbol("{")
+        self.visit_statements(statements)
+        self.symbol("}")
+
+    def visit_LetStatement(self, node: LetStatement) -> None:
+        self.xml.append("<letStatement>")
+        self.xml.append(element("keyword", "let"))
+        self.xml.append(element("identifier", node.name))
+        if node.index is not None:
+            self.symbol("[")
+            self.visit(node.index)
+            self.symbol("]")
+        self.symbol("=")
+        self.visit(node.value)
+        self.symbol(";")
+        self.xml.append("</letStatement>")
+
+    def visit_IfStatement(self, node: IfStatement) -> None:
+        self.xml.append("<ifStatement>")
+        self.xml.append(element("keyword", "if"))
+        self.symbol("(")
+        self.visit(node.condition)
+        self.symbol(")")
+        self.visit_block(node.statements)
+        if node.else_statements is not None:
+            self.xml.append(element("keyword", "else"))
+            self.visit_block(node.else_statements)
+        self.xml.append("</ifStatement>")
+
+    def visit_WhileStatement(self, node: WhileStatement) -> None:
+        self.xml.append("<whileStatement>")
+        self.xml.append(element("keyword", "while"))
+        self.symbol("(")
+        self.visit(node.condition)
+        self.symbol(")")
+        self.visit_block(node.statements)
+        self.xml.append("</whileStatement>")
+
+    def visit_DoStatement(self, node: DoStatement) -> None:
+        self.xml.append("<doStatement>")
+        self.xml.append(element("keyword", "do"))
+        self.visit(node.call)
+        self.symbol(";")
+        self.xml.append("</doStatement>")
+
+    def visit_ReturnStatement(self, node: ReturnStatement) -> None:
+        self.xml.append("<returnStatement>")
+        self.xml.append(element("keyword", "return"))
+        if node.value is not None:
+            self.visit(node.value)
+        self.symbol(";")
+        self.xml.append("</returnStatement>")
+
+    def visit_Expression(self, node: Expression) -> None:
+        self.xml.append("<expression>")
+        self.visit_term(node.term)
+        for operator, term in node.operations:
+            self.symbol(operator)
+            self.visit_term(term)
+        self.xml.append("</expression>")
+
+    def visit_term(self, term: Term) -> None:
+        self.xml.append("<term>")
+        self.visit(term)
+        self.xml.append("</term>")
+
+    def visit_IntegerConstant(self, node: IntegerConstant) -> None:
+        self.xml.append(element("integerConstant", str(node.value)))
+
+    def visit_StringConstant(self, node: StringConstant) -> None:
+        self.xml.append(element("stringConstant", node.value))
+
+    def visit_KeywordConstant(self, node: KeywordConstant) -> None:
+        self.xml.append(element("keyword", node.value))
+
+    def visit_VarName(self, node: VarName) -> None:
+        self.xml.append(element("identifier", node.name))
+
+    def visit_ArrayAccess(self, node: ArrayAccess) -> None:
+        self.xml.append(element("identifier", node.name))
+        self.symbol("[")
+        self.visit(node.index)
+        self.symbol("]")
+
+    def visit_SubroutineCall(self, node: SubroutineCall) -> None:
+        if node.receiver is not None:
+            self.xml.append(element("identifier", node.receiver))
+            self.symbol(".")
+        self.xml.append(element("identifier", node.name))
+        self.symbol("(")
+        self.xml.append("<expressionList>")
+        for i, argument in enumerate(node.arguments):
+            if i:
+                self.symbol(",")
+            self.visit(argument)
+        self.xml.append("</expressionList>")
+        self.symbol(")")
+
+    def visit_ParenthesizedExpression(self, node: ParenthesizedExpression) -> None:
+        self.symbol("(")
+        self.visit(node.expression)
+        self.symbol(")")
+
+    def visit_UnaryOperation(self, node: UnaryOperation) -> None:
+        self.symbol(node.operator)
+        self.visit_term(node.term)
 
 
 def generate_xml(program: str) -> str:
-    result = handle_class_token(tokenize(program))
-    return "\n".join(result)
-
-
-def format_token(token: Token) -> str:
-    return f"<{token.type_.name}> {token.text} </{token.type_.name}>"
+    return "\n".join(XmlGenerator().visit(parse(program)))
 
 
 if __name__ == "__main__":
-    import sys
-    from pathlib import Path
-
     target_file = Path.cwd() / sys.argv[1]
     if not target_file.suffix == ".jack":
         raise ValueError(f"File type {repr(target_file.suffix)} not supported")
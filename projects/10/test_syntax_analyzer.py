@@ -37,3 +37,8 @@ def test_creates_correct_xml(jack_file: Path):
     for i, expected_line in enumerate(expected_xml):
         print(expected_line, "\t", generated_xml[i])
         assert generated_xml[i] == expected_line.strip()
+
+
+def test_rejects_unexpected_tokens():
+    with pytest.raises(ValueError, match="Expected ';' but found '}'"):
+        syntax_analyzer.generate_xml("class Main { function void main() { do f() } }")
@@ -0,0 +1,140 @@
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from compiler import compile_, compile_project
+from tokenizer import TokenStream, tokenize
+
+FUNCTION_TEMPLATE = """\
+    function int f{n}(int a, int b) {{
+        var int c, d;
+        var Array e;
+        let c = a + b;
+        let e = Array.new(2);
+        let e[0] = c * 2;
+        if (c > {n}) {{
+            let d = Bench.f{previous}(c, e[0]);
+        }} else {{
+            let d = -c;
+        }}
+        while (d < 10) {{
+            let d = d + 1;
+        }}
+        do Output.printString("done");
+        return d & c;
+    }}
+"""
+
+
+def generate_class(lines: int) -> str:
+    """
+    Generates a Jack class of roughly `lines` lines made of identical
+    functions that each call the one before them.
+    """
+    function_lines = FUNCTION_TEMPLATE.count("\n")
+    functions = [
+        FUNCTION_TEMPLATE.format(n=n, previous=max(n - 1, 0))
+        for n in range(max(lines // function_lines, 1))
+    ]
+    return "class Bench {\n" + "".join(functions) + "}\n"
+
+
+def unpack_tokens(tokens: list) -> None:
+    # How the handlers consumed tokens before the stream: every step copies
+    # the rest of the list
+    while tokens:
+        token, *tokens = tokens
+
+
+def advance_tokens(tokens: list) -> None:
+    stream = TokenStream(tokens)
+    for _ in range(len(tokens)):
+        stream.advance()
+
+
+def tokenize_sources(sources: list[str], repeat: int) -> None:
+    for _ in range(repeat):
+        for source in sources:
+            tokenize(source)
+
+
+def build_report(lines: int) -> str:
+    """
+    Times a cold build, a warm one and two incremental ones of Pong, the OS
+    classes of project 12 and a generated class of `lines` lines, in a
+    temporary folder with its own cache.
+    """
+    project_dir = Path(__file__).parent
+    rows = [f"{'build':<32}{'compiled':>10}{'seconds':>10}"]
+    with tempfile.TemporaryDirectory() as folder_name:
+        folder = Path(folder_name)
+        for jack_file in [
+            *project_dir.joinpath("Pong").glob("*.jack"),
+            *project_dir.parent.joinpath("12").glob("*.jack"),
+        ]:
+            shutil.copy(jack_file, folder)
+        folder.joinpath("Bench.jack").write_text(generate_class(lines))
+        sources = sorted(folder.glob("*.jack"))
+
+        def build(name: str) -> None:
+            start = time.perf_counter()
+            _, recompiled = compile_project(sources, folder.joinpath("cache"))
+            seconds = time.perf_counter() - start
+            rows.append(f"{name:<32}{len(recompiled):>10}{seconds:>10.3f}")
+
+        build("cold")
+        build("warm")
+        ball = folder.joinpath("Ball.jack")
+        ball.write_text(ball.read_text().replace("let x = Ax;", "let x = Ax + 0;"))
+        build("Ball body changed")
+        bat = folder.joinpath("Bat.jack")
+        bat.write_text(bat.read_text().replace("void move()", "int move()"))
+        build("Bat.move signature changed")
+    return "\n".join(rows)
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    # Usage: python benchmark.py [lines]
+    # Times tokenizing the Pong and Square sources, then compiles generated
+    # classes of doubling size up to `lines` (default 50K) and times consuming
+    # their tokens by list unpacking and by the stream, and finally reports
+    # cold and warm builds of a project through the compile cache
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    # Unpacking a list of this many tokens takes about a minute
+    unpack_limit = 100_000
+
+    for example in ("Pong", "Square"):
+        folder = Path(__file__).parent.joinpath(example)
+        sources = [jack_file.read_text() for jack_file in sorted(folder.glob("*.jack"))]
+        seconds = min(timed(tokenize_sources, sources, 20) for _ in range(5))
+        print(f"tokenize {example}: {seconds * 50:.2f}ms per pass")
+
+    print(
+        f"{'lines':>8}{'tokens':>10}{'compile s':>12}{'us/token':>10}"
+        f"{'stream s':>12}{'unpack s':>12}"
+    )
+    for size in (lines // 8, lines // 4, lines // 2, lines):
+        program = generate_class(size)
+        tokens = tokenize(program)
+        compile_seconds = timed(compile_, program)
+        stream_seconds = timed(advance_tokens, tokens)
+        unpack = (
+            f"{timed(unpack_tokens, tokens):>12.3f}"
+            if len(tokens) <= unpack_limit
+            else f"{'-':>12}"
+        )
+        print(
+            f"{program.count(chr(10)):>8}{len(tokens):>10}{compile_seconds:>12.3f}"
+            f"{compile_seconds / len(tokens) * 1e6:>10.2f}{stream_seconds:>12.3f}"
+            + unpack
+        )
+
+    print(build_report(lines // 10))
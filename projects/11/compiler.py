@@ -1,451 +1,513 @@
 from __future__ import annotations
 
-from typing import Optional
-
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Optional
+
+from jack_ast import (
+    ArrayAccess,
+    Class,
+    DoStatement,
+    Expression,
+    IfStatement,
+    IntegerConstant,
+    KeywordConstant,
+    LetStatement,
+    ParenthesizedExpression,
+    ReturnStatement,
+    Statement,
+    StringConstant,
+    SubroutineCall,
+    SubroutineDec,
+    UnaryOperation,
+    VarName,
+    Visitor,
+    WhileStatement,
+)
+from jack_parser import parse
 from symbol_table import SubroutineTable, SymbolTable
-from tokenizer import Token, TokenType, tokenize
-
-
-def handle_class_token(
-    tokens: list[Token],
-    xml: Optional[list[str]] = None,
-    symbol_table: Optional[SymbolTable] = None,
-) -> list[str]:
-    if xml is None:
-        xml = []
-    class_keyword, name_identifier, opening_bracket, *tokens = tokens
-    if symbol_table is None:
-        symbol_table = SymbolTable(class_name=name_identifier.text)
-    token = tokens[0]
-    while token.text != "}":
-        if token.text in ("static", "field"):
-            # Class var declaration
-            tokens, xml = handle_class_var_dec(tokens, xml, symbol_table)
-            token = tokens[0]
-        elif token.text in ("constructor", "function", "method"):
-            # Subroutine (method) declaration
-            tokens, xml = handle_subroutine_dec(
-                tokens, xml, symbol_table, is_method=(token.text != "function")
-            )
-            token = tokens[0]
-
-    closing_bracket_token, *tokens = tokens
-
-    return xml
-
-
-def handle_class_var_dec(
-    tokens: list[Token], xml: list[str], symbol_table: SymbolTable
-) -> tuple[list[Token], list[str]]:
-    var_keyword, type_keyword, name_identifier, *tokens = tokens
-    symbol_table.add_symbol(
-        name=name_identifier.text,
-        type_=type_keyword.text,
-        kind=var_keyword.text,
-    )
-    token = tokens[0]
-    while token.text != ";":
-        comma_symbol, name_identifier, *tokens = tokens
-        symbol_table.add_symbol(
-            name=name_identifier.text,
-            type_=type_keyword.text,
-            kind=var_keyword.text,
-        )
-        token = tokens[0]
-    semi_colon_token, *tokens = tokens
-
-    return tokens, xml
-
-
-def handle_subroutine_dec(
-    tokens: list[Token],
-    xml: list[str],
-    symbol_table: SymbolTable,
-    is_method: bool = True,
-) -> tuple[list[Token], list[str]]:
-    method_keyword, type_keyword, name_identifier, opening_bracket, *tokens = tokens
-
-    subroutine_table = SubroutineTable(
-        parent_table=symbol_table,
-        subroutine_name=name_identifier.text,
-        is_method=is_method,
-        is_void=(type_keyword.text == "void"),
-        is_constructor=method_keyword.text == "constructor",
-    )
-    # Handle parameter list
-    token = tokens[0]
-    while token.text != ")":
-        if token.text == ",":
-            comma_token, *tokens = tokens
-
-        else:
-            type_keyword, name_identifier, *tokens = tokens
-            subroutine_table.add_symbol(
-                name=name_identifier.text,
-                type_=type_keyword.text,
-                kind="argument",
-            )
-        token = tokens[0]
-    # Closing bracket
-    closing_bracket_token, *tokens = tokens
-
-    # Handle subroutine body
-    tokens, xml, subroutine_table = handle_subroutine_body(
-        tokens, xml, subroutine_table
-    )
-    return tokens, xml
-
+from tokenizer import JackError, TokenStream, tokenize
 
-def handle_subroutine_body(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str], SubroutineTable]:
-    opening_bracket, *tokens = tokens
 
-    token = tokens[0]
-    if not token.text == "}":
-        while token.text == "var":
-            # Variable declaration
-            tokens, xml, subroutine_table = handle_var_dec(
-                tokens, xml, subroutine_table
-            )
-            token = tokens[0]
-    xml.append(
-        f"function {subroutine_table.parent.class_name}.{subroutine_table.subroutine_name} {subroutine_table.var_count}"
-    )
-    if subroutine_table.is_method and not subroutine_table.is_constructor:
-        xml.append("push argument 0")
-        xml.append("pop pointer 0")
-    # Constructor memory allocation
-    if subroutine_table.is_constructor:
-        xml.append(f"push constant {subroutine_table.field_count}")
-        xml.append("call Memory.alloc 1")
-        xml.append("pop pointer 0")
-    # The rest are statements
-    while token.text != "}":
-        tokens, xml = handle_statement(tokens, xml, subroutine_table)
-        token = tokens[0]
-    closing_bracket_symbol, *tokens = tokens
-    return tokens, xml, subroutine_table
-
-
-def handle_statement(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str]]:
-    statement_token, *tokens = tokens
-    if statement_token.text == "let":
-        name_identifier, *tokens = tokens
-        if tokens[0].text == "[":
-            opening_bracket, *tokens = tokens
-            xml.append(f"push {subroutine_table[name_identifier.text]}")
-
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-            xml.append("add")
-            closing_bracket, *tokens = tokens
-
-            eq_symbol, *tokens = tokens
-            xml.append(
-                f"// <{eq_symbol.type_.name}> {eq_symbol.text} </{eq_symbol.type_.name}>"
-            )
-            # Handle expression
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-            xml.append("pop temp 0")
-            xml.append("pop pointer 1")
-            xml.append("push temp 0")
-            xml.append("pop that 0")
-            semicolon_token, *tokens = tokens
-
-        else:
-            eq_symbol, *tokens = tokens
-            xml.append(
-                f"// <{eq_symbol.type_.name}> {eq_symbol.text} </{eq_symbol.type_.name}>"
-            )
-            # Handle expression
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-            semicolon_token, *tokens = tokens
-
-            xml.append(f"pop {subroutine_table[name_identifier.text]}")
-    elif statement_token.text == "if":
-        if_label = subroutine_table.parent.label_generator.generate_label()
-        else_label = subroutine_table.parent.label_generator.generate_label()
-        opening_bracket_symbol, *tokens = tokens
-        # Handle expression
-        tokens, xml = handle_expression(tokens, xml, subroutine_table)
-        closing_bracket_symbol, *tokens = tokens
-
-        xml.append("not")
-        xml.append(f"if-goto {else_label}")
-        opening_bracket_symbol, *tokens = tokens
-
-        # Handle statements
-        token = tokens[0]
-        while token.text != "}":
-            tokens, xml = handle_statement(tokens, xml, subroutine_table)
-            token = tokens[0]
-        closing_bracket_symbol, *tokens = tokens
-        xml.append(f"goto {if_label}")
-
-        if tokens[0].text == "else":
-            # Else statement
-            else_keyword, opening_bracket, *tokens = tokens
-            xml.append(f"label {else_label}")
-            # Handle statements
-            token = tokens[0]
-            while token.text != "}":
-                tokens, xml = handle_statement(tokens, xml, subroutine_table)
-                token = tokens[0]
-            closing_bracket_symbol, *tokens = tokens
-            xml.append(f"label {if_label}")
-
-        else:
-            xml.append(f"label {else_label}")
-            xml.append(f"label {if_label}")
-    elif statement_token.text == "while":
-        check_label = subroutine_table.parent.label_generator.generate_label()
-        complete_label = subroutine_table.parent.label_generator.generate_label()
-        xml.append(f"label {check_label}")
-        opening_bracket_symbol, *tokens = tokens
-        # Handle expression
-        tokens, xml = handle_expression(tokens, xml, subroutine_table)
-        closing_bracket_symbol, *tokens = tokens
-
-        xml.append("not")
-        xml.append(f"if-goto {complete_label}")
-        opening_bracket_symbol, *tokens = tokens
-
-        # Handle statements
-        token = tokens[0]
-        while token.text != "}":
-            tokens, xml = handle_statement(tokens, xml, subroutine_table)
-            token = tokens[0]
-        closing_bracket_symbol, *tokens = tokens
-
-        xml.append(f"goto {check_label}")
-        xml.append(f"label {complete_label}")
-    elif statement_token.text == "do":
-        # Handle subroutine call
-        identifier_token, *tokens = tokens
-        dot_symbol, method_identifier = None, None
-        if tokens[0].text == ".":
-            dot_symbol, method_identifier, *tokens = tokens
-
-        # Handle expression list
-        opening_bracket_symbol, *tokens = tokens
-
-        token = tokens[0]
-        n_expressions = 0
-
-        if method_identifier is None:
-            # Method call on this
-            n_expressions += 1
-            xml.append(f"push {subroutine_table['this']}")
-            subroutine_name = f"{subroutine_table.class_name}.{identifier_token.text}"
-        elif identifier_token.text in subroutine_table:
-            # Method call on variable
-            n_expressions += 1
-            xml.append(f"push {subroutine_table[identifier_token.text]}")
-            var_type = subroutine_table.get_symbol(identifier_token.text).type_
-            subroutine_name = f"{var_type}.{method_identifier.text}"
-        else:
-            # Function call?
-            subroutine_name = f"{identifier_token.text}.{method_identifier.text}"
-        while token.text != ")":
-            if token.text == ",":
-                comma_symbol, *tokens = tokens
-
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-            n_expressions += 1
-            token = tokens[0]
-
-        xml.append(f"call {subroutine_name} {n_expressions}")
-
-        closing_bracket_symbol, *tokens = tokens
-
-        semicolon_token, *tokens = tokens
-    elif statement_token.text == "return":
-        if not tokens[0].text == ";":
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-        semicolon_token, *tokens = tokens
-        if subroutine_table.is_void:
-            xml.append("push constant 0")
-        xml.append("return")
-    else:
-        raise ValueError(f"{statement_token.text} is not a valid statement token")
-
-    return tokens, xml
-
-
-def handle_subroutine_call(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str]]:
-    identifier_token, *tokens = tokens
-    dot_symbol, method_identifier = None, None
-    if tokens[0].text == ".":
-        dot_symbol, method_identifier, *tokens = tokens
-
-    # Handle expression list
-    opening_bracket_symbol, *tokens = tokens
-
-    n_expressions = 0
-
-    if method_identifier is None:
-        # Method call on this
-        n_expressions += 1
-        xml.append(f"push {subroutine_table['this']}")
-        subroutine_name = f"{subroutine_table.class_name}.{identifier_token.text}"
-    elif identifier_token.text in subroutine_table:
-        # Method call on variable
-        n_expressions += 1
-        xml.append(f"push {subroutine_table[identifier_token.text]}")
-        var_type = subroutine_table.get_symbol(identifier_token.text).type_
-        subroutine_name = f"{var_type}.{method_identifier.text}"
-    else:
-        # Function call?
-        subroutine_name = f"{identifier_token.text}.{method_identifier.text}"
-    token = tokens[0]
-    while token.text != ")":
-        if token.text == ",":
-            comma_symbol, *tokens = tokens
-
-        tokens, xml = handle_expression(tokens, xml, subroutine_table)
-        n_expressions += 1
-        token = tokens[0]
-    closing_bracket_symbol, *tokens = tokens
-
-    xml.append(f"call {subroutine_name} {n_expressions}")
-    return tokens, xml
-
-
-def handle_term(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str]]:
-    token, *tokens = tokens
-    if token.type_ == TokenType.integerConstant:
-        # Integer constant
-        xml.append(f"// <integerConstant> {token.text} </integerConstant>")
-        xml.append(f"push constant {token.text}")
-    elif token.type_ == TokenType.stringConstant:
-        # String constant
-        xml.append(f"// <stringConstant> {token.text} </stringConstant>")
-
-        n_chars = len(token.text)
-        xml.append(f"push constant {n_chars}")
-        xml.append("call String.new 1")
-        for char in token.text:
-            xml.append(f"push constant {ord(char)}")
-            xml.append("call String.appendChar 2")
-    elif token.type_ == TokenType.keyword:
-        # Keyword constant
-        xml.append(f"// <keyword> {token.text} </keyword>")
-        if token.text == "true":
-            command = "push constant 1\nneg"
-        elif token.text == "false" or token.text == "null":
-            command = "push constant 0"
-        elif token.text == "this":
-            command = f"push {subroutine_table['this']}"
-        else:
-            raise ValueError(f"Unexpected token {token}")
-        xml.append(command)
-    elif token.type_ == TokenType.identifier:
-        # Must be a var, array element, or subroutine call
-        next_token = tokens[0]
-        if next_token.text in (".", "("):
-            tokens, xml = handle_subroutine_call(
-                [token] + tokens, xml, subroutine_table
-            )
-        elif next_token.text == "[":
-            # Array
-            # let a[1] = a[2];
-            opening_bracket, *tokens = tokens
-            xml.append(f"push {subroutine_table[token.text]}")
-            tokens, xml = handle_expression(tokens, xml, subroutine_table)
-            xml.append("add")
-            xml.append("pop pointer 1")
-            xml.append("push that 0")
-            closing_bracket, *tokens = tokens
-
-        else:
-            # Just a var
-
-            loc = subroutine_table[token.text]
-            xml.append(f"push {loc}")
-    elif token.text == "(":
-
-        tokens, xml = handle_expression(tokens, xml, subroutine_table)
-        closing_bracket, *tokens = tokens
-
-    elif token.text in ("-", "~"):  # Unary ops
-
-        tokens, xml = handle_term(tokens, xml, subroutine_table)
-        op = "neg" if token.text == "-" else "not"
-        xml.append(op)
-    token = tokens[0]
-    ops = ["+", "-", "*", "/", "&", "|", "// <", ">", "=", "&amp;", "&gt;", "&lt;"]
-    if token.text in ops:
-        op_token, *tokens = tokens
-
-        tokens, xml = handle_term(tokens, xml, subroutine_table)
-        xml.append(operations[op_token.text])
-    return tokens, xml
-
-
-operations = {
+OPERATIONS = {
     "+": "add",
     "-": "sub",
     "*": "call Math.multiply 2",
     "/": "call Math.divide 2",
     "&": "and",
     "|": "or",
-    "// <": "lt",
+    "<": "lt",
     ">": "gt",
     "=": "eq",
-    "&amp;": "and",
-    "&gt;": "gt",
-    "&lt;": "lt",
 }
 
 
-def handle_expression(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str]]:
-    # Handle term
-    tokens, xml = handle_term(tokens, xml, subroutine_table)
-    return tokens, xml
-
-
-def handle_var_dec(
-    tokens: list[Token], xml: list[str], subroutine_table: SubroutineTable
-) -> tuple[list[Token], list[str], SubroutineTable]:
-    var_keyword, type_keyword, name_identifier, *tokens = tokens
-
-    subroutine_table.add_symbol(
-        name=name_identifier.text, type_=type_keyword.text, kind=var_keyword.text
-    )
-    token = tokens[0]
-    while token.text != ";":
-        comma_symbol, name_identifier, *tokens = tokens
-        subroutine_table.add_symbol(
-            name=name_identifier.text,
-            type_=type_keyword.text,
-            kind=var_keyword.text,
+class CodeGenerator(Visitor):
+    """
+    Generates VM code from the syntax tree of a class.
+    """
+
+    def __init__(self) -> None:
+        self.vm: list[str] = []
+        # Set while visiting a class and each of its subroutines
+        self.symbol_table: SymbolTable
+        self.subroutine_table: SubroutineTable
+
+    def visit_Class(self, node: Class) -> list[str]:
+        self.symbol_table = SymbolTable(class_name=node.name)
+        for class_var_dec in node.class_var_decs:
+            for name in class_var_dec.names:
+                self.symbol_table.add_symbol(
+                    name=name, type_=class_var_dec.type_, kind=class_var_dec.kind
+                )
+        for subroutine_dec in node.subroutine_decs:
+            self.visit(subroutine_dec)
+        return self.vm
+
+    def visit_SubroutineDec(self, node: SubroutineDec) -> None:
+        table = SubroutineTable(
+            parent_table=self.symbol_table,
+            subroutine_name=node.name,
+            is_method=(node.kind != "function"),
+            is_void=(node.return_type == "void"),
+            is_constructor=(node.kind == "constructor"),
         )
-        token = tokens[0]
-    semi_colon_token, *tokens = tokens
+        for parameter in node.parameters:
+            table.add_symbol(
+                name=parameter.name, type_=parameter.type_, kind="argument"
+            )
+        for var_dec in node.var_decs:
+            for name in var_dec.names:
+                table.add_symbol(name=name, type_=var_dec.type_, kind="var")
+        self.subroutine_table = table
+
+        self.vm.append(f"function {table.class_name}.{node.name} {table.var_count}")
+        if table.is_method and not table.is_constructor:
+            self.vm.append("push argument 0")
+            self.vm.append("pop pointer 0")
+        # Constructor memory allocation
+        if table.is_constructor:
+            self.vm.append(f"push constant {table.field_count}")
+            self.vm.append("call Memory.alloc 1")
+            self.vm.append("pop pointer 0")
+        self.visit_statements(node.statements)
+
+    def visit_statements(self, statements: list[Statement]) -> None:
+        for statement in statements:
+            try:
+                self.visit(statement)
+            except KeyError as error:
+                raise JackError(
+                    f"Undeclared variable {error.args[0]!r}",
+                    statement.line,
+                    statement.column,
+                ) from None
+
+    def visit_LetStatement(self, node: LetStatement) -> None:
+        if node.index is None:
+            self.visit(node.value)
+            self.vm.append(f"pop {self.subroutine_table[node.name]}")
+            return
+        self.vm.append(f"push {self.subroutine_table[node.name]}")
+        self.visit(node.index)
+        self.vm.append("add")
+        # The value may use `that` itself, so the address waits in temp 0
+        self.visit(node.value)
+        self.vm.append("pop temp 0")
+        self.vm.append("pop pointer 1")
+        self.vm.append("push temp 0")
+        self.vm.append("pop that 0")
+
+    def visit_IfStatement(self, node: IfStatement) -> None:
+        if_label = self.symbol_table.label_generator.generate_label()
+        else_label = self.symbol_table.label_generator.generate_label()
+        self.visit(node.condition)
+        self.vm.append("not")
+        self.vm.append(f"if-goto {else_label}")
+        self.visit_statements(node.statements)
+        self.vm.append(f"goto {if_label}")
+        self.vm.append(f"label {else_label}")
+        if node.else_statements is not None:
+            self.visit_statements(node.else_statements)
+        self.vm.append(f"label {if_label}")
+
+    def visit_WhileStatement(self, node: WhileStatement) -> None:
+        check_label = self.symbol_table.label_generator.generate_label()
+        complete_label = self.symbol_table.label_generator.generate_label()
+        self.vm.append(f"label {check_label}")
+        self.visit(node.condition)
+        self.vm.append("not")
+        self.vm.append(f"if-goto {complete_label}")
+        self.visit_statements(node.statements)
+        self.vm.append(f"goto {check_label}")
+        self.vm.append(f"label {complete_label}")
+
+    def visit_DoStatement(self, node: DoStatement) -> None:
+        self.visit(node.call)
+
+    def visit_ReturnStatement(self, node: ReturnStatement) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+        if self.subroutine_table.is_void:
+            self.vm.append("push constant 0")
+        self.vm.append("return")
+
+    def visit_Expression(self, node: Expression) -> None:
+        self.visit(node.term)
+        for operator, term in node.operations:
+            self.visit(term)
+            self.vm.append(OPERATIONS[operator])
+
+    def visit_IntegerConstant(self, node: IntegerConstant) -> None:
+        self.vm.append(f"push constant {node.value}")
+
+    def visit_StringConstant(self, node: StringConstant) -> None:
+        self.vm.append(f"push constant {len(node.value)}")
+        self.vm.append("call String.new 1")
+        for char in node.value:
+            self.vm.append(f"push constant {ord(char)}")
+            self.vm.append("call String.appendChar 2")
+
+    def visit_KeywordConstant(self, node: KeywordConstant) -> None:
+        if node.value == "true":
+            self.vm.append("push constant 1")
+            self.vm.append("neg")
+        elif node.value == "this":
+            self.vm.append(f"push {self.subroutine_table['this']}")
+        else:
+            # false and null
+            self.vm.append("push constant 0")
+
+    def visit_VarName(self, node: VarName) -> None:
+        self.vm.append(f"push {self.subroutine_table[node.name]}")
+
+    def visit_ArrayAccess(self, node: ArrayAccess) -> None:
+        self.vm.append(f"push {self.subroutine_table[node.name]}")
+        self.visit(node.index)
+        self.vm.append("add")
+        self.vm.append("pop pointer 1")
+        self.vm.append("push that 0")
+
+    def visit_SubroutineCall(self, node: SubroutineCall) -> None:
+        table = self.subroutine_table
+        n_arguments = len(node.arguments)
+        if node.receiver is None:
+            # Method call on this
+            n_arguments += 1
+            self.vm.append(f"push {table['this']}")
+            subroutine_name = f"{table.class_name}.{node.name}"
+        elif node.receiver in table:
+            # Method call on variable
+            n_arguments += 1
+            self.vm.append(f"push {table[node.receiver]}")
+            var_type = table.get_symbol(node.receiver).type_
+            subroutine_name = f"{var_type}.{node.name}"
+        else:
+            # Function call
+            subroutine_name = f"{node.receiver}.{node.name}"
+        for argument in node.arguments:
+            self.visit(argument)
+        self.vm.append(f"call {subroutine_name} {n_arguments}")
+
+    def visit_ParenthesizedExpression(self, node: ParenthesizedExpression) -> None:
+        self.visit(node.expression)
 
-    return tokens, xml, subroutine_table
+    def visit_UnaryOperation(self, node: UnaryOperation) -> None:
+        self.visit(node.term)
+        self.vm.append("neg" if node.operator == "-" else "not")
 
 
 def compile_(program: str) -> str:
-    result = handle_class_token(tokenize(program))
-    return "\n".join([line for line in result if "// <" not in line])
+    return "\n".join(CodeGenerator().visit(parse(program)))
+
+
+@dataclass
+class SubroutineSignature:
+    kind: str
+    return_type: str
+    parameter_count: int
+
+
+@dataclass
+class ClassSignature:
+    name: str
+    field_count: int = 0
+    subroutines: dict[str, SubroutineSignature] = field(default_factory=dict)
+
+
+def scan_signature(program: str) -> ClassSignature:
+    """
+    Reads the interface a class exports without compiling it: its field
+    count and the kind, return type and parameter count of each subroutine.
+    Subroutine bodies are skipped by counting braces.
+    """
+    tokens = TokenStream(tokenize(program))
+    tokens.expect("class")
+    signature = ClassSignature(name=tokens.advance().text)
+    tokens.expect("{")
+    depth = 1
+    while depth:
+        token = tokens.advance()
+        if token.text == "{":
+            depth += 1
+        elif token.text == "}":
+            depth -= 1
+        elif depth == 1 and token.text == "field":
+            # field type name (, name)* ;
+            tokens.advance()
+            names = [tokens.advance()]
+            while tokens.advance().text == ",":
+                names.append(tokens.advance())
+            signature.field_count += len(names)
+        elif depth == 1 and token.text in ("constructor", "function", "method"):
+            return_type, name = tokens.advance().text, tokens.advance().text
+            tokens.expect("(")
+            parameters = []
+            while tokens.peek().text != ")":
+                parameters.append(tokens.advance())
+            # Parameters are type-name pairs separated by commas
+            signature.subroutines[name] = SubroutineSignature(
+                kind=token.text,
+                return_type=return_type,
+                parameter_count=(len(parameters) + 1) // 3,
+            )
+    return signature
+
+
+def iter_calls(vm_code: str) -> Iterable[tuple[str, int]]:
+    """
+    Yields the name and argument count of every call in compiled VM code.
+    """
+    for line in vm_code.splitlines():
+        if line.startswith("call "):
+            _, name, argument_count = line.split()
+            yield name, int(argument_count)
+
+
+def find_subroutine(
+    name: str, signatures: dict[str, ClassSignature]
+) -> Optional[SubroutineSignature]:
+    class_name, subroutine_name = name.split(".", maxsplit=1)
+    return signatures[class_name].subroutines.get(subroutine_name)
+
+
+def check_calls(vm_code: str, signatures: dict[str, ClassSignature]) -> list[str]:
+    """
+    Checks the calls in compiled VM code against the project's signatures,
+    returning a message for each call to a missing subroutine or with the
+    wrong number of arguments. Calls into classes outside the project are
+    not checked.
+    """
+    errors = []
+    for name, argument_count in iter_calls(vm_code):
+        if name.split(".")[0] not in signatures:
+            continue
+        subroutine = find_subroutine(name, signatures)
+        if subroutine is None:
+            errors.append(f"{name} is not defined")
+            continue
+        # Methods take the object as a hidden first argument
+        expected = subroutine.parameter_count + (subroutine.kind == "method")
+        if argument_count != expected:
+            errors.append(
+                f"{name} takes {expected} argument(s) but is called with "
+                f"{argument_count}"
+            )
+    return errors
+
+
+def used_interface(
+    vm_code: str, signatures: dict[str, ClassSignature]
+) -> dict[str, Optional[dict]]:
+    """
+    The signatures of the project subroutines compiled VM code calls, by
+    name, with None for the ones that don't exist.
+    """
+    return {
+        name: None if subroutine is None else asdict(subroutine)
+        for name, _ in iter_calls(vm_code)
+        if name.split(".")[0] in signatures
+        for subroutine in [find_subroutine(name, signatures)]
+    }
+
+
+CACHE_DIR = Path(".jack_cache")
+COMPILER_SOURCES = (
+    "compiler.py",
+    "jack_ast.py",
+    "jack_parser.py",
+    "tokenizer.py",
+    "symbol_table.py",
+    "lexical_elements.py",
+)
+
+
+def compiler_version() -> str:
+    digest = hashlib.sha256()
+    for module in COMPILER_SOURCES:
+        digest.update(Path(__file__).with_name(module).read_bytes())
+    return digest.hexdigest()
+
+
+def cache_key(program: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\n{program}".encode()).hexdigest()
+
+
+def source_error(source: Path, error: ValueError) -> ValueError:
+    """
+    Prefixes an error with the file name, and the line and column when it
+    has them.
+    """
+    if isinstance(error, JackError):
+        return ValueError(f"{source.name}:{error.line}:{error.column}: {error.message}")
+    return ValueError(f"{source.name}: {error}")
+
+
+def compile_file(
+    source: Path, signatures: dict[str, ClassSignature]
+) -> tuple[str, list[str]]:
+    try:
+        vm_code = compile_(source.read_text())
+    except ValueError as error:
+        raise source_error(source, error) from None
+    errors = [f"{source.name}: {error}" for error in check_calls(vm_code, signatures)]
+    return vm_code, errors
+
+
+def compile_project(
+    sources: Iterable[Path],
+    cache_dir: Optional[Path] = CACHE_DIR,
+    max_workers: Optional[int] = None,
+) -> tuple[dict[Path, str], list[Path]]:
+    """
+    Compiles a project's classes together: a quick first pass collects every
+    class's signature, then the classes are compiled in a process pool and
+    their calls into each other checked against those signatures.
+
+    Each compiled class is cached under a hash of its source and the
+    compiler's modules, together with its signature and the signatures of
+    the project subroutines it calls. A class is only compiled again when its
+    source or the compiler changed, or when one of the interfaces it uses
+    did. Pass `cache_dir=None` to skip the cache.
+
+    The .vm files and cache entries are only written once every class has
+    compiled cleanly, each through a temporary file so no reader ever sees a
+    partial one. Returns the VM code by source and the sources that had to
+    be compiled.
+    """
+    sources = sorted(sources)
+    programs = {source: source.read_text() for source in sources}
+    cached: dict[Path, dict] = {}
+    cache_files: dict[Path, Path] = {}
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        version = compiler_version()
+        for source in sources:
+            key = cache_key(programs[source], version)
+            cache_files[source] = cache_dir.joinpath(key).with_suffix(".json")
+            if cache_files[source].exists():
+                cached[source] = json.loads(cache_files[source].read_text())
+
+    class_signatures = {}
+    for source in sources:
+        if source in cached:
+            signature = cached[source]["signature"]
+            class_signatures[source] = ClassSignature(
+                name=signature["name"],
+                field_count=signature["field_count"],
+                subroutines={
+                    name: SubroutineSignature(**subroutine)
+                    for name, subroutine in signature["subroutines"].items()
+                },
+            )
+        else:
+            try:
+                class_signatures[source] = scan_signature(programs[source])
+            except ValueError as error:
+                raise source_error(source, error) from None
+    signatures = {
+        signature.name: signature for signature in class_signatures.values()
+    }
+
+    compiled = {
+        source: cached[source]["vm_code"]
+        for source in sources
+        if source in cached
+        and cached[source]["uses"]
+        == used_interface(cached[source]["vm_code"], signatures)
+    }
+    recompiled = [source for source in sources if source not in compiled]
+    compile_source = partial(compile_file, signatures=signatures)
+    if max_workers == 1 or len(recompiled) == 1:
+        results = list(map(compile_source, recompiled))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(compile_source, recompiled))
+
+    errors = [error for _, file_errors in results for error in file_errors]
+    if errors:
+        raise ValueError("\n".join(errors))
+    compiled.update(
+        (source, vm_code) for source, (vm_code, _) in zip(recompiled, results)
+    )
+    compiled = {source: compiled[source] for source in sources}
+
+    outputs = {source.with_suffix(".vm"): code for source, code in compiled.items()}
+    for source in recompiled:
+        if source in cache_files:
+            entry = {
+                "vm_code": compiled[source],
+                "signature": asdict(class_signatures[source]),
+                "uses": used_interface(compiled[source], signatures),
+            }
+            outputs[cache_files[source]] = json.dumps(entry)
+    for path, text in outputs.items():
+        # Unchanged outputs are left alone so their timestamps stay put
+        if path.exists() and path.read_text() == text:
+            continue
+        tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(text)
+        os.replace(tmp_file, path)
+    return compiled, recompiled
 
 
 if __name__ == "__main__":
+    import argparse
     import sys
-    from pathlib import Path
-
-    target_path = Path.cwd() / sys.argv[1]
-    if not target_path.suffix == ".jack" and not target_path.is_dir():
-        raise ValueError(f"File type {repr(target_path.suffix)} not supported")
-    files = list(target_path.glob("*.jack")) if target_path.is_dir() else [target_path]
-    for jack_file in files:
-        jack_file.with_suffix(".vm").write_text(compile_(jack_file.read_text()))
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Compiles the .jack files and folders given as one project, "
+        "for example a game together with the OS classes of project 12."
+    )
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--jobs", type=int, help="worker processes")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    arguments = parser.parse_args()
+
+    files = []
+    for path in arguments.paths:
+        target_path = Path.cwd() / path
+        if not target_path.suffix == ".jack" and not target_path.is_dir():
+            raise ValueError(f"File type {repr(target_path.suffix)} not supported")
+        if target_path.is_dir():
+            files.extend(target_path.glob("*.jack"))
+        else:
+            files.append(target_path)
+    max_workers = arguments.jobs
+    cache_dir = arguments.cache_dir
+
+    start = time.perf_counter()
+    try:
+        _, recompiled = compile_project(files, cache_dir, max_workers)
+    except ValueError as error:
+        sys.exit(str(error))
+    print(
+        f"Compiled {len(recompiled)} classes, {len(files) - len(recompiled)} from "
+        f"cache, in {time.perf_counter() - start:.3f}s"
+    )
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+
+@dataclass
+class ClassVarDec:
+    __slots__ = ("kind", "type_", "names")
+
+    kind: str
+    type_: str
+    names: list[str]
+
+
+@dataclass
+class Parameter:
+    __slots__ = ("type_", "name")
+
+    type_: str
+    name: str
+
+
+@dataclass
+class VarDec:
+    __slots__ = ("type_", "names")
+
+    type_: str
+    names: list[str]
+
+
+@dataclass
+class SubroutineDec:
+    __slots__ = ("kind", "return_type", "name", "parameters", "var_decs", "statements")
+
+    kind: str
+    return_type: str
+    name: str
+    parameters: list[Parameter]
+    var_decs: list[VarDec]
+    statements: list[Statement]
+
+
+@dataclass
+class Class:
+    __slots__ = ("name", "class_var_decs", "subroutine_decs")
+
+    name: str
+    class_var_decs: list[ClassVarDec]
+    subroutine_decs: list[SubroutineDec]
+
+
+@dataclass
+class LetStatement:
+    __slots__ = ("name", "index", "value", "line", "column")
+
+    name: str
+    index: Optional[Expression]
+    value: Expression
+    line: int
+    column: int
+
+
+@dataclass
+class IfStatement:
+    __slots__ = ("condition", "statements", "else_statements", "line", "column")
+
+    condition: Expression
+    statements: list[Statement]
+    else_statements: Optional[list[Statement]]
+    line: int
+    column: int
+
+
+@dataclass
+class WhileStatement:
+    __slots__ = ("condition", "statements", "line", "column")
+
+    condition: Expression
+    statements: list[Statement]
+    line: int
+    column: int
+
+
+@dataclass
+class DoStatement:
+    __slots__ = ("call", "line", "column")
+
+    call: SubroutineCall
+    line: int
+    column: int
+
+
+@dataclass
+class ReturnStatement:
+    __slots__ = ("value", "line", "column")
+
+    value: Optional[Expression]
+    line: int
+    column: int
+
+
+@dataclass
+class Expression:
+    """
+    A term followed by any number of (operator, term) pairs. Jack has no
+    operator precedence, so the pairs apply from left to right.
+    """
+
+    __slots__ = ("term", "operations")
+
+    term: Term
+    operations: list[tuple[str, Term]]
+
+
+@dataclass
+class IntegerConstant:
+    __slots__ = ("value",)
+
+    value: int
+
+
+@dataclass
+class StringConstant:
+    __slots__ = ("value",)
+
+    value: str
+
+
+@dataclass
+class KeywordConstant:
+    __slots__ = ("value",)
+
+    value: str
+
+
+@dataclass
+class VarName:
+    __slots__ = ("name",)
+
+    name: str
+
+
+@dataclass
+class ArrayAccess:
+    __slots__ = ("name", "index")
+
+    name: str
+    index: Expression
+
+
+@dataclass
+class SubroutineCall:
+    """
+    `receiver.name(arguments)`, where the receiver is a variable or a class
+    name, or `name(arguments)` on the current object when it is None.
+    """
+
+    __slots__ = ("receiver", "name", "arguments")
+
+    receiver: Optional[str]
+    name: str
+    arguments: list[Expression]
+
+
+@dataclass
+class ParenthesizedExpression:
+    __slots__ = ("expression",)
+
+    expression: Expression
+
+
+@dataclass
+class UnaryOperation:
+    __slots__ = ("operator", "term")
+
+    operator: str
+    term: Term
+
+
+# Statements keep the position of their keyword for error messages
+Statement = Union[
+    LetStatement, IfStatement, WhileStatement, DoStatement, ReturnStatement
+]
+Term = Union[
+    IntegerConstant,
+    StringConstant,
+    KeywordConstant,
+    VarName,
+    ArrayAccess,
+    SubroutineCall,
+    ParenthesizedExpression,
+    UnaryOperation,
+]
+
+
+class Visitor:
+    """
+    Walks a tree by calling `visit_<node class>` for each node, in the style
+    of the standard library's ast.NodeVisitor.
+    """
+
+    def visit(self, node: Any) -> Any:
+        return getattr(self, f"visit_{type(node).__name__}")(node)
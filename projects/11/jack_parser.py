@@ -0,0 +1,197 @@
+from html import escape, unescape
+
+from jack_ast import (
+    ArrayAccess,
+    Class,
+    ClassVarDec,
+    DoStatement,
+    Expression,
+    IfStatement,
+    IntegerConstant,
+    KeywordConstant,
+    LetStatement,
+    Parameter,
+    ParenthesizedExpression,
+    ReturnStatement,
+    Statement,
+    StringConstant,
+    SubroutineCall,
+    SubroutineDec,
+    Term,
+    UnaryOperation,
+    VarDec,
+    VarName,
+    WhileStatement,
+)
+from tokenizer import JackError, Token, TokenStream, TokenType, tokenize
+
+# Symbols come XML-escaped from the tokenizer
+OPERATORS = {escape(operator, quote=False): operator for operator in "+-*/&|<>="}
+
+
+def unexpected_token(token: Token) -> JackError:
+    return JackError(f"Unexpected token {token.text!r}", token.line, token.column)
+
+
+def parse(program: str) -> Class:
+    return parse_class(TokenStream(tokenize(program)))
+
+
+def parse_class(tokens: TokenStream) -> Class:
+    tokens.expect("class")
+    name = tokens.advance().text
+    tokens.expect("{")
+    class_var_decs, subroutine_decs = [], []
+    while tokens.peek().text != "}":
+        if tokens.peek().text in ("static", "field"):
+            class_var_decs.append(parse_class_var_dec(tokens))
+        else:
+            subroutine_decs.append(parse_subroutine_dec(tokens))
+    tokens.expect("}")
+    return Class(name, class_var_decs, subroutine_decs)
+
+
+def parse_names(tokens: TokenStream) -> list[str]:
+    # name (, name)* ;
+    names = [tokens.advance().text]
+    while tokens.peek().text == ",":
+        tokens.advance()
+        names.append(tokens.advance().text)
+    tokens.expect(";")
+    return names
+
+
+def parse_class_var_dec(tokens: TokenStream) -> ClassVarDec:
+    kind, type_ = tokens.advance().text, tokens.advance().text
+    return ClassVarDec(kind, type_, parse_names(tokens))
+
+
+def parse_subroutine_dec(tokens: TokenStream) -> SubroutineDec:
+    kind, return_type = tokens.advance().text, tokens.advance().text
+    name = tokens.advance().text
+    tokens.expect("(")
+    parameters = []
+    while tokens.peek().text != ")":
+        if parameters:
+            tokens.expect(",")
+        type_, parameter_name = tokens.advance().text, tokens.advance().text
+        parameters.append(Parameter(type_, parameter_name))
+    tokens.expect(")")
+
+    tokens.expect("{")
+    var_decs = []
+    while tokens.peek().text == "var":
+        tokens.advance()
+        var_decs.append(VarDec(tokens.advance().text, parse_names(tokens)))
+    statements = []
+    while tokens.peek().text != "}":
+        statements.append(parse_statement(tokens))
+    tokens.expect("}")
+    return SubroutineDec(kind, return_type, name, parameters, var_decs, statements)
+
+
+def parse_statements(tokens: TokenStream) -> list[Statement]:
+    tokens.expect("{")
+    statements = []
+    while tokens.peek().text != "}":
+        statements.append(parse_statement(tokens))
+    tokens.expect("}")
+    return statements
+
+
+def parse_statement(tokens: TokenStream) -> Statement:
+    statement_token = tokens.advance()
+    position = statement_token.line, statement_token.column
+    if statement_token.text == "let":
+        name = tokens.advance().text
+        index = None
+        if tokens.peek().text == "[":
+            tokens.advance()
+            index = parse_expression(tokens)
+            tokens.expect("]")
+        tokens.expect("=")
+        value = parse_expression(tokens)
+        tokens.expect(";")
+        return LetStatement(name, index, value, *position)
+    if statement_token.text in ("if", "while"):
+        tokens.expect("(")
+        condition = parse_expression(tokens)
+        tokens.expect(")")
+        statements = parse_statements(tokens)
+        if statement_token.text == "while":
+            return WhileStatement(condition, statements, *position)
+        else_statements = None
+        if tokens.peek().text == "else":
+            tokens.advance()
+            else_statements = parse_statements(tokens)
+        return IfStatement(condition, statements, else_statements, *position)
+    if statement_token.text == "do":
+        call = parse_subroutine_call(tokens.advance(), tokens)
+        tokens.expect(";")
+        return DoStatement(call, *position)
+    if statement_token.text == "return":
+        value = None
+        if tokens.peek().text != ";":
+            value = parse_expression(tokens)
+        tokens.expect(";")
+        return ReturnStatement(value, *position)
+    raise JackError(
+        f"{statement_token.text!r} is not a valid statement",
+        statement_token.line,
+        statement_token.column,
+    )
+
+
+def parse_subroutine_call(
+    identifier_token: Token, tokens: TokenStream
+) -> SubroutineCall:
+    receiver, name = None, identifier_token.text
+    if tokens.peek().text == ".":
+        tokens.advance()
+        receiver, name = name, tokens.advance().text
+    tokens.expect("(")
+    arguments = []
+    while tokens.peek().text != ")":
+        if arguments:
+            tokens.expect(",")
+        arguments.append(parse_expression(tokens))
+    tokens.expect(")")
+    return SubroutineCall(receiver, name, arguments)
+
+
+def parse_expression(tokens: TokenStream) -> Expression:
+    term = parse_term(tokens)
+    operations = []
+    while tokens.peek().type_ == TokenType.symbol and tokens.peek().text in OPERATORS:
+        operator = OPERATORS[tokens.advance().text]
+        operations.append((operator, parse_term(tokens)))
+    return Expression(term, operations)
+
+
+def parse_term(tokens: TokenStream) -> Term:
+    token = tokens.advance()
+    if token.type_ == TokenType.integerConstant:
+        return IntegerConstant(int(token.text))
+    if token.type_ == TokenType.stringConstant:
+        return StringConstant(unescape(token.text))
+    if token.type_ == TokenType.keyword:
+        if token.text not in ("true", "false", "null", "this"):
+            raise unexpected_token(token)
+        return KeywordConstant(token.text)
+    if token.type_ == TokenType.identifier:
+        # Must be a var, array element, or subroutine call
+        if tokens.peek().text in (".", "("):
+            return parse_subroutine_call(token, tokens)
+        if tokens.peek().text == "[":
+            tokens.advance()
+            index = parse_expression(tokens)
+            tokens.expect("]")
+            return ArrayAccess(token.text, index)
+        return VarName(token.text)
+    if token.text == "(":
+        expression = parse_expression(tokens)
+        tokens.expect(")")
+        return ParenthesizedExpression(expression)
+    if token.text in ("-", "~"):
+        return UnaryOperation(token.text, parse_term(tokens))
+    raise unexpected_token(token)
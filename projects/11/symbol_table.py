@@ -91,13 +91,7 @@ class SubroutineTable(SymbolTable):
 
     @property
     def field_count(self) -> int:
-        print("field count")
-        for key in self:
-            print(self.get_symbol(key))
-        field_count = [self.get_symbol(symbol).kind for symbol in self].count("field")
-        print(f"{field_count=}")
-        print("------")
-        return field_count
+        return [self.get_symbol(symbol).kind for symbol in self].count("field")
 
     def get_symbol(self, key: str) -> Symbol:
         if key in self.table:
@@ -118,9 +112,7 @@ class SubroutineTable(SymbolTable):
             memseg = "local"
         elif symbol.kind == "field":
             memseg = "this"
-        loc = f"{memseg} {symbol.index}"
-        print(f"Accessing {symbol.name} @", loc)
-        return loc
+        return f"{memseg} {symbol.index}"
 
     def __str__(self) -> str:
         rows = "\n".join([str(row) for row in self.table.values()])
@@ -0,0 +1,117 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from compiler import compile_, compile_project, scan_signature
+
+PROJECT_DIR = Path(__file__).parent
+OS_DIR = PROJECT_DIR.parent.joinpath("12")
+
+
+@pytest.fixture
+def pong(tmp_path: Path) -> list[Path]:
+    for folder in (PROJECT_DIR.joinpath("Pong"), OS_DIR):
+        for jack_file in folder.glob("*.jack"):
+            shutil.copy(jack_file, tmp_path)
+    return sorted(tmp_path.glob("*.jack"))
+
+
+def test_scans_class_signature():
+    signature = scan_signature(PROJECT_DIR.joinpath("Pong", "Bat.jack").read_text())
+    assert signature.name == "Bat"
+    assert signature.field_count == 5
+    assert [
+        (name, subroutine.kind, subroutine.return_type, subroutine.parameter_count)
+        for name, subroutine in signature.subroutines.items()
+    ][:3] == [
+        ("new", "constructor", "Bat", 4),
+        ("dispose", "method", "void", 0),
+        ("show", "method", "void", 0),
+    ]
+
+
+def test_compiles_project(pong: list[Path]):
+    compiled, recompiled = compile_project(pong, cache_dir=None, max_workers=2)
+    assert sorted(compiled) == recompiled == pong
+    for source in pong:
+        assert source.with_suffix(".vm").read_text() == compiled[source]
+    assert not list(pong[0].parent.glob("*.tmp"))
+
+
+def test_rejects_calls_that_do_not_match_signatures(pong: list[Path]):
+    game = pong[0].parent.joinpath("PongGame.jack")
+    game.write_text(game.read_text().replace("do bat.move();", "do bat.move(1);"))
+    expected = r"Bat.move takes 1 argument\(s\) but is called with 2"
+    with pytest.raises(ValueError, match=expected):
+        compile_project(pong, cache_dir=None, max_workers=1)
+    assert not list(game.parent.glob("*.vm"))
+
+
+def test_reports_truncated_classes(pong: list[Path]):
+    bat = pong[0].parent.joinpath("Bat.jack")
+    bat.write_text(bat.read_text().split("method void dispose()")[0])
+    with pytest.raises(ValueError, match=r"Bat.jack:\d+:\d+: Unexpected end of input"):
+        compile_project(pong, cache_dir=None, max_workers=1)
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        ("let x = ;", "Main.jack:4:17: Unexpected token ';'"),
+        ("let y = 1;", "Main.jack:4:9: Undeclared variable 'y'"),
+    ],
+    ids=["syntax", "undeclared"],
+)
+def test_reports_errors_with_file_and_position(tmp_path: Path, body, expected):
+    source = tmp_path.joinpath("Main.jack")
+    source.write_text(
+        "class Main {\n"
+        "    function void main() {\n"
+        "        var int x;\n"
+        f"        {body}\n"
+        "        return;\n"
+        "    }\n"
+        "}\n"
+    )
+    with pytest.raises(ValueError) as error:
+        compile_project([source], cache_dir=None, max_workers=1)
+    assert str(error.value) == expected
+
+
+def test_recompiles_changed_classes_and_their_dependents(
+    pong: list[Path], tmp_path: Path
+):
+    cache_dir = tmp_path.joinpath("cache")
+    compiled, _ = compile_project(pong, cache_dir, max_workers=1)
+    assert compile_project(pong, cache_dir, max_workers=1) == (compiled, [])
+
+    # A change inside a body leaves the class's interface alone
+    ball = tmp_path.joinpath("Ball.jack")
+    ball.write_text(ball.read_text().replace("let x = Ax;", "let x = Ax + 0;"))
+    _, recompiled = compile_project(pong, cache_dir, max_workers=1)
+    assert recompiled == [ball]
+
+    # PongGame calls Bat.move, so changing its signature recompiles both
+    bat = tmp_path.joinpath("Bat.jack")
+    bat.write_text(bat.read_text().replace("method void move()", "method int move()"))
+    _, recompiled = compile_project(pong, cache_dir, max_workers=1)
+    assert recompiled == [bat, tmp_path.joinpath("PongGame.jack")]
+
+
+def test_applies_operators_left_to_right():
+    vm_code = compile_("class M { function int f(int a) { return -a + 1 - 2; } }")
+    assert vm_code.splitlines()[1:-1] == [
+        "push argument 0",
+        "neg",
+        "push constant 1",
+        "add",
+        "push constant 2",
+        "sub",
+    ]
+
+
+def test_compiles_string_constants_unescaped():
+    vm_code = compile_('class M { function void f() { do M.g("<&"); return; } }')
+    assert "push constant 60\ncall String.appendChar 2" in vm_code
+    assert "push constant 38\ncall String.appendChar 2" in vm_code
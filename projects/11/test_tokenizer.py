@@ -0,0 +1,47 @@
+import pytest
+
+from tokenizer import TokenStream, TokenType, tokenize
+
+PROGRAM = """/** Multi-line
+    comment */
+class Main {
+    // Comment with "quotes"; and symbols
+    function void main() {
+        do Output.printString("a < b; // not a comment");
+        return;  /* trailing */
+    }
+}
+"""
+
+
+def test_records_token_positions():
+    tokens = tokenize(PROGRAM)
+    positions = [(token.text, token.line, token.column) for token in tokens[:6]]
+    assert positions == [
+        ("class", 3, 1),
+        ("Main", 3, 7),
+        ("{", 3, 12),
+        ("function", 5, 5),
+        ("void", 5, 14),
+        ("main", 5, 19),
+    ]
+
+
+def test_keeps_comment_markers_and_symbols_inside_strings():
+    [string] = [
+        token for token in tokenize(PROGRAM) if token.type_ == TokenType.stringConstant
+    ]
+    assert string.text == "a &lt; b; // not a comment"
+
+
+def test_rejects_unknown_characters():
+    with pytest.raises(ValueError, match="'#' at line 2, column 5"):
+        tokenize("class\n    #")
+
+
+def test_reports_end_of_input_position():
+    stream = TokenStream(tokenize("class Main {\n    field int x"))
+    for _ in range(6):
+        stream.advance()
+    with pytest.raises(ValueError, match="after 'x' at line 2, column 15"):
+        stream.peek()
@@ -1,6 +1,9 @@
 import re
+import sys
 from dataclasses import dataclass
 from enum import Enum, auto
+from html import escape
+from typing import Iterator, Sequence
 
 from lexical_elements import keywords, symbols
 
@@ -15,70 +18,117 @@ class TokenType(Enum):
 
 @dataclass
 class Token:
+    """
+    A lexical element with its 1-based position in the source. Symbols and
+    string constants are XML-escaped, so `<` is read as `&lt;`.
+    """
+
+    __slots__ = ("text", "type_", "line", "column")
+
     text: str
     type_: TokenType
+    line: int
+    column: int
 
 
-STRING_SPACE = "?x?"
-STRING_SEMICOLON = ":semic:"
+class JackError(ValueError):
+    """
+    An error in a Jack program, with the 1-based position it was found at.
+    """
 
+    def __init__(self, message: str, line: int, column: int) -> None:
+        super().__init__(f"{message} at line {line}, column {column}")
+        self.message = message
+        self.line = line
+        self.column = column
 
-def strip_comments(program: str) -> str:
-    program = re.sub(
-        pattern=r"/\*\*.*?\*/", string=program, repl="", flags=re.MULTILINE | re.DOTALL
-    )
-    return "\n".join(
-        [
-            line.split("//")[0].strip()
-            for line in program.splitlines()
-            if line.strip() and not line.strip().startswith("//")
-        ]
-    ).strip()
 
+TOKEN_PATTERN = re.compile(
+    rf"""
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+    |(?P<integerConstant>\d+)
+    |(?P<stringConstant>"[^"\n]*")
+    |(?P<word>[A-Za-z_]\w*)
+    |(?P<symbol>[{''.join(re.escape(symbol) for symbol in symbols)}])
+    |(?P<error>.)
+    """,
+    flags=re.VERBOSE | re.DOTALL,
+)
+KEYWORDS = frozenset(keywords)
+SYMBOL_TEXTS = {symbol: escape(symbol, quote=False) for symbol in symbols}
 
-def tokenize(program: str) -> list[Token]:
-    program = strip_comments(program)
-    fixed_strings = re.sub(
-        pattern=r"(?<=\").+(?=\")",
-        string=program,
-        repl=lambda match: match.group().replace(" ", STRING_SPACE),
-    )
-    fixed_strings = re.sub(
-        pattern=r"(?<=\").+(?=\")",
-        string=fixed_strings,
-        repl=lambda match: match.group().replace(";", STRING_SEMICOLON),
-    )
-    left_spaced_program = re.sub(
-        pattern=rf"(?<! )[{''.join([re.escape(symbol) for symbol in symbols])}]",
-        string=fixed_strings,
-        repl=lambda match: " " + match.group(),
-    )
-    spaced_program = re.sub(
-        pattern=rf"[{''.join([re.escape(symbol) for symbol in symbols])}](?! )",
-        string=left_spaced_program,
-        repl=lambda match: match.group() + " ",
-    )
-    tokenized = [
-        token.replace(STRING_SPACE, " ").replace(STRING_SEMICOLON, ";").strip()
-        for token in spaced_program.split()
-    ]
-    tokens = []
-    for token in tokenized:
-        if token in keywords:
-            type_ = TokenType.keyword
-        elif token in symbols:
-            type_ = TokenType.symbol
-        elif token.startswith('"'):
-            type_ = TokenType.stringConstant
-        elif token.isnumeric():
-            type_ = TokenType.integerConstant
+
+def iter_tokens(program: str) -> Iterator[Token]:
+    """
+    Yields the tokens of a Jack program in a single pass of one regex,
+    skipping whitespace and comments.
+    """
+    line, line_start = 1, 0
+    for match in TOKEN_PATTERN.finditer(program):
+        kind, text = match.lastgroup, match.group()
+        if kind == "skip":
+            if "\n" in text:
+                line += text.count("\n")
+                line_start = match.start() + text.rindex("\n") + 1
+            continue
+        column = match.start() - line_start + 1
+        if kind == "word":
+            type_ = TokenType.keyword if text in KEYWORDS else TokenType.identifier
+            yield Token(sys.intern(text), type_, line, column)
+        elif kind == "symbol":
+            yield Token(SYMBOL_TEXTS[text], TokenType.symbol, line, column)
+        elif kind == "integerConstant":
+            yield Token(text, TokenType.integerConstant, line, column)
+        elif kind == "stringConstant":
+            text = escape(text[1:-1], quote=False)
+            yield Token(text, TokenType.stringConstant, line, column)
         else:
-            type_ = TokenType.identifier
-        text = (
-            token.replace('"', "")
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
+            raise JackError(f"Unexpected character {text!r}", line, column)
+
+
+def tokenize(program: str) -> list[Token]:
+    return list(iter_tokens(program))
+
+
+class TokenStream:
+    """
+    A cursor over a tokenized program. Handlers move the position forward
+    instead of slicing off the tokens they consume, so parsing takes time
+    linear in the number of tokens.
+    """
+
+    __slots__ = ("tokens", "position")
+
+    def __init__(self, tokens: Sequence[Token]) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Token:
+        try:
+            return self.tokens[self.position + offset]
+        except IndexError:
+            raise self.end_of_input() from None
+
+    def advance(self) -> Token:
+        try:
+            token = self.tokens[self.position]
+        except IndexError:
+            raise self.end_of_input() from None
+        self.position += 1
+        return token
+
+    def end_of_input(self) -> JackError:
+        if not self.tokens:
+            return JackError("Unexpected end of input in an empty program", 1, 1)
+        last = self.tokens[-1]
+        return JackError(
+            f"Unexpected end of input after {last.text!r}", last.line, last.column
         )
-        tokens.append(Token(text=text, type_=type_))
-    return tokens
+
+    def expect(self, text: str) -> Token:
+        token = self.advance()
+        if token.text != text:
+            raise JackError(
+                f"Expected {text!r} but found {token.text!r}", token.line, token.column
+            )
+        return token